@@ -0,0 +1,87 @@
+"""
+ * Startup benchmark: measures the import time of the package with `python -X importtime` and fails when it exceeds
+ * its budget, when an import does work (console output, files created) or when it loads a module that has to stay
+ * lazy. Short-lived CLI and worker processes pay this cost on every start.
+ *
+ * Usage: python benchmarks/import_time.py [--runs N] [--budget-scale X]
+ *
+ * Every module is imported in a fresh interpreter, run in an empty temporary directory; the best of N runs is
+ * compared to its budget, the cumulative microseconds -X importtime reports for the module. --budget-scale loosens
+ * or tightens all budgets at once, e.g. on a slow CI machine.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> cumulative import time budget in milliseconds
+BUDGETS_MS = {
+    "src": 3,
+    "src.buffer.BufferPoolManager": 30,
+    "src.container.disk.DiskExtendibleHashTable": 40,
+}
+
+# modules that are only imported on first use, by the code that needs them
+LAZY_MODULES = ("mmh3", "lzma", "tempfile", "shutil")
+
+
+def _ImportOnce(module, cwd):
+    """@return the cumulative import time of module in microseconds, the stdout of the run and the modules loaded"""
+    code = f"import sys, {module}; sys.stderr.write('MODULES ' + ' '.join(sys.modules) + '\\n')"
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    run = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative, loaded = None, set()
+    for line in run.stderr.splitlines():
+        if line.startswith("MODULES "):
+            loaded = set(line.split()[1:])
+        elif line.startswith("import time:"):
+            _, cumulative_us, name = line.split("|")
+            if name.strip() == module:
+                cumulative = int(cumulative_us)
+    return cumulative, run.stdout, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1].lstrip(" *"))
+    parser.add_argument("--runs", type=int, default=7, help="imports per module, the fastest one counts")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="factor applied to every budget")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<48} {'best ms':>8} {'budget ms':>10}")
+    for module, budget_ms in BUDGETS_MS.items():
+        budget_ms *= args.budget_scale
+        best_us = None
+        with tempfile.TemporaryDirectory() as cwd:
+            for _ in range(args.runs):
+                cumulative, stdout, loaded = _ImportOnce(module, cwd)
+                best_us = cumulative if best_us is None else min(best_us, cumulative)
+            if stdout:
+                failures.append(f"importing {module} printed {stdout[:80]!r}")
+            if os.listdir(cwd):
+                failures.append(f"importing {module} created {sorted(os.listdir(cwd))}")
+        eager = [name for name in LAZY_MODULES if name in loaded]
+        if eager:
+            failures.append(f"importing {module} loaded {', '.join(eager)}, which must be imported lazily")
+        print(f"{module:<48} {best_us / 1000:>8.2f} {budget_ms:>10.2f}")
+        if best_us > budget_ms * 1000:
+            failures.append(f"importing {module} took {best_us / 1000:.2f} ms, over its {budget_ms:.2f} ms budget")
+
+    for failure in failures:
+        print("FAIL:", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+ * Write benchmark: random page updates against the in-place DiskManager and the LogStructuredDiskManager, which
+ * turns them into sequential appends.
+ *
+ * Usage: python benchmarks/random_page_writes.py [--pages N] [--writes N] [--sync-every N]
+ *
+ * Both disk managers write the same sequence of random page ids over a database of --pages pages in a temporary
+ * directory, syncing every --sync-every writes like checkpoints do. The log-structured run includes the compaction
+ * needed to keep its space bounded, so the throughput reported is sustainable. Every write lands in the page cache
+ * of a temporary directory, where random writes are as cheap as sequential ones: the benchmark measures the cost of
+ * the log-structured bookkeeping and compaction, not the gain of sequential writes on a slow device.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import PAGE_SIZE  # noqa: E402
+from src.storage.DiskManager import DiskManager  # noqa: E402
+from src.storage.LogStructuredDiskManager import LogStructuredDiskManager  # noqa: E402
+
+
+def _Run(disk_manager, page_ids, sync_every, compact):
+    """@return the seconds taken to write the pages, syncing (and compacting) every sync_every writes"""
+    page = bytearray(os.urandom(PAGE_SIZE))
+    start = time.perf_counter()
+    for i, page_id in enumerate(page_ids, 1):
+        page[:4] = i.to_bytes(4, "little")
+        disk_manager.writePage(page_id, page)
+        if i % sync_every == 0:
+            if compact:
+                disk_manager.Compact()
+            disk_manager.Sync()
+    disk_manager.Sync()
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1].lstrip(" *"))
+    parser.add_argument("--pages", type=int, default=1 << 14, help="number of pages of the database")
+    parser.add_argument("--writes", type=int, default=1 << 15, help="number of random page writes")
+    parser.add_argument("--sync-every", type=int, default=1 << 12, help="writes between two syncs")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    page_ids = [rnd.randrange(args.pages) for _ in range(args.writes)]
+    print(f"{'disk manager':<28} {'writes/s':>10} {'MB on disk':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, factory, compact in (
+            ("DiskManager", DiskManager, False),
+            ("LogStructuredDiskManager", LogStructuredDiskManager, True),
+        ):
+            disk_manager = factory(os.path.join(directory, name + ".db"))
+            # lay the database out first, the benchmark measures updates
+            for page_id in range(args.pages):
+                disk_manager.writePage(page_id, bytes(PAGE_SIZE))
+            disk_manager.Sync()
+            seconds = _Run(disk_manager, page_ids, args.sync_every, compact)
+            disk_manager.shutdown()
+            size = sum(
+                os.path.getsize(os.path.join(directory, file_name))
+                for file_name in os.listdir(directory)
+                if file_name.startswith(name + ".") and not file_name.endswith(".log")
+            )
+            print(f"{name:<28} {args.writes / seconds:>10.0f} {size / (1 << 20):>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+ * Public API of the storage manager.
+ *
+ * Importing the package does no work: every name below is imported from its module the first time it is accessed,
+ * so a short-lived process only pays for the parts it uses, e.g. `from src import DiskExtendibleHashTable`.
+"""
+
+# public name -> module defining it
+_EXPORTS = {
+    "BufferPoolManager": "src.buffer.BufferPoolManager",
+    "LRUReplacer": "src.buffer.LRUReplacer",
+    "SharedBufferPoolManager": "src.buffer.SharedBufferPoolManager",
+    "AsyncBufferPoolManager": "src.buffer.AsyncBufferPoolManager",
+    "PageSnapshot": "src.buffer.VersionStore",
+    "DiskExtendibleHashTable": "src.container.disk.DiskExtendibleHashTable",
+    "AsyncDiskExtendibleHashTable": "src.container.disk.AsyncDiskExtendibleHashTable",
+    "HashFunction": "src.container.disk.hash",
+    "ReaderWriterLatch": "src.latch.ReaderWriterLatch",
+    "CheckpointManager": "src.recovery.CheckpointManager",
+    "LogManager": "src.recovery.LogManager",
+    "LogRecovery": "src.recovery.LogRecovery",
+    "DiskManager": "src.storage.DiskManager",
+    "SegmentedDiskManager": "src.storage.SegmentedDiskManager",
+    "LogStructuredDiskManager": "src.storage.LogStructuredDiskManager",
+    "PageCodec": "src.storage.PageCodec",
+    "ZlibCodec": "src.storage.PageCodec",
+    "LzmaCodec": "src.storage.PageCodec",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # __import__ rather than importlib.import_module, importlib costs more to import than this package
+    value = getattr(__import__(module, fromlist=(name,)), name)
+    # later accesses find the name in the module dict and skip this hook
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
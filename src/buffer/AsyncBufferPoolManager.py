@@ -0,0 +1,147 @@
+from src.config import page_id_t
+from src.storage.Page.Page import Page
+import asyncio
+import functools
+
+"""
+ * AsyncBufferPoolManager is the asyncio front-end of a buffer pool, a BufferPoolManager or a SharedBufferPoolManager.
+ *
+ * A call that can complete right away completes inline, on the thread of the event loop: fetching a page that is in
+ * the pool while the pool latch is free, unpinning a page, taking a free page latch. Everything that may block, disk
+ * reads and write-backs or waiting for a latch, is handed to an executor, the default executor of the loop unless one
+ * is given, so thousands of coroutines can share one pool without blocking the loop.
+ *
+ * Page guards pin and latch a page for the body of an `async with` block:
+ *
+ *   async with pool.read_page(page_id) as page:
+ *       ...
+ *   async with pool.write_page(page_id) as page:
+ *       ...  # the page is unpinned dirty
+"""
+
+
+class AsyncBufferPoolManager:
+    def __init__(self, bpm, executor=None):
+        """
+        * @param bpm the buffer pool manager to front
+        * @param executor the concurrent.futures executor blocking calls run in, None for the default one of the loop
+        """
+        self._bpm = bpm
+        self._executor = executor
+
+    def GetBufferPoolManager(self):
+        """* @return the fronted buffer pool manager"""
+        return self._bpm
+
+    async def fetch_page(self, page_id: page_id_t) -> Page:
+        """
+        * Fetch a page, inline if it is in the pool, else in the executor.
+        * @param page_id id of page to be fetched
+        * @return null if page_id cannot be fetched, otherwise pointer to the requested page
+        """
+        page = self._bpm.FetchResidentPage(page_id)
+        if page is not None:
+            return page
+        return await self._RunPinning(self._bpm.FetchPage, page_id)
+
+    async def new_page(self) -> Page:
+        """
+        * Create a new page in the executor, it may have to write a victim back.
+        * @return null if no new pages could be created, otherwise pointer to new page, see Page.getPageId for its id
+        """
+        return await self._RunPinning(self._bpm.NewPage, [])
+
+    async def unpin_page(self, page_id: page_id_t, is_dirty=None) -> bool:
+        """
+        * Unpin a page, inline unless the pool latch is held.
+        * @return false if the page is not in the page table or its pin count is <= 0 before this call, true otherwise
+        """
+        unpinned = self._bpm.TryUnpinPage(page_id, is_dirty)
+        if unpinned is not None:
+            return unpinned
+        return await self._RunBlocking(self._bpm.UnpinPage, page_id, is_dirty)
+
+    async def flush_page(self, page_id: page_id_t) -> bool:
+        """* Flush a page to disk in the executor, see BufferPoolManager.FlushPage."""
+        return await self._RunBlocking(self._bpm.FlushPage, page_id)
+
+    async def flush_all_pages(self):
+        """* Flush all the pages to disk in the executor, see BufferPoolManager.FlushAllPages."""
+        await self._RunBlocking(self._bpm.FlushAllPages)
+
+    def read_page(self, page_id: page_id_t) -> "AsyncPageGuard":
+        """* @return a guard holding the page pinned and read latched for an `async with` block"""
+        return AsyncPageGuard(self, page_id, write=False)
+
+    def write_page(self, page_id: page_id_t) -> "AsyncPageGuard":
+        """* @return a guard holding the page pinned and write latched for an `async with` block, unpinned dirty"""
+        return AsyncPageGuard(self, page_id, write=True)
+
+    async def _RunBlocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(function, *args)
+        )
+
+    async def _RunPinning(self, function, *args) -> Page:
+        """Run a call returning a pinned page in the executor; if the caller is cancelled, unpin the page once it is."""
+        pinned = asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(function, *args)
+        )
+        try:
+            return await asyncio.shield(pinned)
+        except asyncio.CancelledError:
+            # the executor pins the page regardless, nobody else would ever unpin it
+            pinned.add_done_callback(self._UnpinAbandoned)
+            raise
+
+    def _UnpinAbandoned(self, pinned):
+        if pinned.cancelled() or pinned.exception() is not None:
+            return
+        page = pinned.result()
+        if page is not None:
+            self._bpm.UnpinPage(page.getPageId(), False)
+
+
+class AsyncPageGuard:
+    """Pins and latches a page for the body of an `async with` block, see AsyncBufferPoolManager."""
+
+    def __init__(self, pool: AsyncBufferPoolManager, page_id: page_id_t, write: bool) -> None:
+        self._pool = pool
+        self._page_id = page_id
+        self._write = write
+        self._page = None
+
+    async def __aenter__(self) -> Page:
+        page = await self._pool.fetch_page(self._page_id)
+        if page is None:
+            raise RuntimeError(
+                f"no free frame to fetch page {self._page_id}, the buffer pool is exhausted"
+            )
+        if not (page.TryWLatch() if self._write else page.TryRLatch()):
+            latched = asyncio.get_running_loop().run_in_executor(
+                self._pool._executor, page.WLatch if self._write else page.RLatch
+            )
+            try:
+                await asyncio.shield(latched)
+            except asyncio.CancelledError:
+                # the executor takes the latch regardless, give it and the pin back once it has
+                latched.add_done_callback(lambda _: self._Release(page, False))
+                raise
+        self._page = page
+        return page
+
+    async def __aexit__(self, exc_type, exc, tb):
+        page, self._page = self._page, None
+        if self._write:
+            page.WUnLatch()
+        else:
+            page.RUnLatch()
+        await self._pool.unpin_page(self._page_id, self._write)
+        return False
+
+    def _Release(self, page: Page, is_dirty):
+        if self._write:
+            page.WUnLatch()
+        else:
+            page.RUnLatch()
+        self._pool.GetBufferPoolManager().UnpinPage(self._page_id, is_dirty)
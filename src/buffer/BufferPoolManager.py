@@ -5,6 +5,7 @@ from src.storage.Page.Page import Page
 from src.storage.BasicPageGuard import BasicPageGuard
 from src.storage.WriteBackCache import WriteBackCache
 from src.buffer.LRUReplacer import LRUReplacer
+from src.buffer.VersionStore import VersionStore, PageSnapshot
 from threading import Lock
 
 
@@ -21,11 +22,13 @@ class BufferPoolManager:
         """
         * Creates a new BufferPoolManager.
         * @param pool_size the size of the buffer pool
-        * @param disk_manager the disk manager
+        * @param disk_manager the disk manager, or the file name of the database file to open one over
         * @param log_manager the log manager (for testing only: null = disable logging).
         * @param replacer the LRU replacer
         """
-        self.disk_manager = DiskManager(disk_manager)
+        if not isinstance(disk_manager, DiskManager):
+            disk_manager = DiskManager(disk_manager)
+        self.disk_manager = disk_manager
         # Number of pages in the buffer pool
         self._pool_size = pool_size
         self._log_manager = log_manager
@@ -35,20 +38,30 @@ class BufferPoolManager:
         # Initialize the free list with all frames that are currently not being used to store any page.
         self._free_list = list(range(pool_size))
         self._latch_ = Lock()
-        # The next page id to be allocated
-        self._next_page_id_ = 0
+        # The next page id to be allocated, past the pages already in the database when it is reopened
+        self._next_page_id_ = disk_manager.GetNumPages()
         # Page table for keeping track of buffer pool pages.
         self._page_table = {}
+        # Frames holding a page a cold fetch read from disk, not fetched normally since; evicted first once unpinned
+        self._cold_frames_ = set()
         # This buffer is to optimize the write requests.
         self._write_back_cache_ = WriteBackCache()
+        # Page versions kept for live snapshots, every frame copies its page there before a write that needs it
+        self._version_store_ = VersionStore()
+        for page in self._pages:
+            page._version_store_ = self._version_store_
 
     def GetPoolSize(self) -> size_t:
         """*  Return the size (number of frames) of the buffer pool. *"""
-        return self.pool_size
+        return self._pool_size
+
+    def GetLogManager(self) -> LogManager:
+        """*  Return the log manager the changes to the pages are logged with, None if logging is disabled. *"""
+        return self._log_manager
 
     def GetPages(self):
         """*  Return the pointer to all the pages in the buffer pool. *"""
-        return self.pages
+        return self._pages
 
     def NewPage(self, page_id: [page_id_t]) -> Page:
         """**
@@ -69,19 +82,34 @@ class BufferPoolManager:
         * @return null if no new pages could be created, otherwise pointer to new page
         **"""
         with self._latch_:
-            print("check if there is a free list or evictable frame")
-            if not self._free_list and not self._replacer.size():
-                print("no free list nor evictable frame")
-                return None
+            return self._NewPageLocked(page_id)
 
-            allocated_page_id, allocated_frame_id = self.AllocatePage()
-            page = Page()
-            page_id.append(allocated_page_id)
-            page._page_id_, page._pin_count_ = allocated_page_id, 1
-            self._replacer.pin(allocated_frame_id)
-            self._pages[allocated_frame_id]._page_id_ = allocated_page_id
-            print("created page", page)
-            return self._pages[allocated_frame_id]
+    def NewPageAt(self, page_id: page_id_t) -> Page:
+        """**
+        * Create a new page with a given id, which must be the next one to be allocated, e.g. a page kept at a fixed
+        * place like the root page of a new database.
+        *
+        * @param page_id id of the page to create
+        * @return null if page_id is already allocated or all frames are pinned, otherwise pointer to the new page
+        *"""
+        with self._latch_:
+            if page_id != self._next_page_id_:
+                return None
+            return self._NewPageLocked([])
+
+    def _NewPageLocked(self, page_id: [page_id_t]) -> Page:
+        """NewPage with the latch already held by the caller."""
+        allocated_page_id, allocated_frame_id = self.AllocatePage()
+        if allocated_frame_id is None:
+            return None
+        page = self._pages[allocated_frame_id]
+        page.ResetMemory()
+        page._page_id_, page._pin_count_, page._is_dirty_ = allocated_page_id, 1, False
+        self._SetRecLSN(page)
+        self._replacer.pin(allocated_frame_id)
+        self._cold_frames_.discard(allocated_frame_id)
+        page_id.append(allocated_page_id)
+        return page
 
     def NewPageGuarded(self, page_id: page_id_t) -> BasicPageGuard:
         """**
@@ -116,43 +144,82 @@ class BufferPoolManager:
         * @return null if page_id cannot be fetched, otherwise pointer to the requested page
         *"""
         with self._latch_:
-            if page_id == INVALID_PAGE_ID:
-                return None
-            if page_id in self._page_table:
-                frame_id = self._page_table[page_id]
-                self._replacer.pin(frame_id)
-                page = self._pages[frame_id]
-                page._pin_count_ += 1
-                return page
+            return self._FetchPageLocked(page_id)
 
-            # If no free frame and no evictable frame
-            if not self._free_list and not self._replacer.size():
+    def FetchResidentPage(self, page_id: page_id_t) -> Page:
+        """**
+        * Fetch a page only if it can be done right away: the page is in the pool and the latch is free, so neither
+        * disk I/O nor waiting is involved, e.g. on the thread of an event loop.
+        *
+        * @param page_id id of page to be fetched
+        * @return the pinned page, null if the page is not in the pool or the latch is held
+        *"""
+        if not self._latch_.acquire(False):
+            return None
+        try:
+            if page_id not in self._page_table:
                 return None
+            return self._FetchPageLocked(page_id)
+        finally:
+            self._latch_.release()
 
-            # Get a free frame from the free list or the replacer
-            if self._free_list:
-                frame_id = self._free_list.pop(0)
-            else:
-                victim_frame_id = [None]
-                if not self._replacer.victim(victim_frame_id):
-                    return None
-                frame_id = victim_frame_id[0]
-                page = self._pages[frame_id]
-                if page._is_dirty_:
-                    self.disk_manager.writePage(page._page_id_, page.getData())
-
-                del self._page_table[page._page_id_]
-
-            print(frame_id, "frame is ")
+    def FetchPages(self, page_ids, cold=False) -> list:
+        """**
+        * Fetch a batch of pages with a single latch acquisition. Pages missing from the pool are read from disk in
+        * page id order, so that a batch of neighbouring pages turns into sequential reads.
+        *
+        * @param page_ids ids of the pages to be fetched
+        * @param cold the pages are read once, e.g. by a scan: the ones read from disk are evicted before any other
+        *        page once unpinned, so the scan does not flush the working set out of the pool
+        * @return the pinned pages in the order of page_ids, None for a page that could not be fetched
+        *"""
+        with self._latch_:
+            fetched = {}
+            for page_id in sorted(set(page_ids)):
+                fetched[page_id] = self._FetchPageLocked(page_id, cold)
+            # a page requested twice is pinned twice, like two FetchPage calls
+            seen = set()
+            pages = []
+            for page_id in page_ids:
+                page = fetched[page_id]
+                if page is not None and page_id in seen:
+                    page._pin_count_ += 1
+                seen.add(page_id)
+                pages.append(page)
+            return pages
+
+    def _FetchPageLocked(self, page_id: page_id_t, cold=False) -> Page:
+        """FetchPage with the latch already held by the caller, see FetchPages for cold."""
+        if page_id == INVALID_PAGE_ID:
+            return None
+        if page_id in self._page_table:
+            frame_id = self._page_table[page_id]
+            self._replacer.pin(frame_id)
+            if not cold:
+                self._cold_frames_.discard(frame_id)
             page = self._pages[frame_id]
-            self._page_table[page_id] = frame_id
-            print("page id is ==========:", page_id)
-            self.disk_manager.readPage(page_id, "")
-            page._pin_count_, page._is_dirty_, page._page_id_ = 1, False, page_id
-            self._replacer.pin(page._page_id_)
-            print("ppppppppppppppppppppppppppppppp", page)
+            page._pin_count_ += 1
+            if page._pin_count_ == 1 and not page._is_dirty_:
+                self._SetRecLSN(page)
             return page
 
+        # Get a free frame from the free list or the replacer
+        frame_id = self._AllocateFrame()
+        if frame_id is None:
+            return None
+
+        page = self._pages[frame_id]
+        self._page_table[page_id] = frame_id
+        if cold:
+            self._cold_frames_.add(frame_id)
+        else:
+            self._cold_frames_.discard(frame_id)
+        self.disk_manager.readPage(page_id, page.getData())
+        page._pin_count_, page._is_dirty_, page._page_id_ = 1, False, page_id
+        self._SetRecLSN(page)
+        self._replacer.pin(frame_id)
+        return page
+
     def UnpinPage(self, page_id: page_id_t, is_dirty=None) -> bool:
         """**
         * TODO(P1): Add implementation
@@ -170,19 +237,34 @@ class BufferPoolManager:
         *
         """
         with self._latch_:
-            if page_id in self._page_table:
-                frame_id = self._page_table[page_id]
-                page: Page = self._pages[frame_id]
-                if page._pin_count_ <= 0:
-                    return False
-                self._replacer.unpin(frame_id)
-                page._pin_count_ -= 1
-                page._is_dirty_ = is_dirty or page._is_dirty_
-                if page._pin_count_ == 0:
-                    self._replacer.unpin(frame_id)
-                return True
-            else:
+            return self._UnpinPageLocked(page_id, is_dirty)
+
+    def TryUnpinPage(self, page_id: page_id_t, is_dirty=None):
+        """**
+        * UnpinPage if the latch is free, without waiting for it.
+        * @return the result of UnpinPage, None if the latch is held and the page was not unpinned
+        *"""
+        if not self._latch_.acquire(False):
+            return None
+        try:
+            return self._UnpinPageLocked(page_id, is_dirty)
+        finally:
+            self._latch_.release()
+
+    def _UnpinPageLocked(self, page_id: page_id_t, is_dirty) -> bool:
+        """UnpinPage with the latch already held by the caller."""
+        if page_id in self._page_table:
+            frame_id = self._page_table[page_id]
+            page: Page = self._pages[frame_id]
+            if page._pin_count_ <= 0:
                 return False
+            page._pin_count_ -= 1
+            page._is_dirty_ = is_dirty or page._is_dirty_
+            if page._pin_count_ == 0:
+                self._replacer.unpin(frame_id, frame_id in self._cold_frames_)
+            return True
+        else:
+            return False
 
     def FlushPage(self, page_id: page_id_t) -> bool:
         """**
@@ -202,7 +284,7 @@ class BufferPoolManager:
                 return False
             frame_id = self._page_table[page_id]
             page = self._pages[frame_id]
-            self.disk_manager.writePage(page_id, page.getData())
+            self._WritePage(page)
             page._is_dirty_ = False
             return True
 
@@ -212,9 +294,11 @@ class BufferPoolManager:
         *  Flush all the pages in the buffer pool to disk regardless of their pin status.
         *
         """
-        for page in self._pages:
-            print(page._page_id_, "flush all")
-            self.FetchPage(page._page_id_)
+        with self._latch_:
+            for page_id, frame_id in self._page_table.items():
+                page = self._pages[frame_id]
+                self._WritePage(page)
+                page._is_dirty_ = False
 
     def DeletePage(self, page_id: page_id_t) -> bool:
         """**
@@ -230,38 +314,94 @@ class BufferPoolManager:
         * @param page_id id of page to be deleted
         * @return false if the page exists but could not be deleted, true if the page didn't exist or deletion succeeded
         *"""
-        if page_id not in self._page_table:
+        with self._latch_:
+            if page_id not in self._page_table:
+                return True
+
+            frame_id = self._page_table[page_id]
+            page = self._pages[frame_id]
+            if page._pin_count_ > 0:
+                return False
+            # the page is unpinned, so unlatched: a snapshot may still have to read what it held
+            self._version_store_.Preserve(page_id, page.getData())
+            del self._page_table[page_id]
+            self._replacer.pin(frame_id)
+            self._cold_frames_.discard(frame_id)
+            self._free_list.append(frame_id)
+            page.ResetMemory()
+            page._page_id_, page._is_dirty_ = INVALID_PAGE_ID, False
             return True
 
-        frame_id = self._page_table[page_id]
-        page = self._pages[frame_id]
-        print("== in delete ", page._pin_count_)
+    def BeginSnapshot(self) -> PageSnapshot:
+        """**
+        * Take a consistent point-in-time view of the pages of the pool, e.g. for a long scan or a backup.
+        *
+        * The snapshot sees every write whose page write latch was taken before this call, and none taken after. It
+        * holds no latch: a writer that changes a page the snapshot still reads copies the page to the version store
+        * first, the copy is freed once every snapshot reading it is released. Release the snapshot, or use it in a
+        * with block, so that the copies do not pile up.
+        *
+        * A change spanning several pages is only seen whole if the caller keeps it from running while the snapshot
+        * begins, e.g. under a table latch.
+        *
+        * @return the snapshot, read with PageSnapshot.ReadPage and ReadPages
+        *"""
+        with self._latch_:
+            return self._version_store_.Begin(self, self._next_page_id_)
 
-        if page._pin_count_ > 0:
-            return False
-        print("== in delete ")
-        del self._page_table[page_id]
-        self._replacer.pin(page_id)
-        self._free_list.append(frame_id)
-        page.ResetMemory()
-        return True
+    def GetSnapshotStats(self) -> dict:
+        """* @return the counters of the version store, see VersionStore.GetStats"""
+        return self._version_store_.GetStats()
+
+    def GetDirtyPageTable(self) -> dict:
+        """**
+        * Snapshot the dirty page table for a checkpoint.
+        *
+        * A page only becomes dirty when it is unpinned, but its writer logs the change while it still holds the pin:
+        * every pinned page may thus have logged changes that are not on disk yet, and is included with the recLSN
+        * it got on its first pin.
+        *
+        * @return page id -> recLSN for every dirty or pinned page in the pool
+        *"""
+        with self._latch_:
+            return {
+                page_id: self._pages[frame_id]._rec_lsn_
+                for page_id, frame_id in self._page_table.items()
+                if self._pages[frame_id]._is_dirty_ or self._pages[frame_id]._pin_count_ > 0
+            }
+
+    def _SetRecLSN(self, page: Page):
+        """
+        Any change made to the page from now on is logged after this point, so the next lsn is a safe recLSN.
+        Called when a clean page gets its first pin.
+        """
+        if self._log_manager is not None:
+            page._rec_lsn_ = self._log_manager.GetNextLSN()
+
+    def _WritePage(self, page: Page):
+        """Write a page back to disk, forcing the log up to the page LSN first (write-ahead logging)."""
+        if self._log_manager is None:
+            self.disk_manager.writePage(page._page_id_, page.getData())
+            return
+        # changes logged from here on may miss this write
+        rec_lsn = self._log_manager.GetNextLSN()
+        self._log_manager.Flush(page.GetLNS())
+        self.disk_manager.writePage(page._page_id_, page.getData())
+        page._rec_lsn_ = rec_lsn
 
     def _AllocateFrame(self):
+        """Take a frame from the free list, or evict a victim and write it back if dirty. Caller holds the latch."""
         if self._free_list:
-            print("1- Checking the free list")
             frame_id = self._free_list.pop(0)
-            print("1.1 - Founded frame list from the free list", frame_id)
         else:
-            print("2- Checking evictable place")
             victim_frame_id = [None]
             if not self._replacer.victim(victim_frame_id):
                 return None
             frame_id = victim_frame_id[0]
-            print("2.2- Founded frame id:  ", frame_id)
             page = self._pages[frame_id]
-            print("2.3- Founded page : ", page)
             if page._is_dirty_:
-                self.disk_manager.writePage(page._page_id_, page.getData())
+                self._WritePage(page)
+                page._is_dirty_ = False
 
             del self._page_table[page._page_id_]
         return frame_id
@@ -269,15 +409,21 @@ class BufferPoolManager:
     def AllocatePage(self) -> page_id_t:
         """**
         * Allocate a page on disk. Caller should acquire the latch before calling this function.
-        * @return the id of the allocated page and the frame id
+        * @return the id of the allocated page and the frame id, (INVALID_PAGE_ID, None) if every frame is pinned
         *"""
         allocated_frame_id = self._AllocateFrame()
+        if allocated_frame_id is None:
+            return INVALID_PAGE_ID, None
         allocated_page_id = self._next_page_id_
         self._next_page_id_ += 1
-        print("allocated page id is : ", allocated_page_id)
         self._page_table[allocated_page_id] = allocated_frame_id
         return allocated_page_id, allocated_frame_id
 
+    def ReservePageIds(self, page_id: page_id_t):
+        """* Make sure page ids up to and including page_id are never handed out again, used at restart."""
+        with self._latch_:
+            self._next_page_id_ = max(self._next_page_id_, page_id + 1)
+
     def DeallocatePage(self):
         """This is a no-nop right now without a more complex data structure to track deallocated pages"""
         with self._latch_:
@@ -18,9 +18,8 @@ class LRUReplacer(Replacer):
     def victim(self, frame_id) -> bool:
         with self.lock:
             if not self.lru:
-                return False, None
+                return False
             victim_frame_id, _ = self.lru.popitem(last=False)
-            print(_, frame_id)
             frame_id[0] = victim_frame_id
             return True
 
@@ -29,7 +28,7 @@ class LRUReplacer(Replacer):
             if frame_id in self.lru:
                 del self.lru[frame_id]
 
-    def unpin(self, frame_id: page_id_t):
+    def unpin(self, frame_id: page_id_t, cold=False):
         with self.lock:
             if frame_id not in self.lru:
                 self.lru[frame_id] = {}  # of type frame
@@ -37,6 +36,9 @@ class LRUReplacer(Replacer):
                     self.lru.popitem(last=False)
             else:
                 self.lru.move_to_end(frame_id)
+            if cold:
+                # scan-resistant insertion: the next victim instead of the most recently used
+                self.lru.move_to_end(frame_id, last=False)
 
     def size(self) -> size_t:
         with self.lock:
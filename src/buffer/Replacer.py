@@ -23,10 +23,11 @@ class Replacer(ABC):
         pass
 
     @abstractmethod
-    def unpin(frame_id: frame_id_t):
+    def unpin(frame_id: frame_id_t, cold=False):
         """
         * Unpins a frame, indicating that it can now be victimized.
         * @param frame_id the id of the frame to unpin
+        * @param cold the frame holds a page read once by a scan, victimize it before the others
         """
         pass
 
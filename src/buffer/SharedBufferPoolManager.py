@@ -0,0 +1,580 @@
+from src.config import size_t, page_id_t, frame_id_t, INVALID_PAGE_ID, PAGE_SIZE
+from src.storage.DiskManager import DiskManager
+from src.storage.PageCodec import PageCodec
+from src.storage.Page.Page import Page
+from array import array
+from multiprocessing import shared_memory
+import multiprocessing
+import os
+import time
+
+"""
+ * SharedBufferPoolManager keeps the buffer pool in a multiprocessing.shared_memory segment, so that several worker
+ * processes fetch, pin and modify the pages of one database through one cache, each on its own core, instead of every
+ * process caching its own copy of the pages.
+ *
+ * Segment format (size in byte):
+ *  ------------------------------------------------------------------------------------------
+ * | NextPageId (8) | ClockHand (8) | FrameTable (28 * pool_size) | PageTable (8 * capacity) |
+ *  ------------------------------------------------------------------------------------------
+ *  -----------------------------------
+ * | Frames (PAGE_SIZE * pool_size) |
+ *  -----------------------------------
+ *
+ * A frame table entry is seven int32: PageId, PinCount, Dirty, Referenced, Latch, WaitingWriters and Version. The page
+ * table maps page ids to frame ids by open addressing with linear probing over capacity slots of (PageId, FrameId),
+ * capacity being a power of two of at least twice the pool size; INVALID_PAGE_ID marks an empty slot. Frames are
+ * replaced by the CLOCK policy over the Referenced bits, a page read by a cold fetch starts without one.
+ *
+ * Latch protocol: the page table, the frame table entries but for the page latches, the clock hand and the page id
+ * allocation are guarded by one process-shared lock, the pool latch. Like the latch of BufferPoolManager it is held
+ * for the bookkeeping of a call and for the disk I/O of a miss or an eviction, never while a page is being used.
+ * The latch of a page is the Latch word of its frame, the number of readers or -1 for a writer, changed under one of
+ * LATCH_STRIPES process-shared locks picked by frame id; a process that cannot take it yet backs off and retries. A
+ * waiting writer counts itself in WaitingWriters, which holds back new readers, so writers are not starved; Version is
+ * bumped when the write latch is taken and released, as Page.GetVersion is for optimistic reads.
+ *
+ * Sharing the pool: pass it to a multiprocessing.Process as an argument, or let a forked child inherit it; the
+ * processes must be started from the multiprocessing context the pool was created with. Each
+ * process opens its own DiskManager over db_file on first use, since file offsets must not be shared. The process that
+ * created the pool owns the segment and removes it in shutdown, the others only detach with Close. The pool has no
+ * log manager: write-ahead logging across processes would need a shared log. Nor does it take a page codec, as the
+ * extent map of a compressed database file would have to be shared as well.
+ *
+ * Only page operations are safe across processes: fetching, pinning, latching, modifying, flushing and deleting pages.
+ * Structures built over the pages keep state of their own in each process. DiskExtendibleHashTable in particular
+ * guards its header and directories with a table latch and a version that live in the memory of one process, so the
+ * splits and directory changes of two processes interleave and lose keys: a hash table over a shared pool must only
+ * be opened and used by one process at a time.
+"""
+
+LATCH_STRIPES = 16
+
+# frame table entry fields
+_PAGE_ID, _PIN_COUNT, _DIRTY, _REFERENCED, _LATCH, _WAITING_WRITERS, _VERSION = range(7)
+_FRAME_FIELDS = 7
+_HEADER_SIZE = 16
+_NEXT_PAGE_ID, _CLOCK_HAND = range(2)
+
+
+class _SharedPage(Page):
+    """A frame of the shared pool, seen from one process. The book-keeping lives in the frame table entry."""
+
+    def __init__(self, pool, frame_id: frame_id_t, data) -> None:
+        self._pool = pool
+        self._frame_id = frame_id
+        self._data_ = data
+        self._rec_lsn_ = None
+        # snapshots are not supported across processes, see SharedBufferPoolManager.BeginSnapshot
+        self._version_store_ = None
+
+    @property
+    def _page_id_(self) -> page_id_t:
+        return self._pool._frames[self._frame_id * _FRAME_FIELDS + _PAGE_ID]
+
+    @property
+    def _pin_count_(self) -> int:
+        return self._pool._frames[self._frame_id * _FRAME_FIELDS + _PIN_COUNT]
+
+    @property
+    def _is_dirty_(self) -> bool:
+        return bool(self._pool._frames[self._frame_id * _FRAME_FIELDS + _DIRTY])
+
+    @property
+    def _version_(self) -> int:
+        return self._pool._frames[self._frame_id * _FRAME_FIELDS + _VERSION]
+
+    def WLatch(self):
+        """* Acquire the page write latch. *"""
+        self._pool._WLatchFrame(self._frame_id)
+
+    def WUnLatch(self):
+        """* Release the page write latch. *"""
+        self._pool._WUnLatchFrame(self._frame_id)
+
+    def TryWLatch(self) -> bool:
+        """* @return whether the page write latch was acquired, without waiting *"""
+        return self._pool._WLatchFrame(self._frame_id, wait=False)
+
+    def RLatch(self):
+        """* Acquire the page read latch. *"""
+        self._pool._RLatchFrame(self._frame_id)
+
+    def TryRLatch(self) -> bool:
+        """* @return whether the page read latch was acquired, without waiting *"""
+        return self._pool._RLatchFrame(self._frame_id, wait=False)
+
+    def RUnLatch(self):
+        """* Release the page read latch. *"""
+        self._pool._RUnLatchFrame(self._frame_id)
+
+
+class SharedBufferPoolManager:
+    """"""
+
+    def __init__(self, pool_size: size_t, db_file, codec: PageCodec = None, context=None):
+        """
+        * Creates a new buffer pool in a shared memory segment.
+        * @param pool_size the size of the buffer pool
+        * @param db_file the file name of the database file, every process opens its own disk manager over it
+        * @param codec page codec of the database file, must be None: the extent map of a compressed file lives in the
+        *        memory of one process, so the processes would allocate the same extents for different pages
+        * @param context the multiprocessing context the worker processes are started from, the default one if None
+        """
+        if codec is not None:
+            raise ValueError("compression is not supported by the shared buffer pool")
+        capacity = 1
+        while capacity < 2 * pool_size:
+            capacity <<= 1
+        self._pool_size = pool_size
+        self._capacity = capacity
+        self._db_file = db_file
+        self._log_manager = None
+        self._disk_manager = None
+        self._disk_manager_pid = None
+        size = (
+            _HEADER_SIZE
+            + 4 * _FRAME_FIELDS * pool_size
+            + 8 * capacity
+            + PAGE_SIZE * pool_size
+        )
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owner_pid = os.getpid()
+        context = context or multiprocessing.get_context()
+        self._latch_ = context.Lock()
+        self._frame_latches = [context.Lock() for _ in range(LATCH_STRIPES)]
+        self._Attach()
+
+        self._frames[:] = array("i", _EMPTY_FRAME * pool_size)
+        self._table[:] = array("i", _EMPTY_SLOT * capacity)
+        self._header[_NEXT_PAGE_ID] = self.disk_manager.GetNumPages()
+        self._header[_CLOCK_HAND] = 0
+
+    def __getstate__(self):
+        return {
+            "pool_size": self._pool_size,
+            "capacity": self._capacity,
+            "db_file": self._db_file,
+            "name": self._shm.name,
+            "owner_pid": self._owner_pid,
+            "latch": self._latch_,
+            "frame_latches": self._frame_latches,
+        }
+
+    def __setstate__(self, state):
+        self._pool_size = state["pool_size"]
+        self._capacity = state["capacity"]
+        self._db_file = state["db_file"]
+        self._owner_pid = state["owner_pid"]
+        self._latch_ = state["latch"]
+        self._frame_latches = state["frame_latches"]
+        self._log_manager = None
+        self._disk_manager = None
+        self._disk_manager_pid = None
+        # worker processes share the resource tracker of the creating process, attaching registers the segment again
+        # with it, which is a no-op
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._Attach()
+
+    def _Attach(self):
+        """Lay the views of this process over the segment."""
+        buf = self._shm.buf
+        frames_offset = _HEADER_SIZE
+        table_offset = frames_offset + 4 * _FRAME_FIELDS * self._pool_size
+        data_offset = table_offset + 8 * self._capacity
+        self._header = buf[:_HEADER_SIZE].cast("q")
+        self._frames = buf[frames_offset:table_offset].cast("i")
+        self._table = buf[table_offset:data_offset].cast("i")
+        self._pages = [
+            _SharedPage(
+                self,
+                frame_id,
+                buf[data_offset + frame_id * PAGE_SIZE : data_offset + (frame_id + 1) * PAGE_SIZE],
+            )
+            for frame_id in range(self._pool_size)
+        ]
+
+    @property
+    def disk_manager(self) -> DiskManager:
+        """* @return the disk manager of the calling process, opened on first use"""
+        if self._disk_manager_pid != os.getpid():
+            self._disk_manager = DiskManager(self._db_file)
+            self._disk_manager_pid = os.getpid()
+        return self._disk_manager
+
+    def GetPoolSize(self) -> size_t:
+        """*  Return the size (number of frames) of the buffer pool. *"""
+        return self._pool_size
+
+    def GetLogManager(self):
+        """*  Return None, the pool has no log manager, see the module doc. *"""
+        return self._log_manager
+
+    def GetPages(self):
+        """*  Return the frames of the buffer pool as seen from this process. *"""
+        return self._pages
+
+    def NewPage(self, page_id: [page_id_t]) -> Page:
+        """**
+        * Create a new page in the buffer pool, see BufferPoolManager.NewPage.
+        *
+        * @param[out] page_id id of created page
+        * @return null if no new pages could be created, otherwise pointer to new page
+        **"""
+        with self._latch_:
+            return self._NewPageLocked(page_id)
+
+    def NewPageAt(self, page_id: page_id_t) -> Page:
+        """**
+        * Create a new page with a given id, see BufferPoolManager.NewPageAt.
+        *
+        * @param page_id id of the page to create
+        * @return null if page_id is already allocated or all frames are pinned, otherwise pointer to the new page
+        *"""
+        with self._latch_:
+            if page_id != self._header[_NEXT_PAGE_ID]:
+                return None
+            return self._NewPageLocked([])
+
+    def _NewPageLocked(self, page_id: [page_id_t]) -> Page:
+        """NewPage with the latch already held by the caller."""
+        allocated_page_id, allocated_frame_id = self.AllocatePage()
+        if allocated_frame_id is None:
+            return None
+        page = self._pages[allocated_frame_id]
+        page.ResetMemory()
+        self._SetFrame(allocated_frame_id, allocated_page_id)
+        page_id.append(allocated_page_id)
+        return page
+
+    def FetchPage(self, page_id: page_id_t) -> Page:
+        """**
+        * Fetch the requested page from the buffer pool, see BufferPoolManager.FetchPage.
+        *
+        * @param page_id id of page to be fetched
+        * @return null if page_id cannot be fetched, otherwise pointer to the requested page
+        *"""
+        with self._latch_:
+            return self._FetchPageLocked(page_id)
+
+    def FetchResidentPage(self, page_id: page_id_t) -> Page:
+        """**
+        * Fetch a page only if it is in the pool and the latch is free, see BufferPoolManager.FetchResidentPage.
+        *
+        * @param page_id id of page to be fetched
+        * @return the pinned page, null if the page is not in the pool or the latch is held
+        *"""
+        if not self._latch_.acquire(False):
+            return None
+        try:
+            if self._Lookup(page_id) is None:
+                return None
+            return self._FetchPageLocked(page_id)
+        finally:
+            self._latch_.release()
+
+    def FetchPages(self, page_ids, cold=False) -> list:
+        """**
+        * Fetch a batch of pages with a single latch acquisition, see BufferPoolManager.FetchPages.
+        *
+        * @param page_ids ids of the pages to be fetched
+        * @param cold the pages are read once: the ones read from disk start without a reference bit, so the clock
+        *        evicts them first
+        * @return the pinned pages in the order of page_ids, None for a page that could not be fetched
+        *"""
+        with self._latch_:
+            fetched = {}
+            for page_id in sorted(set(page_ids)):
+                fetched[page_id] = self._FetchPageLocked(page_id, cold)
+            # a page requested twice is pinned twice, like two FetchPage calls
+            seen = set()
+            pages = []
+            for page_id in page_ids:
+                page = fetched[page_id]
+                if page is not None and page_id in seen:
+                    self._frames[page._frame_id * _FRAME_FIELDS + _PIN_COUNT] += 1
+                seen.add(page_id)
+                pages.append(page)
+            return pages
+
+    def _FetchPageLocked(self, page_id: page_id_t, cold=False) -> Page:
+        """FetchPage with the latch already held by the caller, see FetchPages for cold."""
+        if page_id == INVALID_PAGE_ID:
+            return None
+        frames = self._frames
+        frame_id = self._Lookup(page_id)
+        if frame_id is not None:
+            entry = frame_id * _FRAME_FIELDS
+            frames[entry + _PIN_COUNT] += 1
+            if not cold:
+                frames[entry + _REFERENCED] = 1
+            return self._pages[frame_id]
+
+        frame_id = self._AllocateFrame()
+        if frame_id is None:
+            return None
+        page = self._pages[frame_id]
+        self.disk_manager.readPage(page_id, page.getData())
+        self._SetFrame(frame_id, page_id, referenced=not cold)
+        return page
+
+    def UnpinPage(self, page_id: page_id_t, is_dirty=None) -> bool:
+        """**
+        * Unpin the target page from the buffer pool, see BufferPoolManager.UnpinPage.
+        *
+        * @param page_id id of page to be unpinned
+        * @param is_dirty true if the page should be marked as dirty, false otherwise
+        * @return false if the page is not in the page table or its pin count is <= 0 before this call, true otherwise
+        *"""
+        with self._latch_:
+            return self._UnpinPageLocked(page_id, is_dirty)
+
+    def TryUnpinPage(self, page_id: page_id_t, is_dirty=None):
+        """**
+        * UnpinPage if the latch is free, without waiting for it.
+        * @return the result of UnpinPage, None if the latch is held and the page was not unpinned
+        *"""
+        if not self._latch_.acquire(False):
+            return None
+        try:
+            return self._UnpinPageLocked(page_id, is_dirty)
+        finally:
+            self._latch_.release()
+
+    def _UnpinPageLocked(self, page_id: page_id_t, is_dirty) -> bool:
+        """UnpinPage with the latch already held by the caller."""
+        frame_id = self._Lookup(page_id)
+        if frame_id is None:
+            return False
+        entry = frame_id * _FRAME_FIELDS
+        if self._frames[entry + _PIN_COUNT] <= 0:
+            return False
+        self._frames[entry + _PIN_COUNT] -= 1
+        if is_dirty:
+            self._frames[entry + _DIRTY] = 1
+        return True
+
+    def FlushPage(self, page_id: page_id_t) -> bool:
+        """**
+        * Flush the target page to disk regardless of the dirty flag, and unset it.
+        *
+        * @param page_id id of page to be flushed, cannot be INVALID_PAGE_ID
+        * @return false if the page could not be found in the page table, true otherwise
+        *"""
+        with self._latch_:
+            frame_id = None if page_id == INVALID_PAGE_ID else self._Lookup(page_id)
+            if frame_id is None:
+                return False
+            self._WriteFrame(frame_id)
+            return True
+
+    def FlushAllPages(self):
+        """**
+        *  Flush all the pages in the buffer pool to disk regardless of their pin status.
+        *"""
+        with self._latch_:
+            for frame_id in range(self._pool_size):
+                if self._frames[frame_id * _FRAME_FIELDS + _PAGE_ID] != INVALID_PAGE_ID:
+                    self._WriteFrame(frame_id)
+
+    def DeletePage(self, page_id: page_id_t) -> bool:
+        """**
+        * Delete a page from the buffer pool, see BufferPoolManager.DeletePage.
+        *
+        * @param page_id id of page to be deleted
+        * @return false if the page exists but could not be deleted, true if the page didn't exist or deletion succeeded
+        *"""
+        with self._latch_:
+            frame_id = self._Lookup(page_id)
+            if frame_id is None:
+                return True
+            if self._frames[frame_id * _FRAME_FIELDS + _PIN_COUNT] > 0:
+                return False
+            self._Erase(page_id)
+            self._pages[frame_id].ResetMemory()
+            self._ClearFrame(frame_id)
+            return True
+
+    def BeginSnapshot(self):
+        """**
+        * Snapshots keep their page versions in the memory of one process, which the writers of the other processes
+        * cannot copy to: they are not supported by a shared pool, see BufferPoolManager.BeginSnapshot.
+        *"""
+        raise RuntimeError("page snapshots are not supported by a buffer pool shared between processes")
+
+    def AllocatePage(self) -> page_id_t:
+        """**
+        * Allocate a page on disk. Caller should acquire the latch before calling this function.
+        * @return the id of the allocated page and the frame id, (INVALID_PAGE_ID, None) if every frame is pinned
+        *"""
+        frame_id = self._AllocateFrame()
+        if frame_id is None:
+            return INVALID_PAGE_ID, None
+        allocated_page_id = self._header[_NEXT_PAGE_ID]
+        self._header[_NEXT_PAGE_ID] = allocated_page_id + 1
+        return allocated_page_id, frame_id
+
+    def ReservePageIds(self, page_id: page_id_t):
+        """* Make sure page ids up to and including page_id are never handed out again, used at restart."""
+        with self._latch_:
+            self._header[_NEXT_PAGE_ID] = max(self._header[_NEXT_PAGE_ID], page_id + 1)
+
+    def Close(self):
+        """* Detach this process from the pool, the pages it fetched must not be used afterwards."""
+        for page in self._pages:
+            page._data_.release()
+        self._pages = []
+        for view in (self._header, self._frames, self._table):
+            view.release()
+        self._shm.close()
+        if self._disk_manager is not None and self._disk_manager_pid == os.getpid():
+            self._disk_manager.shutdown()
+        self._disk_manager = None
+
+    def shutdown(self):
+        """* Flush the pool and detach from it; the process that created the pool also removes the segment."""
+        self.FlushAllPages()
+        owner = self._owner_pid == os.getpid()
+        self.Close()
+        if owner:
+            self._shm.unlink()
+
+    def _AllocateFrame(self):
+        """
+        * Take a free frame, or the victim of the clock and write it back if dirty. Caller holds the latch.
+        * @return the frame id, None if every frame is pinned
+        """
+        frames, pool_size = self._frames, self._pool_size
+        hand = self._header[_CLOCK_HAND]
+        # two sweeps: the first one may only clear reference bits
+        for _ in range(2 * pool_size):
+            frame_id, hand = hand, (hand + 1) % pool_size
+            entry = frame_id * _FRAME_FIELDS
+            if frames[entry + _PIN_COUNT]:
+                continue
+            if frames[entry + _PAGE_ID] == INVALID_PAGE_ID:
+                break
+            if frames[entry + _REFERENCED]:
+                frames[entry + _REFERENCED] = 0
+                continue
+            if frames[entry + _DIRTY]:
+                self._WriteFrame(frame_id)
+            self._Erase(frames[entry + _PAGE_ID])
+            self._ClearFrame(frame_id)
+            break
+        else:
+            return None
+        self._header[_CLOCK_HAND] = hand
+        return frame_id
+
+    def _SetFrame(self, frame_id, page_id, referenced=True):
+        """Install page_id pinned once in a free frame. Caller holds the latch."""
+        entry = frame_id * _FRAME_FIELDS
+        frames = self._frames
+        frames[entry + _PAGE_ID] = page_id
+        frames[entry + _PIN_COUNT] = 1
+        frames[entry + _DIRTY] = 0
+        frames[entry + _REFERENCED] = int(referenced)
+        self._Insert(page_id, frame_id)
+
+    def _ClearFrame(self, frame_id):
+        entry = frame_id * _FRAME_FIELDS
+        self._frames[entry + _PAGE_ID] = INVALID_PAGE_ID
+        self._frames[entry + _DIRTY] = 0
+        self._frames[entry + _REFERENCED] = 0
+
+    def _WriteFrame(self, frame_id):
+        """Write a frame back to disk and mark it clean. Caller holds the latch."""
+        entry = frame_id * _FRAME_FIELDS
+        self.disk_manager.writePage(self._frames[entry + _PAGE_ID], self._pages[frame_id].getData())
+        self._frames[entry + _DIRTY] = 0
+
+    def _Slot(self, page_id) -> int:
+        """@return the home slot of page_id in the page table"""
+        return ((page_id * 0x9E3779B1) & 0xFFFFFFFF) & (self._capacity - 1)
+
+    def _Lookup(self, page_id):
+        """@return the frame holding page_id, None if it is not in the pool. Caller holds the latch."""
+        table, mask = self._table, self._capacity - 1
+        slot = self._Slot(page_id)
+        while True:
+            stored = table[2 * slot]
+            if stored == page_id:
+                return table[2 * slot + 1]
+            if stored == INVALID_PAGE_ID:
+                return None
+            slot = (slot + 1) & mask
+
+    def _Insert(self, page_id, frame_id):
+        table, mask = self._table, self._capacity - 1
+        slot = self._Slot(page_id)
+        while table[2 * slot] != INVALID_PAGE_ID:
+            slot = (slot + 1) & mask
+        table[2 * slot], table[2 * slot + 1] = page_id, frame_id
+
+    def _Erase(self, page_id):
+        """Remove page_id, shifting back the entries of its probe run so that lookups need no tombstones."""
+        table, mask = self._table, self._capacity - 1
+        slot = self._Slot(page_id)
+        while table[2 * slot] != page_id:
+            slot = (slot + 1) & mask
+        hole, slot = slot, (slot + 1) & mask
+        while table[2 * slot] != INVALID_PAGE_ID:
+            home = self._Slot(table[2 * slot])
+            # the entry may move to the hole unless its home lies cyclically in (hole, slot]
+            if (slot - home) & mask >= (slot - hole) & mask:
+                table[2 * hole], table[2 * hole + 1] = table[2 * slot], table[2 * slot + 1]
+                hole = slot
+            slot = (slot + 1) & mask
+        table[2 * hole], table[2 * hole + 1] = INVALID_PAGE_ID, INVALID_PAGE_ID
+
+    def _RLatchFrame(self, frame_id, wait=True) -> bool:
+        """@return whether the read latch of the frame was acquired, always true when waiting"""
+        entry, lock = frame_id * _FRAME_FIELDS, self._frame_latches[frame_id % LATCH_STRIPES]
+        frames, attempt = self._frames, 0
+        while True:
+            with lock:
+                if frames[entry + _LATCH] >= 0 and not frames[entry + _WAITING_WRITERS]:
+                    frames[entry + _LATCH] += 1
+                    return True
+            if not wait:
+                return False
+            attempt = _Backoff(attempt)
+
+    def _RUnLatchFrame(self, frame_id):
+        with self._frame_latches[frame_id % LATCH_STRIPES]:
+            self._frames[frame_id * _FRAME_FIELDS + _LATCH] -= 1
+
+    def _WLatchFrame(self, frame_id, wait=True) -> bool:
+        """@return whether the write latch of the frame was acquired, always true when waiting"""
+        entry, lock = frame_id * _FRAME_FIELDS, self._frame_latches[frame_id % LATCH_STRIPES]
+        frames, attempt = self._frames, 0
+        while True:
+            with lock:
+                if frames[entry + _LATCH] == 0:
+                    frames[entry + _LATCH] = -1
+                    frames[entry + _VERSION] += 1
+                    if attempt:
+                        frames[entry + _WAITING_WRITERS] -= 1
+                    return True
+                if not wait:
+                    return False
+                if not attempt:
+                    frames[entry + _WAITING_WRITERS] += 1
+            attempt = _Backoff(attempt)
+
+    def _WUnLatchFrame(self, frame_id):
+        entry = frame_id * _FRAME_FIELDS
+        with self._frame_latches[frame_id % LATCH_STRIPES]:
+            self._frames[entry + _VERSION] += 1
+            self._frames[entry + _LATCH] = 0
+
+
+_EMPTY_FRAME = [INVALID_PAGE_ID, 0, 0, 0, 0, 0, 0]
+_EMPTY_SLOT = [INVALID_PAGE_ID, INVALID_PAGE_ID]
+
+
+def _Backoff(attempt) -> int:
+    """Yield the CPU before the next attempt at a page latch, sleeping longer after repeated failures."""
+    time.sleep(0 if attempt < 8 else min(0.001, 1e-5 * (1 << min(attempt - 8, 7))))
+    return attempt + 1
@@ -0,0 +1,214 @@
+from src.config import page_id_t, INVALID_PAGE_ID
+import threading
+
+"""
+ * VersionStore keeps the page images that live snapshots of a buffer pool still need.
+ *
+ * A snapshot is a point in time, a tick of the store clock. A page version is valid from the tick of the write that
+ * produced it to the tick of the next write. A writer that takes the write latch of a page while a snapshot reads
+ * its current version first copies that version into the store; the copy is shared by every snapshot that reads it
+ * and freed when the last of them is released. Once a page is copied its write tick is past every live snapshot, so
+ * further writes to it copy nothing until a new snapshot begins: a writer pays at most one copy per page and
+ * snapshot, and nothing at all while no snapshot is live.
+ *
+ * A snapshot reads a page from the store if it holds the version of its tick, else from the buffer pool under the
+ * read latch, held only for the copy of one page. Readers never hold a page latch across their work, so a long scan
+ * or backup no longer blocks the writers of the pages it reads.
+ *
+ *   with bpm.BeginSnapshot() as snapshot:
+ *       data = snapshot.ReadPage(page_id)
+"""
+
+
+class _PageVersion:
+    """A page image valid for the snapshots with a tick in (begin, end)."""
+
+    __slots__ = ("begin", "end", "data", "refs")
+
+    def __init__(self, begin, end, data, refs) -> None:
+        self.begin = begin
+        self.end = end
+        self.data = data
+        self.refs = refs
+
+
+class VersionStore:
+    def __init__(self) -> None:
+        self._latch_ = threading.Lock()
+        self._clock_ = 0
+        # live snapshots, checked without the latch by writers: empty means no copy is ever needed
+        self._snapshots_ = []
+        # page id -> tick of its last write while a snapshot was live, 0 (older than every snapshot) if not tracked
+        self._write_ticks_ = {}
+        # page id -> versions still read by a live snapshot
+        self._versions_ = {}
+        self._stats_ = dict.fromkeys(("copies", "bytes", "versions", "max_bytes"), 0)
+
+    def Begin(self, bpm, num_pages) -> "PageSnapshot":
+        """
+        * Begin a snapshot, it sees every write whose page write latch was taken before.
+        * @param bpm the buffer pool the snapshot reads the current page versions from
+        * @param num_pages number of pages allocated so far, the snapshot reads none past them
+        """
+        with self._latch_:
+            self._clock_ += 1
+            snapshot = PageSnapshot(self, bpm, self._clock_, num_pages)
+            self._snapshots_.append(snapshot)
+            return snapshot
+
+    def Preserve(self, page_id: page_id_t, data):
+        """
+        * Called before a page is changed, see Page.PrepareWrite, or deleted: copy its current version if a live
+        * snapshot reads it. Pages allocated after a snapshot began are never copied for it.
+        * @param data the page data as it is before the change
+        """
+        if page_id == INVALID_PAGE_ID:
+            return
+        with self._latch_:
+            if not self._snapshots_:
+                return
+            self._clock_ += 1
+            begin = self._write_ticks_.get(page_id, 0)
+            self._write_ticks_[page_id] = self._clock_
+            readers = [
+                snapshot
+                for snapshot in self._snapshots_
+                if snapshot._tick_ > begin and page_id < snapshot._num_pages_
+            ]
+            if not readers:
+                return
+            version = _PageVersion(begin, self._clock_, bytes(data), len(readers))
+            self._versions_.setdefault(page_id, []).append(version)
+            for snapshot in readers:
+                snapshot._versions_.append((page_id, version))
+            stats = self._stats_
+            stats["copies"] += 1
+            stats["versions"] += 1
+            stats["bytes"] += len(version.data)
+            stats["max_bytes"] = max(stats["max_bytes"], stats["bytes"])
+
+    def Lookup(self, page_id: page_id_t, tick):
+        """* @return the image of the page a snapshot of that tick reads, None if it reads the current version"""
+        with self._latch_:
+            for version in self._versions_.get(page_id, ()):
+                if version.begin < tick < version.end:
+                    return version.data
+            return None
+
+    def Release(self, snapshot: "PageSnapshot"):
+        """* End a snapshot, the versions no other live snapshot reads are freed."""
+        with self._latch_:
+            if snapshot not in self._snapshots_:
+                return
+            self._snapshots_.remove(snapshot)
+            for page_id, version in snapshot._versions_:
+                version.refs -= 1
+                if version.refs:
+                    continue
+                versions = self._versions_[page_id]
+                versions.remove(version)
+                if not versions:
+                    del self._versions_[page_id]
+                self._stats_["versions"] -= 1
+                self._stats_["bytes"] -= len(version.data)
+            snapshot._versions_ = []
+            # a page last written before the oldest live snapshot is read at its current version by all of them
+            oldest = min((live._tick_ for live in self._snapshots_), default=None)
+            if oldest is None:
+                self._write_ticks_.clear()
+            else:
+                self._write_ticks_ = {
+                    page_id: tick for page_id, tick in self._write_ticks_.items() if tick > oldest
+                }
+
+    def GetStats(self) -> dict:
+        """
+        * @return the number of live snapshots, of page copies made so far, of versions and bytes held now and the
+        *         largest number of bytes held at once
+        """
+        with self._latch_:
+            return dict(self._stats_, snapshots=len(self._snapshots_))
+
+
+class PageSnapshot:
+    """A consistent point-in-time view of the pages of a buffer pool, see BufferPoolManager.BeginSnapshot."""
+
+    def __init__(self, store: VersionStore, bpm, tick, num_pages) -> None:
+        self._store_ = store
+        self._bpm = bpm
+        self._tick_ = tick
+        self._num_pages_ = num_pages
+        # (page id, version) of every version this snapshot holds a reference to
+        self._versions_ = []
+
+    def ReadPage(self, page_id: page_id_t) -> bytes:
+        """**
+        * @param page_id id of the page to read
+        * @return a copy of the page as it was when the snapshot began, None if it did not exist yet
+        *"""
+        return self.ReadPages([page_id])[0]
+
+    def ReadPages(self, page_ids) -> list:
+        """**
+        * Read a range of pages. The pages the store does not hold are fetched from the pool in cold batched fetches
+        * of half the pool at most, so a backup neither issues scattered reads nor evicts the working set.
+        *
+        * @param page_ids ids of the pages to read
+        * @return the copies of the pages in the order of page_ids, None for a page that did not exist yet
+        *"""
+        if self._bpm is None:
+            raise RuntimeError("the snapshot was released")
+        page_ids = list(page_ids)
+        images = {}
+        missing = []
+        for page_id in set(page_ids):
+            if page_id == INVALID_PAGE_ID or page_id >= self._num_pages_:
+                images[page_id] = None
+                continue
+            data = self._store_.Lookup(page_id, self._tick_)
+            if data is None:
+                missing.append(page_id)
+            else:
+                images[page_id] = data
+        missing.sort()
+        window = max(1, self._bpm.GetPoolSize() // 2)
+        for start in range(0, len(missing), window):
+            self._ReadCurrent(missing[start : start + window], images)
+        return [images[page_id] for page_id in page_ids]
+
+    def _ReadCurrent(self, page_ids, images: dict):
+        """Copy pages from the pool, each under its read latch, unless a writer copied their version out meanwhile."""
+        pages = self._bpm.FetchPages(page_ids, cold=True)
+        try:
+            for page_id, page in zip(page_ids, pages):
+                if page is None:
+                    raise RuntimeError(f"no free frame to read page {page_id}, the buffer pool is exhausted")
+                page.RLatch()
+                try:
+                    current = bytes(page.getData())
+                finally:
+                    page.RUnLatch()
+                # a writer copies the version out before it changes the page, even one that does not take the page
+                # latch: if the store has no version for the snapshot after the copy, the copy is untouched
+                data = self._store_.Lookup(page_id, self._tick_)
+                images[page_id] = current if data is None else data
+        finally:
+            for page_id, page in zip(page_ids, pages):
+                if page is not None:
+                    self._bpm.UnpinPage(page_id, False)
+
+    def GetTick(self) -> int:
+        """* @return the tick of the version store clock the snapshot was taken at"""
+        return self._tick_
+
+    def Release(self):
+        """* End the snapshot and free the page versions only it was holding. Safe to call twice."""
+        self._bpm = None
+        self._store_.Release(self)
+
+    def __enter__(self) -> "PageSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.Release()
+        return False
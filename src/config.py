@@ -18,9 +18,69 @@ HEADER_PAGE_ID = 0
 # size of a data page in byte
 PAGE_SIZE = 4096
 
+# size of the header every page starts with (page id and LSN), in byte
+PAGE_HEADER_SIZE = 8
+
 # size of buffer pool
 BUFFER_POOL_SIZE = 10
 
+# size of a log buffer in byte
+LOG_BUFFER_SIZE = (BUFFER_POOL_SIZE + 1) * PAGE_SIZE
+
+# how long the log flush thread waits before flushing a non-empty log buffer, in seconds
+LOG_TIMEOUT = 0.01
+
+# size of the chunks the log is scanned in, in byte
+LOG_READ_CHUNK_SIZE = 1 << 20
+
+# least fraction of the log file a truncation must drop; the surviving tail is copied into a new file, so at 0.5 the
+# copy is never larger than what it drops and its cost is amortized over the appends that made the log grow
+LOG_TRUNCATE_MIN_FRACTION = 0.5
+
+# how often the checkpoint thread takes a fuzzy checkpoint, in seconds
+CHECKPOINT_INTERVAL = 30.0
+
+# maximum number of old dirty pages flushed by one checkpoint
+CHECKPOINT_FLUSH_PAGES = 64
+
+# default number of redo workers of LogRecovery; they only overlap the page reads, the records are applied under the GIL
+RECOVERY_REDO_WORKERS = 4
+
+# size of a segment file in segmented storage mode, in byte (must be a multiple of PAGE_SIZE)
+SEGMENT_SIZE = 1 << 30
+
+# size of a segment file of the page log in log-structured storage mode, in byte
+LOG_STRUCTURED_SEGMENT_SIZE = 1 << 26
+
+# number of moved page records the compactor of the log-structured store appends to the active segment at once, page
+# writes are appended one at a time
+LOG_STRUCTURED_WRITE_BATCH = 32
+
+# fraction of live records at or below which the compactor reclaims a sealed segment of the page log. At 0.5 the log
+# stays within twice the live pages and uniform random updates cost about one moved record per write;
+# benchmarks/random_page_writes.py measured 42-45k writes/s and 92MB against 86k writes/s and 64MB for in-place writes
+# on a page-cache-backed machine, and 0.2 measured 55-62k writes/s and 140MB. Without any compaction it still measured
+# 65-70k writes/s: the log-structured mode buys sequential writes, not throughput, where random writes are cheap
+LOG_STRUCTURED_GC_THRESHOLD = 0.5
+
+# how often the compaction thread of the log-structured store looks for segments to reclaim, in seconds
+LOG_STRUCTURED_GC_INTERVAL = 1.0
+
+# number of pairs a bulk load packs and hashes per batch
+BULK_LOAD_BATCH_SIZE = 1 << 16
+
+# number of pairs a bulk load keeps in memory before it spills its partitions to temporary files
+BULK_LOAD_MEMORY_PAIRS = 1 << 20
+
+# number of pairs per batch a hash table scan yields
+SCAN_BATCH_SIZE = 1 << 12
+
+# number of bucket pages a hash table scan reads ahead with one batched fetch
+SCAN_READ_AHEAD_PAGES = 8
+
+# number of optimistic, latch-free attempts of a hash table lookup before it takes the latches
+OPTIMISTIC_READ_RETRIES = 2
+
 size_type = int
 
 # Type aliases
@@ -39,4 +99,3 @@ from typing import TypeVar, List, Callable
 KeyType = TypeVar('KeyType')
 ValueType = TypeVar('ValueType')
 KeyComparator = TypeVar('KeyComparator')
-
@@ -0,0 +1,88 @@
+from src.container.disk.DiskExtendibleHashTable import DiskExtendibleHashTable
+from src.config import SCAN_BATCH_SIZE
+import asyncio
+import functools
+
+"""
+ * AsyncDiskExtendibleHashTable is the asyncio front-end of a DiskExtendibleHashTable.
+ *
+ * A lookup whose pages are all in the buffer pool is answered inline, on the thread of the event loop, by an
+ * optimistic read that takes no latch (see DiskExtendibleHashTable.TryGetValue). A lookup that misses the pool or
+ * meets a concurrent writer, and every insert, remove, batched lookup and scan, runs in an executor, the default
+ * executor of the loop unless one is given.
+ *
+ *   index = AsyncDiskExtendibleHashTable(table)
+ *   await index.insert(key, value)
+ *   values = await index.get(key)
+ *   async for batch in index.scan():
+ *       ...
+"""
+
+
+class AsyncDiskExtendibleHashTable:
+    def __init__(self, table: DiskExtendibleHashTable, executor=None):
+        """
+        * @param table the hash table to front
+        * @param executor the concurrent.futures executor blocking calls run in, None for the default one of the loop
+        """
+        self._table = table
+        self._executor = executor
+
+    def GetHashTable(self) -> DiskExtendibleHashTable:
+        """* @return the fronted hash table"""
+        return self._table
+
+    async def get(self, key) -> list:
+        """
+        * Get the value(s) associated with a given key, inline when the lookup does not have to wait.
+        * @param key the key to look up
+        * @return the value(s) associated with the given key, empty if there is none
+        """
+        result = []
+        if self._table.TryGetValue(key, result) is not None:
+            return result
+        # the inline attempt only fills result on success
+        await self._RunBlocking(self._table.GetValue, key, result)
+        return result
+
+    async def get_values(self, keys) -> list:
+        """
+        * Get the values associated with many keys at once in the executor, see DiskExtendibleHashTable.GetValues.
+        * @return one list of values per key, in the order of keys
+        """
+        return await self._RunBlocking(self._table.GetValues, list(keys))
+
+    async def insert(self, key, value) -> bool:
+        """* Insert a key-value pair in the executor, see DiskExtendibleHashTable.Insert."""
+        return await self._RunBlocking(self._table.Insert, key, value)
+
+    async def remove(self, key, value) -> bool:
+        """* Remove a key-value pair in the executor, see DiskExtendibleHashTable.Remove."""
+        return await self._RunBlocking(self._table.Remove, key, value)
+
+    async def scan(self, batch_size=SCAN_BATCH_SIZE):
+        """
+        * Iterate over all pairs of the table, see DiskExtendibleHashTable.Scan; every batch is read in the executor.
+        * @param batch_size number of pairs per yielded batch
+        """
+        batches = self._table.Scan(batch_size)
+        loop = asyncio.get_running_loop()
+        pending = None
+        try:
+            while True:
+                pending = loop.run_in_executor(self._executor, next, batches, None)
+                batch = await asyncio.shield(pending)
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            # the scan holds no latch between two batches; one cancelled while a batch is read is closed after it
+            if pending is None or pending.done():
+                batches.close()
+            else:
+                pending.add_done_callback(lambda _: batches.close())
+
+    async def _RunBlocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(function, *args)
+        )
@@ -1,22 +1,98 @@
+from src.config import (
+    page_id_t,
+    INVALID_PAGE_ID,
+    HEADER_PAGE_ID,
+    PAGE_HEADER_SIZE,
+    BULK_LOAD_BATCH_SIZE,
+    BULK_LOAD_MEMORY_PAIRS,
+    OPTIMISTIC_READ_RETRIES,
+    SCAN_BATCH_SIZE,
+    SCAN_READ_AHEAD_PAGES,
+)
 from src.buffer.BufferPoolManager import BufferPoolManager
-from src.storage.Page.ExtendibleHTableBucketPage import HTableBucketArraySize
 from src.hash_table_page_defs import (
-    sizeOfMappingType,
+    KEY_FORMAT,
+    VALUE_FORMAT,
     HTABLE_HEADER_MAX_DEPTH,
     HTABLE_DIRECTORY_MAX_DEPTH,
+    HTABLE_MERGE_THRESHOLD,
+    BucketArraySize,
 )
 from src.container.disk.hash import HashFunction
 from src.latch.ReaderWriterLatch import ReaderWriterLatch
+from src.recovery.LogRecord import LogRecord
+from src.storage.Page.Page import Page
+from src.storage.Page.HashTableHeaderPage import HashTableHeaderPage
 from src.storage.Page.HashTableDirectoryPage import HashTableDirectoryPage
 from src.storage.Page.HashTableBucketPage import HashTableBucketPage
+from src.storage.Page.HashTableBloomFilterPage import HashTableBloomFilterPage, FilterParameters
+from src.storage.Page.HashTableRootPage import HashTableRootPage, IndexMetadata
+from contextlib import closing
+from itertools import islice
+import struct
+import threading
+
+# hash functions whose batches HashFunction.get_hashes computes in one call, by hash width
+_BATCH_HASH_BITS = {HashFunction.get_hash: 64, HashFunction.get_hash32: 32}
 
 """**
  * Implementation of extendible hash table that is backed by a buffer pool
  * manager. Non-unique keys are supported. Supports insert and delete. The
  * table grows/shrinks dynamically as buckets become full/empty.
+ *
+ * The table has three levels of pages: one header page routes the top header_max_depth bits of the hash to a
+ * directory page, the directory uses its global depth of low bits to pick a bucket page. Directories are created on
+ * the first insert that reaches them, so an index spans up to 2^(header_max_depth + directory_max_depth) buckets and
+ * every level is cached and evicted by the buffer pool like any other page.
+ *
+ * Keys are hashed on their packed bytes (struct key_format), the same bytes the bucket stores, so a key read back
+ * from a bucket during a split hashes exactly like the key that was inserted.
+ *
+ * Concurrency: the header and the directories only change under the table latch in exclusive mode, taken to create a
+ * directory, split a bucket or bulk load. Everything else holds the table latch in shared mode and latches the one
+ * bucket it touches, so inserts and removes on different buckets run side by side. Point lookups first try an
+ * optimistic read without any latch, validated against the version counters of the table and of the bucket page.
+ *
+ * Incremental growth: with a split_threshold, an insert that leaves its bucket past the threshold only queues the
+ * bucket, and the following inserts split at most splits_per_insert queued buckets by one level each, growing the
+ * directory when needed; RunSplitThread moves that work off the inserts entirely. Buckets are thus split ahead of
+ * time, a little at a time, and an insert rarely finds its bucket full and has to split before it can complete.
+ *
+ * Overflow chains: a full bucket that splitting cannot help, because it is at the max depth of its directory or all
+ * of its keys share every hash bit the directory could use (e.g. one hot duplicate key), gets overflow pages chained
+ * from it through NextPageId instead of growing the directory. A bucket with a chain no longer splits or merges, new
+ * pairs go to the first page of the chain with room, and removes move the pairs of the last overflow pages back
+ * into earlier pages and release them as soon as they fit.
+ *
+ * Scans: Scan streams all pairs in batches, directory by directory and bucket page by bucket page in page id order,
+ * with read-ahead and cold buffer pool fetches, tracking the hash partitions it has read so that concurrent splits
+ * and merges do not make it repeat or skip pairs.
+ *
+ * Bloom filters: with a bloom_false_positive_rate, a directory keeps a Bloom filter on filter pages of its own, one
+ * partition per bucket, sized for a full bucket: the partition of a bucket is the index of its first slot, its hash
+ * bits up to its local depth. A filter page thus holds the partitions of many buckets and stays resident far more
+ * easily than they do. A directory only gets its filter once its global depth gives it at least a filter page worth
+ * of buckets, built then from their keys and kept from then on: below that, probing a filter page would cost about
+ * as much as the bucket page it spares. Lookups and removes check the filter before they touch a bucket page, so a
+ * key that was never inserted usually costs a filter page probe instead of a bucket scan. Inserts add to the filter;
+ * splits and merges rebuild the partitions of the buckets involved from their keys, which also drops removed keys.
+ * Filter pages are logged and recovered like buckets.
+ *
+ * Persistence: the tables of a database are recorded by name on its root page, at HEADER_PAGE_ID unless another
+ * root_page_id is given, with the page id of their header page and the formats their pages use. The root page is
+ * created along with the first page of a new database; a table created over a database that holds something else at
+ * root_page_id is not recorded and cannot be opened again. Open reads only the entry of the table; every other page
+ * is fetched when an operation first needs it, so reopening an index after a restart does not scale with its size.
+ *
+ * When the buffer pool has a log manager, inserts and removes are logged as HASH_INSERT/HASH_REMOVE records and every
+ * structural change (new page, split, directory growth) as a PAGE_WRITE after-image of the touched pages.
  *"""
 
 
+class _WouldBlock(Exception):
+    """Raised by _FetchResidentPage when a page would have to be read from disk or waited for."""
+
+
 class DiskExtendibleHashTable:
     def __init__(
         self,
@@ -26,87 +102,1651 @@ class DiskExtendibleHashTable:
         hash_fn=None,
         header_max_depth=HTABLE_HEADER_MAX_DEPTH,
         directory_max_depth=HTABLE_DIRECTORY_MAX_DEPTH,
+        key_format=KEY_FORMAT,
+        value_format=VALUE_FORMAT,
+        split_threshold=None,
+        splits_per_insert=1,
+        merge_threshold=HTABLE_MERGE_THRESHOLD,
+        bloom_false_positive_rate=None,
+        root_page_id=HEADER_PAGE_ID,
     ):
         """**
         * @brief Creates a new DiskExtendibleHashTable.
         *
-        * @param name
+        * @param name the name the table is recorded under on the root page of the database, 1 to 32 bytes; a table
+        *        of that name must not exist yet, see Open
         * @param bpm buffer pool manager to be used
         * @param cmp comparator for keys
-        * @param hash_fn the hash function
+        * @param hash_fn the hash function, called on the packed key bytes; only its low 32 bits are used, the default
+        *        is the 32-bit MurmurHash3
         * @param header_max_depth the max depth allowed for the header page
         * @param directory_max_depth the max depth allowed for the directory page
+        * @param key_format struct format of the fixed-width keys
+        * @param value_format struct format of the fixed-width values
+        * @param split_threshold fraction of a bucket above which it is split ahead of time by later inserts, None to
+        *        split a bucket only when an insert finds it full
+        * @param splits_per_insert maximum number of deferred splits an insert carries out, 0 to leave them all to the
+        *        split thread
+        * @param merge_threshold fraction of a bucket below which a remove merges it with its split image when that
+        *        one is below it as well, None to never merge
+        * @param bloom_false_positive_rate target false positive rate of the Bloom filter of a full bucket, None for
+        *        no filters
+        * @param root_page_id the page the table is recorded on, created if the database is new; None, or a page that
+        *        is not a root page, leaves the table unrecorded
         *"""
+        self._Configure(
+            name,
+            bpm,
+            cmp,
+            hash_fn,
+            directory_max_depth,
+            key_format,
+            value_format,
+            split_threshold,
+            splits_per_insert,
+            merge_threshold,
+        )
+        # Bloom filters: partition size in byte (None without filters), hashes per key, partitions per filter page and
+        # global depth from which a directory gets its filter
+        self._filter_size_ = None
+        if bloom_false_positive_rate is not None:
+            self._ConfigureFilter(
+                *FilterParameters(self._bucket_max_size_, bloom_false_positive_rate)
+            )
+
+        root_page = self._PinRootPage(root_page_id)
+        if root_page is None:
+            self._header_page_id_: page_id_t = self._NewHeaderPage(header_max_depth)
+            return
+        root_page.WLatch()
+        try:
+            root = HashTableRootPage(root_page.getData())
+            # replacing the entry of another table would orphan all of its pages
+            if root.GetIndex(name) is not None:
+                raise ValueError(f"there is already a hash index named {name!r} in the database, use Open")
+            self._header_page_id_ = self._NewHeaderPage(header_max_depth)
+            root.SetIndex(
+                IndexMetadata(
+                    name,
+                    self._header_page_id_,
+                    directory_max_depth,
+                    key_format,
+                    value_format,
+                    self._filter_size_ or 0,
+                    self._filter_hashes_ if self._filter_size_ else 0,
+                    hash_fn is not None,
+                )
+            )
+            self._LogPageImage(root_page)
+        finally:
+            root_page.WUnLatch()
+            self._bpm.UnpinPage(root_page_id, True)
+
+    @classmethod
+    def Open(
+        cls,
+        name: str,
+        bpm: BufferPoolManager,
+        cmp,
+        hash_fn=None,
+        split_threshold=None,
+        splits_per_insert=1,
+        merge_threshold=HTABLE_MERGE_THRESHOLD,
+        root_page_id=HEADER_PAGE_ID,
+    ):
+        """**
+        * @brief Opens a DiskExtendibleHashTable created earlier in the database of bpm, e.g. after a restart.
+        *
+        * Only the root page is read. The header, directory and bucket pages are fetched through the buffer pool by
+        * the operations that reach them, so opening an index takes the same time whatever its size.
+        *
+        * @param name the name the table was created with
+        * @param bpm buffer pool manager over the database holding the table
+        * @param cmp comparator for keys
+        * @param hash_fn the hash function the table was created with, None if it was created with the default one
+        * @param split_threshold see the constructor, not persisted
+        * @param splits_per_insert see the constructor, not persisted
+        * @param merge_threshold see the constructor, not persisted
+        * @param root_page_id the page the table was recorded on
+        * @return the opened table
+        *"""
+        root_page = bpm.FetchPage(root_page_id)
+        if root_page is None:
+            raise RuntimeError("no free frame to fetch the root page, the buffer pool is exhausted")
+        root_page.RLatch()
+        try:
+            root = HashTableRootPage(root_page.getData())
+            is_root = root.IsRoot()
+            index = root.GetIndex(name) if is_root else None
+        finally:
+            root_page.RUnLatch()
+            bpm.UnpinPage(root_page_id, False)
+        if not is_root:
+            raise ValueError(f"page {root_page_id} of the database is not a hash index root page")
+        if index is None:
+            raise ValueError(f"there is no hash index named {name!r} in the database")
+        if index.custom_hash and hash_fn is None:
+            raise ValueError(
+                f"hash index {name!r} was created with a custom hash function, it has to be passed to Open"
+            )
+
+        table = cls.__new__(cls)
+        table._Configure(
+            name,
+            bpm,
+            cmp,
+            hash_fn,
+            index.directory_max_depth,
+            index.key_format,
+            index.value_format,
+            split_threshold,
+            splits_per_insert,
+            merge_threshold,
+        )
+        table._filter_size_ = None
+        if index.filter_size:
+            table._ConfigureFilter(index.filter_size, index.filter_hashes)
+        table._header_page_id_ = index.header_page_id
+        return table
+
+    def _Configure(
+        self,
+        name,
+        bpm,
+        cmp,
+        hash_fn,
+        directory_max_depth,
+        key_format,
+        value_format,
+        split_threshold,
+        splits_per_insert,
+        merge_threshold,
+    ):
+        """Set up the in-memory state shared by a new and an opened table."""
         self._name = name
         self._bpm = bpm
         self._cmp = cmp
-        self._hash_fn_ = HashFunction()
-        self._header_page_id_ = header_max_depth
+        self._hash_fn_ = hash_fn or HashFunction.get_hash32
         self._directory_max_depth_ = directory_max_depth
-        self._header_max_depth_ = header_max_depth
+        self._key_format = key_format
+        self._value_format = value_format
+        self._key_struct = struct.Struct("<" + key_format)
+        self._value_struct = struct.Struct("<" + value_format)
+        # in the memory of this process only: a table over a SharedBufferPoolManager is not safe across processes
+        self._table_latch_ = ReaderWriterLatch(prefer_writers=True)
+        # bumped when the table latch is taken in exclusive mode and again when it is released, odd while the header
+        # or a directory may be changing
+        self._version_ = 0
+        # incremental growth: bucket page id -> hash of a key routed to it, for buckets past the split threshold
+        self._pending_splits_ = {}
+        self._pending_splits_latch_ = threading.Lock()
+        self._splits_per_insert_ = splits_per_insert
+        self._split_requested_ = threading.Event()
+        self._split_thread = None
+        self._stop_split_thread = False
+
         # bucket_max_size the max size allowed for the bucket page array
-        self._bucket_max_size_ = HTableBucketArraySize(sizeOfMappingType)
-        self._table_latch_ = ReaderWriterLatch()
-
-        initial_directory_page, allocated_frame_id = self._bpm.AllocatePage()
-        self._directory = HashTableDirectoryPage()
-        self._directory.SetPageId(initial_directory_page)
-        self._bpm._pages[allocated_frame_id] = self._directory
-        bpm.UnpinPage(initial_directory_page)
-
-        # Allocate initial buckets
-        print(
-            "========================== Allocate initial buckets ====================="
+        self._bucket_max_size_ = BucketArraySize(
+            self._key_struct.size + self._value_struct.size
+        )
+        self._split_size_ = (
+            None
+            if split_threshold is None
+            else max(1, int(self._bucket_max_size_ * split_threshold))
         )
-        for i in range(2 ** self._directory.GetGlobalDepth()):
-            page_id, allocated_frame_id = self._bpm.AllocatePage()
-            bucket_page = HashTableBucketPage()
-            bucket_page._page_id_ = page_id
-            self._directory.SetBucketPageId(i, page_id)
-            self._bpm._pages[allocated_frame_id] = bucket_page
-
-    def _Hash(self):
+        self._merge_size_ = (
+            None
+            if merge_threshold is None
+            else min(int(self._bucket_max_size_ * merge_threshold), self._bucket_max_size_ // 2)
+        )
+
+    def _ConfigureFilter(self, filter_size, filter_hashes):
+        """Enable the Bloom filters with partitions of filter_size bytes and filter_hashes hashes per key."""
+        self._filter_size_, self._filter_hashes_ = filter_size, filter_hashes
+        self._filter_partitions_per_page_ = HashTableBloomFilterPage.PartitionsPerPage(filter_size)
+        self._filter_min_depth_ = max(self._filter_partitions_per_page_ - 1, 0).bit_length()
+        self._filter_mask_ = (1 << min(self._directory_max_depth_, HTABLE_DIRECTORY_MAX_DEPTH)) - 1
+        if (
+            not self._filter_partitions_per_page_
+            or self._filter_mask_ // self._filter_partitions_per_page_
+            >= HashTableDirectoryPage.MaxFilterPages()
+        ):
+            raise ValueError(
+                f"a Bloom filter of {filter_size} byte partitions does not fit a directory, raise its false "
+                "positive rate"
+            )
+
+    def _PinRootPage(self, root_page_id) -> Page:
+        """
+        * @return the pinned root page at root_page_id, created if it is the next page to be allocated, e.g. the first
+        *         page of a new database; None if the page holds something else
+        """
+        if root_page_id is None:
+            return None
+        root_page = self._bpm.NewPageAt(root_page_id)
+        if root_page is not None:
+            HashTableRootPage(root_page.getData()).Init()
+            self._LogPageImage(root_page)
+            return root_page
+        root_page = self._FetchPage(root_page_id)
+        if not HashTableRootPage(root_page.getData()).IsRoot():
+            self._bpm.UnpinPage(root_page_id, False)
+            return None
+        return root_page
+
+    def _NewHeaderPage(self, header_max_depth) -> page_id_t:
+        """@return the page id of a new empty header page"""
+        header_page = self._NewPage()
+        HashTableHeaderPage(header_page.getData()).Init(header_max_depth)
+        self._LogPageImage(header_page)
+        self._bpm.UnpinPage(header_page.getPageId(), True)
+        return header_page.getPageId()
+
+    def GetHeaderPageId(self) -> page_id_t:
+        """* @return the page id of the header page of the table"""
+        return self._header_page_id_
+
+    def _NewBucketPage(self, page) -> HashTableBucketPage:
+        """@return the bucket page view over a buffer pool page"""
+        return HashTableBucketPage(
+            page.getData(), self._key_format, self._value_format
+        )
+
+    def _Hash(self, key):
         """**
-        * Hash - simple helper to downcast MurmurHash's 64-bit hash to 32-bit
+        * Hash - simple helper to downcast the hash of a key to 32-bit
         * for extendible hashing.
         *
         * @param key the key to hash
         * @return the down-casted 32-bit hash
         *"""
-        pass
+        return self._HashPacked(self._key_struct.pack(key))
+
+    def _HashPacked(self, packed_key):
+        return self._hash_fn_(packed_key) & 0xFFFFFFFF
+
+    def _HashPackedKeys(self, packed_keys) -> list:
+        """@return the 32-bit hashes of a batch of packed keys, hashed in one call for the MurmurHash3 functions"""
+        bits = _BATCH_HASH_BITS.get(self._hash_fn_)
+        if bits is None:
+            return [self._HashPacked(packed_key) for packed_key in packed_keys]
+        hashes = HashFunction.get_hashes(packed_keys, bits=bits)
+        return hashes if bits == 32 else [hash_value & 0xFFFFFFFF for hash_value in hashes]
+
+    def GetValue(self, key, result, transaction=None) -> bool:
+        """**
+        * Get the value(s) associated with a given key
+        *
+        * The lookup first runs optimistically, without any latch, and validates the table and bucket versions once it
+        * is done; only when a concurrent writer got in the way does it fall back to the table latch in shared mode and
+        * the read latch of the bucket.
+        *
+        * @param key the key to look up
+        * @param[out] result the value(s) associated with a given key
+        * @param transaction the current transaction
+        * @return the value(s) associated with the given key
+        *"""
+        packed_key = self._key_struct.pack(key)
+        hash_value = self._HashPacked(packed_key)
+        key_hash = self._KeyHash(packed_key)
+        for _ in range(OPTIMISTIC_READ_RETRIES):
+            found = self._OptimisticGetValue(key, hash_value, key_hash, result)
+            if found is not None:
+                return found
+
+        self._table_latch_.RLock()
+        try:
+            bucket_page_id = self._GetBucketPageId(hash_value, key_hash)
+            if bucket_page_id == INVALID_PAGE_ID:
+                return False
+            bucket_page = self._FetchPage(bucket_page_id)
+            bucket_page.RLatch()
+            try:
+                found = False
+                for page in self._WalkChain(bucket_page):
+                    found |= self._NewBucketPage(page).GetValue(key, self._cmp, result)
+                return found
+            finally:
+                bucket_page.RUnLatch()
+                self._bpm.UnpinPage(bucket_page_id, False)
+        finally:
+            self._table_latch_.RUnLock()
+
+    def TryGetValue(self, key, result):
+        """**
+        * Look a key up only if it can be done right away: every page it reads is in the buffer pool and no writer
+        * interferes, so it neither reads from disk nor waits for a latch, e.g. on the thread of an event loop.
+        *
+        * @param key the key to look up
+        * @param[out] result the value(s) associated with a given key
+        * @return whether the key was found, None if the lookup would have to wait and GetValue has to be used
+        *"""
+        packed_key = self._key_struct.pack(key)
+        try:
+            return self._OptimisticGetValue(
+                key,
+                self._HashPacked(packed_key),
+                self._KeyHash(packed_key),
+                result,
+                self._FetchResidentPage,
+            )
+        except _WouldBlock:
+            return None
+
+    def _OptimisticGetValue(self, key, hash_value, key_hash, result, fetch=None):
+        """
+        * Look a key up without latching, see GetValue.
+        * @param fetch the function pinning the pages read, _FetchPage by default
+        * @return whether the key was found, None if a writer interfered and the read must be retried
+        """
+        table_version = self._version_
+        if table_version & 1:
+            return None
+        # directories and buckets only point at allocated pages, even in the middle of a split
+        bucket_page_id = self._GetBucketPageId(hash_value, key_hash, fetch)
+        if bucket_page_id == INVALID_PAGE_ID:
+            return False if self._version_ == table_version else None
+
+        bucket_page = (fetch or self._FetchPage)(bucket_page_id)
+        try:
+            page_version = bucket_page.GetVersion()
+            if page_version & 1:
+                return None
+            bucket = self._NewBucketPage(bucket_page)
+            if bucket.GetNextPageId() != INVALID_PAGE_ID:
+                # overflow pages may be unlinked and deleted under the reader, chains are read latched
+                return None
+            values = []
+            try:
+                found = bucket.GetValue(key, self._cmp, values)
+            except Exception:
+                # a torn read may trip the comparator, only a clean read reports the error
+                if bucket_page.GetVersion() == page_version and self._version_ == table_version:
+                    raise
+                return None
+            if bucket_page.GetVersion() != page_version or self._version_ != table_version:
+                return None
+            result.extend(values)
+            return found
+        finally:
+            self._bpm.UnpinPage(bucket_page_id, False)
+
+    def GetValues(self, keys, transaction=None) -> list:
+        """**
+        * Get the values associated with many keys at once.
+        *
+        * All keys are hashed in one pass and grouped by directory, then by bucket page. Each directory and each bucket
+        * page is pinned once, buckets through batched buffer pool fetches, and probed for all of its keys while it
+        * stays pinned.
+        *
+        * @param keys the keys to look up
+        * @param transaction the current transaction
+        * @return one list of values per key, in the order of keys
+        *"""
+        keys = list(keys)
+        packed_keys = list(map(self._key_struct.pack, keys))
+        hashes = self._HashPackedKeys(packed_keys)
+        key_hashes = None
+        if self._filter_size_ is not None:
+            key_hashes = HashFunction.get_hashes(packed_keys)
+        self._table_latch_.RLock()
+        try:
+            return self._GetValues(keys, hashes, key_hashes)
+        finally:
+            self._table_latch_.RUnLock()
+
+    def _GetValues(self, keys, hashes, key_hashes) -> list:
+        """GetValues with the table latch held in shared mode."""
+        results = [[] for _ in keys]
+
+        # directory page id -> positions of its keys
+        by_directory = {}
+        header_page = self._FetchPage(self._header_page_id_)
+        try:
+            header = HashTableHeaderPage(header_page.getData())
+            for pos, hash_value in enumerate(hashes):
+                directory_page_id = header.GetDirectoryPageId(
+                    header.HashToDirectoryIndex(hash_value)
+                )
+                if directory_page_id != INVALID_PAGE_ID:
+                    by_directory.setdefault(directory_page_id, []).append(pos)
+        finally:
+            self._bpm.UnpinPage(self._header_page_id_, False)
+
+        # bucket page id -> positions of its keys
+        by_bucket = {}
+        for directory_page_id, positions in by_directory.items():
+            directory_page = self._FetchPage(directory_page_id)
+            try:
+                directory = HashTableDirectoryPage(directory_page.getData())
+                if key_hashes is not None:
+                    positions = self._FilterPositions(directory, positions, hashes, key_hashes)
+                for pos in positions:
+                    bucket_page_id = directory.GetBucketPageId(
+                        directory.HashToBucketIndex(hashes[pos])
+                    )
+                    by_bucket.setdefault(bucket_page_id, []).append(pos)
+            finally:
+                self._bpm.UnpinPage(directory_page_id, False)
+
+        # leave half of the pool to everybody else
+        batch_size = max(1, self._bpm.GetPoolSize() // 2)
+        bucket_page_ids = sorted(by_bucket)
+        for start in range(0, len(bucket_page_ids), batch_size):
+            batch = bucket_page_ids[start : start + batch_size]
+            # pages still pinned by this batch, None where the batched fetch found no frame
+            pinned = dict(zip(batch, self._bpm.FetchPages(batch)))
+            try:
+                for bucket_page_id in batch:
+                    bucket_page = pinned[bucket_page_id]
+                    if bucket_page is None:
+                        bucket_page = pinned[bucket_page_id] = self._FetchPage(bucket_page_id)
+                    bucket_page.RLatch()
+                    try:
+                        for page in self._WalkChain(bucket_page):
+                            bucket = self._NewBucketPage(page)
+                            for pos in by_bucket[bucket_page_id]:
+                                bucket.GetValue(keys[pos], self._cmp, results[pos])
+                    finally:
+                        bucket_page.RUnLatch()
+                    del pinned[bucket_page_id]
+                    self._bpm.UnpinPage(bucket_page_id, False)
+            finally:
+                for bucket_page_id, bucket_page in pinned.items():
+                    if bucket_page is not None:
+                        self._bpm.UnpinPage(bucket_page_id, False)
+        return results
+
+    def Scan(self, batch_size=SCAN_BATCH_SIZE, read_ahead=SCAN_READ_AHEAD_PAGES):
+        """**
+        * Iterate over all pairs of the table, e.g. to export or rehash it.
+        *
+        * Directories are visited in page id order. The bucket pages of a directory are deduplicated from its slots
+        * and read in page id order too, read_ahead at a time with one batched cold fetch: neighbouring pages turn
+        * into sequential reads, and the scanned pages are the first to be evicted again instead of the working set of
+        * the pool. Memory stays bounded by one window of pages and one batch of pairs, whatever the table size.
+        *
+        * The table latch is held in shared mode while a window is read, not while batches are yielded, so writers
+        * carry on during the scan. The scan remembers which max-depth hash partitions it has yielded, so a split or
+        * merge between two windows neither repeats nor skips pairs: every pair present for the whole scan is yielded
+        * exactly once, pairs inserted or removed during the scan may or may not be. SnapshotScan yields the table as
+        * it was when the scan started instead.
+        *
+        * @param batch_size number of pairs per yielded batch, the last one may be smaller
+        * @param read_ahead number of bucket pages fetched at once
+        * @return a generator of lists of (key, value) pairs
+        *"""
+        read_ahead = max(1, min(read_ahead, self._bpm.GetPoolSize() // 2))
+        batch = []
+        for directory_page_id in self._ScanDirectoryPageIds():
+            # partition -> 1 once the pairs of the partition have been read
+            visited = bytearray()
+            while (pairs := self._ScanWindow(directory_page_id, visited, read_ahead)) is not None:
+                batch.extend(pairs)
+                while len(batch) >= batch_size:
+                    yield batch[:batch_size]
+                    del batch[:batch_size]
+        if batch:
+            yield batch
+
+    def SnapshotScan(self, batch_size=SCAN_BATCH_SIZE, read_ahead=SCAN_READ_AHEAD_PAGES):
+        """**
+        * Iterate over all pairs of the table as they were when the iteration started, e.g. for a backup.
+        *
+        * The table latch is taken in exclusive mode only while a buffer pool snapshot begins, so that no insert, split
+        * or merge is half done in it. From then on the scan holds no latch at all: it reads the header, directories
+        * and buckets of the snapshot, and writers carry on, copying a page aside the first time they change it while
+        * the scan may still read it. Every pair present when the iteration started is yielded exactly once, and no
+        * pair inserted since.
+        *
+        * @param batch_size number of pairs per yielded batch, the last one may be smaller
+        * @param read_ahead number of bucket pages read at once
+        * @return a generator of lists of (key, value) pairs
+        *"""
+        self._table_latch_.WLock()
+        try:
+            snapshot = self._bpm.BeginSnapshot()
+        finally:
+            self._table_latch_.WUnLock()
+        with snapshot:
+            header = HashTableHeaderPage(snapshot.ReadPage(self._header_page_id_))
+            directory_page_ids = {header.GetDirectoryPageId(directory_idx) for directory_idx in range(header.MaxSize())}
+            directory_page_ids.discard(INVALID_PAGE_ID)
+            batch = []
+            for directory_page_id in sorted(directory_page_ids):
+                directory = HashTableDirectoryPage(snapshot.ReadPage(directory_page_id))
+                # the first slot of a bucket is its bucket bits
+                bucket_page_ids = sorted(
+                    directory.GetBucketPageId(bucket_idx)
+                    for bucket_idx in range(directory.GetNumBuckets())
+                    if not bucket_idx >> directory.GetLocalDepth(bucket_idx)
+                )
+                for start in range(0, len(bucket_page_ids), read_ahead):
+                    for data in snapshot.ReadPages(bucket_page_ids[start : start + read_ahead]):
+                        while data is not None:
+                            bucket = HashTableBucketPage(data, self._key_format, self._value_format)
+                            for slot in range(bucket.GetArraySize()):
+                                if bucket.IsReadable(slot):
+                                    batch.append((bucket.keyAt(slot), bucket.valueAt(slot)))
+                            next_page_id = bucket.GetNextPageId()
+                            data = None if next_page_id == INVALID_PAGE_ID else snapshot.ReadPage(next_page_id)
+                        while len(batch) >= batch_size:
+                            yield batch[:batch_size]
+                            del batch[:batch_size]
+            if batch:
+                yield batch
+
+    def _ScanDirectoryPageIds(self) -> list:
+        """@return the page ids of the directories of the table, in page id order"""
+        self._table_latch_.RLock()
+        try:
+            header_page = self._FetchPage(self._header_page_id_)
+            try:
+                header = HashTableHeaderPage(header_page.getData())
+                directory_page_ids = {
+                    header.GetDirectoryPageId(directory_idx) for directory_idx in range(header.MaxSize())
+                }
+            finally:
+                self._bpm.UnpinPage(self._header_page_id_, False)
+        finally:
+            self._table_latch_.RUnLock()
+        directory_page_ids.discard(INVALID_PAGE_ID)
+        return sorted(directory_page_ids)
 
-    def getDirectoryIndex(self, key):
+    def _ScanWindow(self, directory_page_id, visited: bytearray, read_ahead):
         """
-        * We will want to use the least-significant bits for indexing into the directory.
+        * Read the pairs of the next read_ahead buckets of a directory that still hold unvisited partitions.
+        * @param visited the partitions of the directory read so far, updated
+        * @return the pairs read, None once every partition of the directory has been read
         """
-        hash_value = self._hash_fn_.get_hash(key)
-        mask = self._directory.GetGlobalDepthMask()
-        return hash_value & mask
+        self._table_latch_.RLock()
+        try:
+            directory_page = self._FetchPage(directory_page_id)
+            try:
+                directory = HashTableDirectoryPage(directory_page.getData())
+                partition_mask = directory.MaxSize() - 1
+                if not visited:
+                    visited.extend(bytes(directory.MaxSize()))
+                # (bucket page id, bucket bits, local depth) of every bucket with a partition left
+                pending = []
+                for bucket_idx in range(directory.GetNumBuckets()):
+                    local_depth = directory.GetLocalDepth(bucket_idx)
+                    # the first slot of a bucket is its bucket bits
+                    if bucket_idx >> local_depth or all(visited[bucket_idx :: 1 << local_depth]):
+                        continue
+                    pending.append((directory.GetBucketPageId(bucket_idx), bucket_idx, local_depth))
+            finally:
+                self._bpm.UnpinPage(directory_page_id, False)
+            if not pending:
+                return None
 
-    def Insert(self, key, value, transaction):
-        """* TODO(P2): Add implementation
+            window = sorted(pending)[:read_ahead]
+            pinned = dict(
+                zip(
+                    (bucket_page_id for bucket_page_id, _, _ in window),
+                    self._bpm.FetchPages([bucket_page_id for bucket_page_id, _, _ in window], cold=True),
+                )
+            )
+            pairs = []
+            try:
+                for bucket_page_id, bucket_bits, local_depth in window:
+                    bucket_page = pinned[bucket_page_id]
+                    if bucket_page is None:
+                        bucket_page = pinned[bucket_page_id] = self._FetchPage(bucket_page_id)
+                    partitions = slice(bucket_bits, None, 1 << local_depth)
+                    # a merge may have joined a bucket read before with one that was not
+                    partial = any(visited[partitions])
+                    bucket_page.RLatch()
+                    try:
+                        for page in self._WalkChain(bucket_page):
+                            bucket = self._NewBucketPage(page)
+                            for slot in range(bucket.GetArraySize()):
+                                if not bucket.IsReadable(slot):
+                                    continue
+                                if partial and visited[self._HashPacked(bucket.rawKeyAt(slot)) & partition_mask]:
+                                    continue
+                                pairs.append((bucket.keyAt(slot), bucket.valueAt(slot)))
+                    finally:
+                        bucket_page.RUnLatch()
+                    visited[partitions] = b"\x01" * len(visited[partitions])
+            finally:
+                for bucket_page_id, bucket_page in pinned.items():
+                    if bucket_page is not None:
+                        self._bpm.UnpinPage(bucket_page_id, False)
+            return pairs
+        finally:
+            self._table_latch_.RUnLock()
+
+    def Insert(self, key, value, transaction=None):
+        """**
         * Inserts a key-value pair into the hash table.
         * You must split a bucket if there is no room for insertion
         *
+        * The common case holds the table latch in shared mode and write latches only the target bucket. Only an
+        * insert that has to create a directory or split a bucket retakes the table latch in exclusive mode.
+        *
+        * A full bucket that cannot split, because it is at the max depth of the directory or all of its keys share the
+        * hash bits the directory could ever use, gets an overflow page chained to it instead.
+        *
         * @param key the key to create
         * @param value the value to be associated with the key
         * @param transaction the current transaction
-        * @return true if insert succeeded, false otherwise
+        * @return true if insert succeeded, false if the pair exists
         *"""
-        idx = self.getDirectoryIndex(key)
-        bucket_page = self._directory.FetchBucketPage(idx, self._bpm)
-        print("founded bucket page is :", bucket_page, "of index :", idx)
-        bucket_page.Insert(key, value)
+        packed_key = self._key_struct.pack(key)
+        packed_value = self._value_struct.pack(value)
+        hash_value = self._HashPacked(packed_key)
+        key_hash = self._KeyHash(packed_key)
 
+        self._table_latch_.RLock()
+        try:
+            inserted = self._InsertShared(
+                key, value, hash_value, key_hash, packed_key, packed_value
+            )
+        finally:
+            self._table_latch_.RUnLock()
+        if inserted is not None:
+            if self._pending_splits_ and self._splits_per_insert_:
+                self.SplitPending(self._splits_per_insert_)
+            return inserted
 
-bpm = BufferPoolManager(9, "disk_manager.db")
+        self._LockExclusive()
+        try:
+            return self._InsertExclusive(
+                key, value, hash_value, key_hash, packed_key, packed_value
+            )
+        finally:
+            self._UnlockExclusive()
 
-h = DiskExtendibleHashTable("name", bpm, "bpm")
-# print("hash res ", h.getDirectoryIndex("dadsdsna"))
-print(
-    "Pages ids so far:",
-    h._bpm._pages,
-)
+    def _InsertShared(self, key, value, hash_value, key_hash, packed_key, packed_value):
+        """
+        * Insert into the target bucket if it has room. The caller holds the table latch in shared mode.
+        * @return whether the pair was inserted, None if the insert needs the table latch in exclusive mode
+        """
+        bucket_page_id, filter_page_id, partition = self._Route(hash_value)
+        if bucket_page_id == INVALID_PAGE_ID:
+            return None
+        if partition is not None:
+            if filter_page_id == INVALID_PAGE_ID:
+                return None  # filter pages are allocated in exclusive mode
+            # the key is in the filter before it is in the bucket, so no reader misses it
+            self._FilterAdd(filter_page_id, partition, key_hash)
+        bucket_page = self._FetchPage(bucket_page_id)
+        dirty = set()
+        bucket_page.WLatch()
+        try:
+            bucket = self._NewBucketPage(bucket_page)
+            chained = bucket.GetNextPageId() != INVALID_PAGE_ID
+            # a chain only grows, a bucket without one may rather split
+            inserted = self._InsertIntoChain(
+                bucket_page, key, value, packed_key, packed_value, dirty, chained
+            )
+            if (
+                inserted
+                and not chained
+                and self._split_size_ is not None
+                and bucket.NumReadable() >= self._split_size_
+            ):
+                self._QueueSplit(bucket_page_id, hash_value)
+            return inserted
+        finally:
+            bucket_page.WUnLatch()
+            self._bpm.UnpinPage(bucket_page_id, bucket_page_id in dirty)
+
+    def _InsertExclusive(self, key, value, hash_value, key_hash, packed_key, packed_value):
+        """Insert, splitting buckets and growing the directory as needed. The caller holds the table latch exclusively."""
+        directory_page_id = self._GetDirectoryPageId(hash_value, create=True)
+
+        directory_page = self._FetchPage(directory_page_id)
+        directory_dirty = False
+        try:
+            directory = HashTableDirectoryPage(directory_page.getData())
+            while True:
+                bucket_idx = directory.HashToBucketIndex(hash_value)
+                bucket_page_id = directory.GetBucketPageId(bucket_idx)
+                bucket_page = self._FetchPage(bucket_page_id)
+                dirty = set()
+                try:
+                    inserted = self._InsertIntoChain(
+                        bucket_page, key, value, packed_key, packed_value, dirty, False
+                    )
+                    if inserted is None:
+                        # every page is full and the pair is not there yet
+                        bucket = self._NewBucketPage(bucket_page)
+                        if bucket.GetNextPageId() != INVALID_PAGE_ID or not self._SplitHelps(
+                            directory, bucket_idx, bucket, hash_value
+                        ):
+                            inserted = self._InsertIntoChain(
+                                bucket_page, key, value, packed_key, packed_value, dirty, True
+                            )
+                    if inserted is not None:
+                        break
+                    directory_page.PrepareWrite()
+                    bucket_page.PrepareWrite()
+                    self._SplitBucket(directory, bucket_idx, bucket_page)
+                    dirty.add(bucket_page_id)
+                    directory_dirty = True
+                finally:
+                    self._bpm.UnpinPage(bucket_page_id, bucket_page_id in dirty)
+                self._LogPageImage(directory_page)
+
+            if inserted and self._HasFilter(directory):
+                # after the bucket, a split on the way rebuilds the filter from the bucket's keys
+                filter_idx, partition = self._FilterSlot(directory, hash_value)
+                filter_page_id = directory.GetFilterPageId(filter_idx)
+                if filter_page_id == INVALID_PAGE_ID:
+                    directory_page.PrepareWrite()
+                    filter_page_id = self._NewFilterPage(directory, filter_idx)
+                    self._LogPageImage(directory_page)
+                    directory_dirty = True
+                self._FilterAdd(filter_page_id, partition, key_hash)
+            return inserted
+        finally:
+            self._bpm.UnpinPage(directory_page_id, directory_dirty)
+
+    def Remove(self, key, value, transaction=None) -> bool:
+        """**
+        * Removes a key-value pair from the hash table.
+        *
+        * A bucket left at or below the merge threshold is merged with its split image if that one is too, and the
+        * directory shrinks when no bucket needs its global depth any more; this retakes the table latch in exclusive
+        * mode.
+        *
+        * @param key the key to delete
+        * @param value the value to delete
+        * @param transaction the current transaction
+        * @return true if remove succeeded, false otherwise
+        *"""
+        packed_key = self._key_struct.pack(key)
+        hash_value = self._HashPacked(packed_key)
+
+        self._table_latch_.RLock()
+        try:
+            removed, size = self._RemoveShared(
+                key, value, hash_value, self._KeyHash(packed_key), packed_key
+            )
+        finally:
+            self._table_latch_.RUnLock()
+
+        if removed and self._merge_size_ is not None and size <= self._merge_size_:
+            self._LockExclusive()
+            try:
+                self._MergeBuckets(hash_value)
+            finally:
+                self._UnlockExclusive()
+        return removed
+
+    def _RemoveShared(self, key, value, hash_value, key_hash, packed_key):
+        """
+        * Remove from the target bucket. The caller holds the table latch in shared mode.
+        * @return whether the pair was removed, and the number of pairs left in the bucket
+        """
+        bucket_page_id = self._GetBucketPageId(hash_value, key_hash)
+        if bucket_page_id == INVALID_PAGE_ID:
+            return False, 0
+        bucket_page = self._FetchPage(bucket_page_id)
+        dirty = set()
+        bucket_page.WLatch()
+        try:
+            removed = False
+            with closing(self._WalkChain(bucket_page, dirty)) as chain:
+                for page in chain:
+                    # the overflow pages are protected by the latch of the bucket page, not their own
+                    page.PrepareWrite()
+                    if self._NewBucketPage(page).Remove(key, value, self._cmp):
+                        self._Log(
+                            page,
+                            LogRecord.HashRemove(
+                                page.getPageId(),
+                                packed_key,
+                                self._value_struct.pack(value),
+                                page.GetLNS(),
+                            ),
+                        )
+                        dirty.add(page.getPageId())
+                        removed = True
+                        break
+            bucket = self._NewBucketPage(bucket_page)
+            if removed and bucket.GetNextPageId() != INVALID_PAGE_ID:
+                self._CompactChain(bucket_page, dirty)
+            if bucket.GetNextPageId() != INVALID_PAGE_ID:
+                return removed, self._bucket_max_size_  # a bucket with overflow pages never merges
+            return removed, bucket.NumReadable()
+        finally:
+            bucket_page.WUnLatch()
+            self._bpm.UnpinPage(bucket_page_id, bucket_page_id in dirty)
+
+    def _MergeBuckets(self, hash_value):
+        """
+        * Merge the bucket hash_value routes to with its split image while both are at or below the merge threshold,
+        * shrinking the directory as far as the local depths allow after each merge. The merged-away bucket page is
+        * deleted from the buffer pool. The caller holds the table latch exclusively.
+        """
+        directory_page_id = self._GetDirectoryPageId(hash_value)
+        if directory_page_id == INVALID_PAGE_ID:
+            return
+        directory_page = self._FetchPage(directory_page_id)
+        directory_dirty = False
+        try:
+            directory = HashTableDirectoryPage(directory_page.getData())
+            while True:
+                bucket_idx = directory.HashToBucketIndex(hash_value)
+                local_depth = directory.GetLocalDepth(bucket_idx)
+                if local_depth == 0:
+                    break
+                image_idx = directory.GetSplitImageIndex(bucket_idx)
+                if directory.GetLocalDepth(image_idx) != local_depth:
+                    break
+                high_bit = 1 << (local_depth - 1)
+                # the bucket whose slots have the high bit cleared survives
+                if bucket_idx & high_bit:
+                    bucket_idx, image_idx = image_idx, bucket_idx
+                bucket_page_id = directory.GetBucketPageId(bucket_idx)
+                image_page_id = directory.GetBucketPageId(image_idx)
+
+                bucket_page = self._FetchPage(bucket_page_id)
+                merged = False
+                try:
+                    image_page = self._FetchPage(image_page_id)
+                    try:
+                        bucket = self._NewBucketPage(bucket_page)
+                        image = self._NewBucketPage(image_page)
+                        if (
+                            bucket.NumReadable() > self._merge_size_
+                            or image.NumReadable() > self._merge_size_
+                            or bucket.GetNextPageId() != INVALID_PAGE_ID
+                            or image.GetNextPageId() != INVALID_PAGE_ID
+                        ):
+                            break
+                        bucket_page.PrepareWrite()
+                        for slot in range(image.GetArraySize()):
+                            if image.IsReadable(slot):
+                                bucket.Insert(image.keyAt(slot), image.valueAt(slot))
+                        merged = True
+                    finally:
+                        self._bpm.UnpinPage(image_page_id, False)
+                    directory_page.PrepareWrite()
+                    for idx in range(bucket_idx & (high_bit - 1), directory.GetNumBuckets(), high_bit):
+                        directory.SetBucketPageId(idx, bucket_page_id)
+                        directory.SetLocalDepth(idx, local_depth - 1)
+                    self._RebuildFilter(directory, bucket_idx, bucket)
+                    while directory.CanShrink():
+                        directory.DecrGlobalDepth()
+                    self._LogPageImage(bucket_page)
+                    self._LogPageImage(directory_page)
+                    directory_dirty = True
+                finally:
+                    self._bpm.UnpinPage(bucket_page_id, merged)
+                # a reader that still holds the page pins it, it is then simply evicted later
+                self._bpm.DeletePage(image_page_id)
+                with self._pending_splits_latch_:
+                    self._pending_splits_.pop(image_page_id, None)
+        finally:
+            self._bpm.UnpinPage(directory_page_id, directory_dirty)
+
+    def BulkLoad(
+        self, pairs, fill_factor=1.0, memory_pairs=BULK_LOAD_MEMORY_PAIRS
+    ) -> int:
+        """**
+        * Load many key-value pairs at once, e.g. to build an index from scratch.
+        *
+        * The pairs are packed and hashed a batch at a time and partitioned by the directory the header routes them to;
+        * partitions spill to temporary files once more than memory_pairs pairs are held. Every directory that does not
+        * exist yet is then built in one go: its final global and local depths are worked out from the hashes up front
+        * and its bucket pages are written filled, one after the other, with no intermediate split. Pairs routed to an
+        * existing directory go through Insert. Duplicate pairs are loaded once.
+        *
+        * @param pairs iterable of (key, value) pairs
+        * @param fill_factor fraction of a bucket filled by the load, leaving room for later inserts
+        * @param memory_pairs number of pairs held in memory before the partitions spill to disk
+        * @return the number of pairs loaded
+        *"""
+        self._LockExclusive()
+        try:
+            return self._BulkLoad(pairs, fill_factor, memory_pairs)
+        finally:
+            self._UnlockExclusive()
+
+    def _BulkLoad(self, pairs, fill_factor, memory_pairs) -> int:
+        """BulkLoad with the table latch held in exclusive mode."""
+        capacity = max(1, int(self._bucket_max_size_ * fill_factor))
+        record_size = 4 + self._key_struct.size + self._value_struct.size
+        # directory index -> [(hash, packed key, packed value)], and the spilled part of each partition
+        partitions, spills, held = {}, {}, 0
+
+        header_page = self._FetchPage(self._header_page_id_)
+        header_dirty = False
+        try:
+            header = HashTableHeaderPage(header_page.getData())
+            pairs = iter(pairs)
+            while batch := list(islice(pairs, BULK_LOAD_BATCH_SIZE)):
+                packed_keys = [self._key_struct.pack(key) for key, _ in batch]
+                packed_values = [self._value_struct.pack(value) for _, value in batch]
+                hashes = self._HashPackedKeys(packed_keys)
+                for hash_value, packed_key, packed_value in zip(hashes, packed_keys, packed_values):
+                    partitions.setdefault(
+                        header.HashToDirectoryIndex(hash_value), []
+                    ).append((hash_value, packed_key, packed_value))
+                held += len(batch)
+                if held > memory_pairs:
+                    self._SpillPartitions(partitions, spills)
+                    held = 0
+
+            loaded = 0
+            for directory_idx in sorted(partitions.keys() | spills.keys()):
+                records = self._ReadSpill(spills.pop(directory_idx, None), record_size)
+                records.extend(partitions.pop(directory_idx, ()))
+                directory_page_id = header.GetDirectoryPageId(directory_idx)
+                if directory_page_id != INVALID_PAGE_ID:
+                    loaded += sum(
+                        self._InsertExclusive(
+                            self._key_struct.unpack(packed_key)[0],
+                            self._value_struct.unpack(packed_value)[0],
+                            hash_value,
+                            self._KeyHash(packed_key),
+                            packed_key,
+                            packed_value,
+                        )
+                        for hash_value, packed_key, packed_value in records
+                    )
+                    continue
+                records = list(dict.fromkeys(records))
+                directory_page_id = self._BuildDirectory(records, capacity)
+                header_page.PrepareWrite()
+                header.SetDirectoryPageId(directory_idx, directory_page_id)
+                header_dirty = True
+                loaded += len(records)
+            if header_dirty:
+                self._LogPageImage(header_page)
+            return loaded
+        finally:
+            for spill in spills.values():
+                spill.close()
+            self._bpm.UnpinPage(self._header_page_id_, header_dirty)
+
+    def _BuildDirectory(self, records, capacity) -> page_id_t:
+        """
+        * Write a new directory and its buckets for records, all routed to the same directory.
+        * @return the page id of the directory
+        """
+        # split the hash space on one more low bit at a time until every bucket fits capacity; a group that no split
+        # can separate becomes a bucket with overflow pages
+        max_mask = (1 << self._directory_max_depth_) - 1
+        leaves, pending = [], [(0, 0, records)]
+        while pending:
+            bucket_bits, local_depth, group = pending.pop()
+            if len(group) <= capacity or not any(
+                (r[0] ^ group[0][0]) & max_mask for r in group
+            ):
+                leaves.append((bucket_bits, local_depth, group))
+                continue
+            high_bit = 1 << local_depth
+            pending.append((bucket_bits | high_bit, local_depth + 1, [r for r in group if r[0] & high_bit]))
+            pending.append((bucket_bits, local_depth + 1, [r for r in group if not r[0] & high_bit]))
+        leaves.sort()
+
+        directory_page = self._NewPage()
+        directory_page_id = directory_page.getPageId()
+        try:
+            directory = HashTableDirectoryPage(directory_page.getData())
+            directory.Init(self._directory_max_depth_)
+            for _ in range(max(local_depth for _, local_depth, _ in leaves)):
+                directory.IncrGlobalDepth()
+            for bucket_bits, local_depth, group in leaves:
+                bucket_page_id = self._WriteChain(group, capacity)
+                for idx in range(bucket_bits, directory.GetNumBuckets(), 1 << local_depth):
+                    directory.SetBucketPageId(idx, bucket_page_id)
+                    directory.SetLocalDepth(idx, local_depth)
+            if self._filter_size_ is not None and directory.GetGlobalDepth() >= self._filter_min_depth_:
+                self._NewFilterPage(directory, 0)
+                self._FillFilter(directory, records)
+            self._LogPageImage(directory_page)
+        finally:
+            self._bpm.UnpinPage(directory_page_id, True)
+        return directory_page_id
+
+    def _WriteChain(self, records, capacity) -> page_id_t:
+        """
+        * Write records into a bucket page, followed by as many overflow pages as needed.
+        * @return the page id of the bucket page
+        """
+        chunks = [records[start : start + capacity] for start in range(0, len(records), capacity)] or [[]]
+        pages = [self._NewPage() for _ in chunks]
+        try:
+            for i, (page, chunk) in enumerate(zip(pages, chunks)):
+                bucket = self._NewBucketPage(page)
+                bucket.Init()
+                bucket.Fill([r[1] for r in chunk], [r[2] for r in chunk])
+                if i + 1 < len(pages):
+                    bucket.SetNextPageId(pages[i + 1].getPageId())
+                self._LogPageImage(page)
+        finally:
+            for page in pages:
+                self._bpm.UnpinPage(page.getPageId(), True)
+        return pages[0].getPageId()
+
+    @staticmethod
+    def _SpillPartitions(partitions, spills):
+        """Append the in-memory partitions to their temporary files and empty them."""
+        # tempfile is slow to import and only needed by bulk loads larger than memory_pairs
+        from tempfile import TemporaryFile
+
+        for directory_idx, records in partitions.items():
+            spill = spills.get(directory_idx)
+            if spill is None:
+                spill = spills[directory_idx] = TemporaryFile()
+            spill.write(
+                b"".join(
+                    struct.pack("<I", hash_value) + packed_key + packed_value
+                    for hash_value, packed_key, packed_value in records
+                )
+            )
+        partitions.clear()
+
+    def _ReadSpill(self, spill, record_size) -> list:
+        """@return the records of a spilled partition, empty if the partition never spilled"""
+        if spill is None:
+            return []
+        spill.seek(0)
+        data = spill.read()
+        spill.close()
+        key_end = 4 + self._key_struct.size
+        return [
+            (
+                struct.unpack_from("<I", data, offset)[0],
+                data[offset + 4 : offset + key_end],
+                data[offset + key_end : offset + record_size],
+            )
+            for offset in range(0, len(data), record_size)
+        ]
+
+    def SplitPending(self, max_splits=None) -> int:
+        """**
+        * Carry out deferred splits of buckets that went past the split threshold, one level each. A bucket that is
+        * still past the threshold after its split is queued again, so a single call never splits a chain of buckets.
+        * Inserts call this for splits_per_insert buckets; a maintenance task may drain the queue with max_splits None.
+        *
+        * @param max_splits maximum number of splits, None for all queued buckets
+        * @return the number of buckets split
+        *"""
+        splits = 0
+        while max_splits is None or splits < max_splits:
+            with self._pending_splits_latch_:
+                if not self._pending_splits_:
+                    break
+                bucket_page_id, hash_value = self._pending_splits_.popitem()
+            self._LockExclusive()
+            try:
+                splits += self._SplitDeferred(bucket_page_id, hash_value)
+            finally:
+                self._UnlockExclusive()
+        return splits
+
+    def _SplitDeferred(self, bucket_page_id, hash_value) -> bool:
+        """Split a queued bucket once if it is still past the threshold. The caller holds the table latch exclusively."""
+        directory_page_id = self._GetDirectoryPageId(hash_value)
+        directory_page = self._FetchPage(directory_page_id)
+        split = False
+        try:
+            directory = HashTableDirectoryPage(directory_page.getData())
+            bucket_idx = directory.HashToBucketIndex(hash_value)
+            if directory.GetBucketPageId(bucket_idx) != bucket_page_id:
+                return False
+            bucket_page = self._FetchPage(bucket_page_id)
+            try:
+                bucket = self._NewBucketPage(bucket_page)
+                if (
+                    bucket.NumReadable() < self._split_size_
+                    or bucket.GetNextPageId() != INVALID_PAGE_ID
+                    or not self._SplitHelps(directory, bucket_idx, bucket, hash_value)
+                ):
+                    return False
+                directory_page.PrepareWrite()
+                bucket_page.PrepareWrite()
+                split = self._SplitBucket(directory, bucket_idx, bucket_page)
+            finally:
+                self._bpm.UnpinPage(bucket_page_id, split)
+            if split:
+                self._LogPageImage(directory_page)
+                high_bit = 1 << (directory.GetLocalDepth(bucket_idx) - 1)
+                for side_hash in (hash_value & ~high_bit, hash_value | high_bit):
+                    self._QueueIfPastThreshold(directory, side_hash)
+            return split
+        finally:
+            self._bpm.UnpinPage(directory_page_id, split)
+
+    def _QueueIfPastThreshold(self, directory: HashTableDirectoryPage, hash_value):
+        """Queue the bucket hash_value routes to for a deferred split if it is past the split threshold."""
+        bucket_page_id = directory.GetBucketPageId(directory.HashToBucketIndex(hash_value))
+        bucket_page = self._FetchPage(bucket_page_id)
+        try:
+            past_threshold = (
+                self._NewBucketPage(bucket_page).NumReadable() >= self._split_size_
+            )
+        finally:
+            self._bpm.UnpinPage(bucket_page_id, False)
+        if past_threshold:
+            self._QueueSplit(bucket_page_id, hash_value)
+
+    def _QueueSplit(self, bucket_page_id, hash_value):
+        with self._pending_splits_latch_:
+            self._pending_splits_.setdefault(bucket_page_id, hash_value)
+        self._split_requested_.set()
+
+    def RunSplitThread(self):
+        """* Start carrying out deferred splits in the background, off the path of the inserts."""
+        if self._split_thread is not None:
+            return
+        self._stop_split_thread = False
+        self._split_thread = threading.Thread(
+            target=self._SplitLoop, name="hash-table-split", daemon=True
+        )
+        self._split_thread.start()
+
+    def StopSplitThread(self):
+        """* Stop the background split thread, the queued splits stay pending."""
+        if self._split_thread is None:
+            return
+        self._stop_split_thread = True
+        self._split_requested_.set()
+        self._split_thread.join()
+        self._split_thread = None
+
+    def _SplitLoop(self):
+        while True:
+            self._split_requested_.wait()
+            self._split_requested_.clear()
+            if self._stop_split_thread:
+                return
+            self.SplitPending()
+
+    def _WalkChain(self, bucket_page, dirty=()):
+        """
+        * Iterate over a bucket page and then its overflow pages, each overflow page pinned only while it is the
+        * current one. The caller holds the bucket page pinned and latched, which protects its whole chain.
+        * @param dirty the ids of the pages changed, looked up when a page is unpinned
+        """
+        yield bucket_page
+        next_page_id = self._NewBucketPage(bucket_page).GetNextPageId()
+        while next_page_id != INVALID_PAGE_ID:
+            page = self._FetchPage(next_page_id)
+            try:
+                yield page
+                next_page_id = self._NewBucketPage(page).GetNextPageId()
+            finally:
+                self._bpm.UnpinPage(page.getPageId(), page.getPageId() in dirty)
+
+    def _InsertIntoChain(self, bucket_page, key, value, packed_key, packed_value, dirty, append):
+        """
+        * Insert into the first page of a bucket's chain with room.
+        * @param dirty collects the ids of the pages changed
+        * @param append chain a new overflow page if every page is full
+        * @return whether the pair was inserted, None if every page is full and append is false
+        """
+        bucket = self._NewBucketPage(bucket_page)
+        if bucket.GetNextPageId() == INVALID_PAGE_ID and not bucket.IsFull():
+            # no chain, the bucket checks for the duplicate itself
+            bucket_page.PrepareWrite()
+            if not bucket.Insert(key, value, self._cmp):
+                return False
+            self._Log(
+                bucket_page,
+                LogRecord.HashInsert(
+                    bucket_page.getPageId(), packed_key, packed_value, bucket_page.GetLNS()
+                ),
+            )
+            dirty.add(bucket_page.getPageId())
+            return True
+
+        target_page_id = last_page_id = INVALID_PAGE_ID
+        with closing(self._WalkChain(bucket_page, dirty)) as chain:
+            for page in chain:
+                bucket = self._NewBucketPage(page)
+                result = []
+                bucket.GetValue(key, self._cmp, result)
+                if packed_value in map(self._value_struct.pack, result):
+                    return False  # Duplicate key-value pair
+                if target_page_id == INVALID_PAGE_ID and not bucket.IsFull():
+                    target_page_id = page.getPageId()
+                last_page_id = page.getPageId()
+
+        if target_page_id == INVALID_PAGE_ID:
+            if not append:
+                return None
+            target = self._NewPage()
+            self._NewBucketPage(target).Init()
+            self._LogPageImage(target)
+            target_page_id = target.getPageId()
+            last = self._FetchChainPage(bucket_page, last_page_id)
+            try:
+                self._NewBucketPage(last).SetNextPageId(target_page_id)
+                self._LogPageImage(last)
+            finally:
+                self._UnpinChainPage(bucket_page, last, True)
+            dirty.add(last_page_id)
+        else:
+            target = self._FetchChainPage(bucket_page, target_page_id)
+
+        try:
+            self._NewBucketPage(target).Insert(key, value, self._cmp)
+            self._Log(
+                target,
+                LogRecord.HashInsert(target_page_id, packed_key, packed_value, target.GetLNS()),
+            )
+        finally:
+            self._UnpinChainPage(bucket_page, target, True)
+        dirty.add(target_page_id)
+        return True
+
+    def _CompactChain(self, bucket_page, dirty):
+        """
+        * Move the pairs of the last overflow page of a bucket into free slots of the pages before it, if they all
+        * fit, then unlink and delete the last page.
+        * @param dirty collects the ids of the pages changed
+        """
+        free_page_ids, free = [], 0
+        previous_page_id = last_page_id = INVALID_PAGE_ID
+        for page in self._WalkChain(bucket_page, dirty):
+            bucket = self._NewBucketPage(page)
+            previous_page_id, last_page_id = last_page_id, page.getPageId()
+            last_size = bucket.NumReadable()
+            if bucket.GetNextPageId() != INVALID_PAGE_ID and not bucket.IsFull():
+                free_page_ids.append(last_page_id)
+                free += bucket.GetMaxSize() - bucket.NumReadable()
+        if last_size > free:
+            return
+
+        last_page = self._FetchPage(last_page_id)
+        try:
+            last = self._NewBucketPage(last_page)
+            slots = (slot for slot in range(last.GetArraySize()) if last.IsReadable(slot))
+            for page_id in free_page_ids:
+                page = self._FetchChainPage(bucket_page, page_id)
+                try:
+                    bucket = self._NewBucketPage(page)
+                    for slot in islice(slots, bucket.GetMaxSize() - bucket.NumReadable()):
+                        bucket.Insert(last.keyAt(slot), last.valueAt(slot))
+                    if page_id == previous_page_id:
+                        bucket.SetNextPageId(INVALID_PAGE_ID)
+                    self._LogPageImage(page)
+                finally:
+                    self._UnpinChainPage(bucket_page, page, True)
+                dirty.add(page_id)
+            if previous_page_id not in free_page_ids:
+                page = self._FetchChainPage(bucket_page, previous_page_id)
+                try:
+                    self._NewBucketPage(page).SetNextPageId(INVALID_PAGE_ID)
+                    self._LogPageImage(page)
+                finally:
+                    self._UnpinChainPage(bucket_page, page, True)
+                dirty.add(previous_page_id)
+        finally:
+            self._bpm.UnpinPage(last_page_id, False)
+        self._bpm.DeletePage(last_page_id)
+
+    def _FetchChainPage(self, bucket_page, page_id) -> Page:
+        """Fetch a page of the chain of bucket_page to change it, the caller already holds bucket_page pinned."""
+        page = bucket_page if page_id == bucket_page.getPageId() else self._FetchPage(page_id)
+        page.PrepareWrite()
+        return page
+
+    def _UnpinChainPage(self, bucket_page, page, is_dirty):
+        """Unpin a page fetched with _FetchChainPage."""
+        if page is not bucket_page:
+            self._bpm.UnpinPage(page.getPageId(), is_dirty)
+
+    def _SplitHelps(self, directory: HashTableDirectoryPage, bucket_idx, bucket, hash_value) -> bool:
+        """
+        * @return whether splitting the bucket, as deep as the directory allows, could ever separate hash_value from
+        *         one of the keys already in it
+        """
+        if directory.GetLocalDepth(bucket_idx) >= directory.GetMaxDepth():
+            return False
+        max_mask = (1 << directory.GetMaxDepth()) - 1
+        for slot in range(bucket.GetArraySize()):
+            packed_key = bucket.rawKeyAt(slot)
+            if packed_key is not None and (self._HashPacked(packed_key) ^ hash_value) & max_mask:
+                return True
+        return False
+
+    def _KeyHash(self, packed_key):
+        """@return the 64-bit hash of a packed key the Bloom filters use, None without filters"""
+        if self._filter_size_ is None:
+            return None
+        return HashFunction.get_hash(packed_key)
+
+    def _HasFilter(self, directory: HashTableDirectoryPage) -> bool:
+        """@return whether the directory keeps a Bloom filter, its first filter page is allocated along with it"""
+        return self._filter_size_ is not None and directory.GetFilterPageId(0) != INVALID_PAGE_ID
+
+    def _FilterSlot(self, directory: HashTableDirectoryPage, hash_value):
+        """
+        * @return the index of the filter page in the directory and the partition in that page of the bucket a hash
+        *         routes to, numbered by its hash bits up to its local depth
+        """
+        local_depth = directory.GetLocalDepth(directory.HashToBucketIndex(hash_value))
+        return divmod(hash_value & ((1 << local_depth) - 1), self._filter_partitions_per_page_)
+
+    def _FilterMayContain(self, filter_page_id, partition, key_hash, fetch=None) -> bool:
+        """@return false if the filter rules the key out, an unallocated filter page holds no key"""
+        if filter_page_id == INVALID_PAGE_ID:
+            return False
+        filter_page = (fetch or self._FetchPage)(filter_page_id)
+        try:
+            return HashTableBloomFilterPage(filter_page.getData()).MayContain(partition, key_hash)
+        finally:
+            self._bpm.UnpinPage(filter_page_id, False)
+
+    def _FilterPositions(self, directory: HashTableDirectoryPage, positions, hashes, key_hashes) -> list:
+        """@return the positions of the keys of a directory that its filter does not rule out, see GetValues"""
+        if not self._HasFilter(directory):
+            return positions
+        # filter page id -> (position, partition) of its keys
+        by_filter = {}
+        for pos in positions:
+            filter_idx, partition = self._FilterSlot(directory, hashes[pos])
+            by_filter.setdefault(directory.GetFilterPageId(filter_idx), []).append((pos, partition))
+        by_filter.pop(INVALID_PAGE_ID, None)
+
+        passed = []
+        for filter_page_id, filter_positions in by_filter.items():
+            filter_page = self._FetchPage(filter_page_id)
+            try:
+                bloom = HashTableBloomFilterPage(filter_page.getData())
+                for pos, partition in filter_positions:
+                    if bloom.MayContain(partition, key_hashes[pos]):
+                        passed.append(pos)
+            finally:
+                self._bpm.UnpinPage(filter_page_id, False)
+        return passed
+
+    def _FilterAdd(self, filter_page_id, partition, key_hash):
+        """
+        * Add a key to its filter partition. A filter page holds the partitions of several buckets, so its bits are
+        * set under the page write latch, but readers never latch it: bits are only cleared in exclusive mode.
+        """
+        filter_page = self._FetchPage(filter_page_id)
+        changed = False
+        filter_page.WLatch()
+        try:
+            changed = HashTableBloomFilterPage(filter_page.getData()).Add(partition, key_hash)
+            if changed:
+                self._Log(
+                    filter_page,
+                    LogRecord.BloomAdd(filter_page_id, partition, key_hash, filter_page.GetLNS()),
+                )
+        finally:
+            filter_page.WUnLatch()
+            self._bpm.UnpinPage(filter_page_id, changed)
+
+    def _NewFilterPage(self, directory: HashTableDirectoryPage, filter_idx) -> page_id_t:
+        """
+        * Allocate an empty filter page for the directory, which the caller logs. The caller holds the table latch
+        * exclusively.
+        * @return the page id of the filter page
+        """
+        filter_page = self._NewPage()
+        HashTableBloomFilterPage(filter_page.getData()).Init(
+            self._filter_size_, self._filter_hashes_
+        )
+        directory.SetFilterPageId(filter_idx, filter_page.getPageId())
+        self._LogPageImage(filter_page)
+        self._bpm.UnpinPage(filter_page.getPageId(), True)
+        return filter_page.getPageId()
+
+    def _RebuildFilter(self, directory: HashTableDirectoryPage, bucket_idx, bucket):
+        """
+        * Rebuild the filter partition of the bucket at bucket_idx from the keys in it, dropping the bits of removed
+        * keys. The caller holds the table latch exclusively and logs the directory.
+        """
+        if not self._HasFilter(directory):
+            return
+        local_mask = (1 << directory.GetLocalDepth(bucket_idx)) - 1
+        filter_idx, partition = divmod(bucket_idx & local_mask, self._filter_partitions_per_page_)
+        packed_keys = [
+            packed_key
+            for packed_key in map(bucket.rawKeyAt, range(bucket.GetArraySize()))
+            if packed_key is not None
+        ]
+        # filter index -> pinned filter page
+        filter_pages = {}
+        try:
+            filter_page = self._PinFilterPage(directory, filter_idx, filter_pages, create=bool(packed_keys))
+            if filter_page is None:
+                return
+            bloom = HashTableBloomFilterPage(filter_page.getData())
+            bloom.Clear(partition)
+            for key_hash in HashFunction.get_hashes(packed_keys):
+                bloom.Add(partition, key_hash)
+            self._LogPageImage(filter_page)
+        finally:
+            for filter_page in filter_pages.values():
+                self._bpm.UnpinPage(filter_page.getPageId(), True)
+
+    def _EnableFilter(self, directory: HashTableDirectoryPage):
+        """
+        * Build the filter of a directory from the keys of its buckets once its global depth reaches the filter min
+        * depth. The caller holds the table latch exclusively and logs the directory.
+        """
+        if (
+            self._filter_size_ is None
+            or self._HasFilter(directory)
+            or directory.GetGlobalDepth() < self._filter_min_depth_
+        ):
+            return
+        self._NewFilterPage(directory, 0)
+        records = []
+        for bucket_idx in range(directory.GetNumBuckets()):
+            if bucket_idx >> directory.GetLocalDepth(bucket_idx):
+                continue  # not the first slot of its bucket
+            bucket_page_id = directory.GetBucketPageId(bucket_idx)
+            bucket_page = self._FetchPage(bucket_page_id)
+            try:
+                for page in self._WalkChain(bucket_page):
+                    bucket = self._NewBucketPage(page)
+                    for slot in range(bucket.GetArraySize()):
+                        packed_key = bucket.rawKeyAt(slot)
+                        if packed_key is not None:
+                            records.append((self._HashPacked(packed_key), packed_key, None))
+            finally:
+                self._bpm.UnpinPage(bucket_page_id, False)
+        self._FillFilter(directory, records)
+
+    def _FillFilter(self, directory: HashTableDirectoryPage, records):
+        """
+        * Add records, (hash, packed key, packed value), to the filter of their directory, e.g. a new bulk loaded one.
+        * The caller holds the table latch exclusively and logs the directory.
+        """
+        filter_pages = {}
+        try:
+            key_hashes = HashFunction.get_hashes([record[1] for record in records])
+            for (hash_value, _, _), key_hash in zip(records, key_hashes):
+                filter_idx, partition = self._FilterSlot(directory, hash_value)
+                filter_page = self._PinFilterPage(directory, filter_idx, filter_pages, create=True)
+                HashTableBloomFilterPage(filter_page.getData()).Add(partition, key_hash)
+            for filter_page in filter_pages.values():
+                self._LogPageImage(filter_page)
+        finally:
+            for filter_page in filter_pages.values():
+                self._bpm.UnpinPage(filter_page.getPageId(), True)
+
+    def _PinFilterPage(self, directory: HashTableDirectoryPage, filter_idx, filter_pages, create):
+        """
+        * Pin a filter page of the directory once, remembered in filter_pages by filter index.
+        * @param create allocate the filter page if the directory has none yet
+        * @return the filter page, None if it is not allocated and create is false
+        """
+        filter_page = filter_pages.get(filter_idx)
+        if filter_page is None:
+            filter_page_id = directory.GetFilterPageId(filter_idx)
+            if filter_page_id == INVALID_PAGE_ID:
+                if not create:
+                    return None
+                filter_page_id = self._NewFilterPage(directory, filter_idx)
+            filter_page = filter_pages[filter_idx] = self._FetchPage(filter_page_id)
+            # changed under the table latch, not its own
+            filter_page.PrepareWrite()
+        return filter_page
+
+    def _LockExclusive(self):
+        """Take the table latch in exclusive mode, for changes to the header or a directory."""
+        self._table_latch_.WLock()
+        self._version_ += 1
+
+    def _UnlockExclusive(self):
+        self._version_ += 1
+        self._table_latch_.WUnLock()
+
+    def _GetBucketPageId(self, hash_value, key_hash=None, fetch=None) -> page_id_t:
+        """
+        * Route a hash to its bucket, see _Route.
+        * @param key_hash 64-bit hash of the key to check the Bloom filter with, None to skip the filter
+        * @param fetch the function pinning the pages read, _FetchPage by default
+        * @return the bucket page id, INVALID_PAGE_ID if the directory for the hash does not exist yet or the filter
+        *         rules the key out
+        """
+        bucket_page_id, filter_page_id, partition = self._Route(hash_value, fetch)
+        if key_hash is not None and partition is not None:
+            if not self._FilterMayContain(filter_page_id, partition, key_hash, fetch):
+                return INVALID_PAGE_ID
+        return bucket_page_id
+
+    def _Route(self, hash_value, fetch=None):
+        """
+        * Route a hash through the header and its directory. Headers and directories only change under the table
+        * latch in exclusive mode, so they are read without page latches.
+        * @return the bucket page id, the filter page id and the partition in it for the hash, INVALID_PAGE_ID for
+        *         both pages if the directory does not exist yet; the partition is None if the directory has no filter,
+        *         the filter page id INVALID_PAGE_ID if the filter page of the partition holds no key yet
+        """
+        directory_page_id = self._GetDirectoryPageId(hash_value, fetch=fetch)
+        if directory_page_id == INVALID_PAGE_ID:
+            return INVALID_PAGE_ID, INVALID_PAGE_ID, None
+        directory_page = (fetch or self._FetchPage)(directory_page_id)
+        try:
+            directory = HashTableDirectoryPage(directory_page.getData())
+            bucket_page_id = directory.GetBucketPageId(directory.HashToBucketIndex(hash_value))
+            if not self._HasFilter(directory):
+                return bucket_page_id, INVALID_PAGE_ID, None
+            filter_idx, partition = self._FilterSlot(directory, hash_value)
+            return bucket_page_id, directory.GetFilterPageId(filter_idx), partition
+        finally:
+            self._bpm.UnpinPage(directory_page_id, False)
+
+    def _GetDirectoryPageId(self, hash_value, create=False, fetch=None) -> page_id_t:
+        """
+        * Route a hash through the header page.
+        * @param create allocate the directory, with a first empty bucket, if the header has none for the hash yet
+        * @param fetch the function pinning the header page, _FetchPage by default
+        * @return the directory page id, INVALID_PAGE_ID if there is none and create is false
+        """
+        header_page = (fetch or self._FetchPage)(self._header_page_id_)
+        header_dirty = False
+        try:
+            header = HashTableHeaderPage(header_page.getData())
+            directory_idx = header.HashToDirectoryIndex(hash_value)
+            directory_page_id = header.GetDirectoryPageId(directory_idx)
+            if directory_page_id != INVALID_PAGE_ID or not create:
+                return directory_page_id
+
+            directory_page = self._NewPage()
+            directory_page_id = directory_page.getPageId()
+            bucket_page = self._NewPage()
+            directory = HashTableDirectoryPage(directory_page.getData())
+            directory.Init(self._directory_max_depth_)
+            directory.SetBucketPageId(0, bucket_page.getPageId())
+            self._NewBucketPage(bucket_page).Init()
+            header_page.PrepareWrite()
+            header.SetDirectoryPageId(directory_idx, directory_page_id)
+            for page in (bucket_page, directory_page, header_page):
+                self._LogPageImage(page)
+            self._bpm.UnpinPage(bucket_page.getPageId(), True)
+            self._bpm.UnpinPage(directory_page_id, True)
+            header_dirty = True
+            return directory_page_id
+        finally:
+            self._bpm.UnpinPage(self._header_page_id_, header_dirty)
+
+    def _SplitBucket(self, directory: HashTableDirectoryPage, bucket_idx, bucket_page):
+        """
+        * Split the bucket at bucket_idx: raise its local depth, point the slots whose new hash bit is set at a fresh
+        * bucket and move the pairs that now hash there. Grows the directory first if the bucket is at global depth.
+        * @return false if the bucket is at the max depth of the directory and cannot split
+        """
+        if directory.GetLocalDepth(bucket_idx) == directory.GetGlobalDepth():
+            if directory.GetGlobalDepth() >= directory.GetMaxDepth():
+                return False
+            directory.IncrGlobalDepth()
+        local_depth = directory.GetLocalDepth(bucket_idx) + 1
+        high_bit = 1 << (local_depth - 1)
+        local_mask = high_bit - 1
+
+        image_page = self._NewPage()
+        image_page_id = image_page.getPageId()
+        try:
+            image = self._NewBucketPage(image_page)
+            image.Init()
+            for idx in range(bucket_idx & local_mask, directory.GetNumBuckets(), high_bit):
+                directory.SetLocalDepth(idx, local_depth)
+                if idx & high_bit:
+                    directory.SetBucketPageId(idx, image_page_id)
+
+            bucket = self._NewBucketPage(bucket_page)
+            for slot in range(bucket.GetArraySize()):
+                packed_key = bucket.rawKeyAt(slot)
+                if packed_key is None or not self._HashPacked(packed_key) & high_bit:
+                    continue
+                image.Insert(bucket.keyAt(slot), bucket.valueAt(slot))
+                bucket.removeAt(slot)
+            # both halves get a partition of their own
+            self._RebuildFilter(directory, bucket_idx & local_mask, bucket)
+            self._RebuildFilter(directory, bucket_idx & local_mask | high_bit, image)
+            self._EnableFilter(directory)
+            self._LogPageImage(bucket_page)
+            self._LogPageImage(image_page)
+        finally:
+            self._bpm.UnpinPage(image_page_id, True)
+        return True
+
+    def _NewPage(self) -> Page:
+        page_id = []
+        page = self._bpm.NewPage(page_id)
+        if page is None:
+            raise RuntimeError("no free frame for a new hash table page, the buffer pool is exhausted")
+        return page
+
+    def _FetchPage(self, page_id: page_id_t) -> Page:
+        page = self._bpm.FetchPage(page_id)
+        if page is None:
+            raise RuntimeError(
+                f"no free frame to fetch hash table page {page_id}, the buffer pool is exhausted"
+            )
+        return page
+
+    def _FetchResidentPage(self, page_id: page_id_t) -> Page:
+        """Pin a page only if that does not involve disk I/O or waiting, see TryGetValue."""
+        page = self._bpm.FetchResidentPage(page_id)
+        if page is None:
+            raise _WouldBlock(page_id)
+        return page
+
+    def _Log(self, page: Page, log_record: LogRecord):
+        """Append log_record for a change made to page and stamp the page with its lsn."""
+        log_manager = self._bpm.GetLogManager()
+        if log_manager is not None:
+            page.SetLNS(log_manager.AppendLogRecord(log_record))
+
+    def _LogPageImage(self, page: Page):
+        """Log the whole content of page after a structural change."""
+        if self._bpm.GetLogManager() is None:
+            return
+        self._Log(
+            page,
+            LogRecord.PageWrite(
+                page.getPageId(),
+                PAGE_HEADER_SIZE,
+                bytes(page.getData()[PAGE_HEADER_SIZE:]),
+                page.GetLNS(),
+            ),
+        )
 
-print([i._page_id_ for i in h._bpm._pages])
-h.Insert("key", "val", "trnx")
@@ -1,22 +1,104 @@
-import mmh3
+import struct
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _LoadMurmur():
+    """
+    * Import mmh3 on the first hash rather than with the package, and bind _MMH3_32 and _MMH3_128 to its digests:
+    * MurmurHash3 of a bytes-like key or str as an unsigned integer. The digest functions of mmh3 >= 5.0 skip the
+    * argument parsing of mmh3.hash and mmh3.hash128, which is most of the cost for short keys.
+    """
+    global _MMH3_32, _MMH3_128
+    import mmh3
+
+    _MMH3_32 = getattr(mmh3, "mmh3_32_uintdigest", None) or (
+        lambda key: mmh3.hash(key, 0, False)
+    )
+    _MMH3_128 = getattr(mmh3, "mmh3_x64_128_uintdigest", None) or (
+        lambda key: mmh3.hash128(key, 0, True, False)
+    )
+
+
+def _MMH3_32(key):
+    _LoadMurmur()
+    return _MMH3_32(key)
+
+
+def _MMH3_128(key):
+    _LoadMurmur()
+    return _MMH3_128(key)
 
 
 class HashFunction:
     @classmethod
     def get_hash(cls, key) -> int:
+        """
+        * @return the lower 64 bits of the 128-bit MurmurHash3 (x64) of key, which is also the first half of
+        *         mmh3.hash64(key)
+        """
+        if type(key) is not bytes:
+            key = cls._to_bytes(key)
+        return _MMH3_128(key) & _MASK64
+
+    @classmethod
+    def get_hash32(cls, key) -> int:
+        """* @return the 32-bit MurmurHash3 of key, about half the cost of get_hash for short keys"""
+        if type(key) is not bytes:
+            key = cls._to_bytes(key)
+        return _MMH3_32(key)
+
+    @classmethod
+    def get_hashes(cls, keys, key_format=None, bits=64) -> list:
+        """
+        * Hash a batch of keys in one call.
+        *
+        * @param keys ints, str or bytes-like keys, or a NumPy array
+        * @param key_format struct format of fixed-width keys: each key is hashed over its packed little-endian bytes,
+        *        as the hash table does. Without it keys are converted like get_hash does, and the items of an array
+        *        are hashed over their little-endian bytes.
+        * @param bits 64 for the hashes of get_hash, 32 for those of get_hash32
+        * @return the hash of every key, in order
+        """
+        if bits == 64:
+            digest = _MMH3_128
+        elif bits == 32:
+            digest = _MMH3_32
+        else:
+            raise ValueError(f"unsupported hash width {bits}, expected 32 or 64")
+
+        if hasattr(keys, "dtype"):
+            array = keys.astype(
+                "<" + key_format if key_format else keys.dtype.newbyteorder("<"),
+                copy=False,
+            )
+            data, width = array.tobytes(), array.dtype.itemsize
+            items = [data[start : start + width] for start in range(0, len(data), width)]
+        elif key_format is not None:
+            items = list(map(struct.Struct("<" + key_format).pack, keys))
+        else:
+            items = keys if isinstance(keys, list) else list(keys)
+            try:
+                # bytes and str keys go straight to the digest
+                hashes = list(map(digest, items))
+            except TypeError:
+                items = list(map(cls._to_bytes, items))
+            else:
+                return hashes if bits == 32 else [h & _MASK64 for h in hashes]
+
+        hashes = map(digest, items)
+        return list(hashes) if bits == 32 else [h & _MASK64 for h in hashes]
+
+    @staticmethod
+    def _to_bytes(key) -> bytes:
         # Convert the key to bytes if it is not already
         if isinstance(key, str):
-            key = key.encode("utf-8")
+            return key.encode("utf-8")
         elif isinstance(key, int):
-            key = key.to_bytes((key.bit_length() + 7) // 8, byteorder="little")
-        elif isinstance(key, bytes):
-            pass
-        else:
-            raise TypeError("Unsupported key type")
-
-        # Get the 128-bit hash using MurmurHash3
-        hash128 = mmh3.hash128(key, seed=0)
-        return hash128 & 0xFFFFFFFFFFFFFFFF  # Return only the lower 64 bits
+            return key.to_bytes((key.bit_length() + 7) // 8, byteorder="little")
+        elif isinstance(key, (bytes, bytearray, memoryview)):
+            return bytes(key)
+        raise TypeError("Unsupported key type")
 
 
 # # Example usage
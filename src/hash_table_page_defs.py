@@ -1,4 +1,4 @@
-from src.config import PAGE_SIZE
+from src.config import PAGE_SIZE, PAGE_HEADER_SIZE
 from sys import getsizeof
 from struct import calcsize
 
@@ -17,22 +17,49 @@ sizeOfMappingType = getsizeof(
 )  # Example size of std::pair<KeyType, ValueType>, skipped just to avoid the overhead of python obj type
 
 
-sizeOfMappingType = calcsize("2I")  # # Size of std::pair<KeyType, ValueType> in C++
-"""**
- * BUCKET_ARRAY_SIZE is the number of (key, value) pairs that can be stored in an extendible hash index bucket page.
- * The computation is the same as the above BLOCK_ARRAY_SIZE, but blocks and buckets have different implementations
- * of search, insertion, removal, and helper methods.
- *"""
-BUCKET_ARRAY_SIZE = 4 * PAGE_SIZE // (4 * sizeOfMappingType + 1)
+# Default struct formats of the fixed-width keys and values stored in bucket pages
+KEY_FORMAT = "i"
+VALUE_FORMAT = "i"
 
+sizeOfMappingType = calcsize("<" + KEY_FORMAT + VALUE_FORMAT)  # Size of std::pair<KeyType, ValueType> in C++
 
 # Define the size of uint32_t using the struct module
 UINT32_SIZE = calcsize("I")
 
 # Define the constant using the size of uint32_t
-HTABLE_BUCKET_PAGE_METADATA_SIZE = UINT32_SIZE * 2
+HTABLE_BUCKET_PAGE_METADATA_SIZE = UINT32_SIZE * 3
+
+# Size of the per-slot key fingerprint of a bucket page
+FINGERPRINT_SIZE = 1
+
+
+def BucketArraySize(mapping_type_size):
+    """**
+    * Number of (key, value) slots of mapping_type_size bytes that fit in a bucket page next to the page header, the
+    * bucket metadata, the occupied_ and readable_ bitmaps (one bit each per slot) and the fingerprints (one byte per
+    * slot).
+    *"""
+    available = PAGE_SIZE - PAGE_HEADER_SIZE - HTABLE_BUCKET_PAGE_METADATA_SIZE
+    slot_size = mapping_type_size + FINGERPRINT_SIZE
+    size = 4 * available // (4 * slot_size + 1)
+    while 2 * ((size + 7) // 8) + size * slot_size > available:
+        size -= 1
+    return size
+
+
+"""**
+ * BUCKET_ARRAY_SIZE is the number of (key, value) pairs that can be stored in an extendible hash index bucket page
+ * with the default key and value formats.
+ *"""
+BUCKET_ARRAY_SIZE = BucketArraySize(sizeOfMappingType)
 
 
 HTABLE_HEADER_MAX_DEPTH = 9
 
-HTABLE_DIRECTORY_MAX_DEPTH = 9
\ No newline at end of file
+# Number of directory page ids the header page of an extendible hash index can hold
+HTABLE_HEADER_ARRAY_SIZE = 1 << HTABLE_HEADER_MAX_DEPTH
+
+HTABLE_DIRECTORY_MAX_DEPTH = 9
+
+# Fill fraction at or below which a bucket is merged with its split image on remove
+HTABLE_MERGE_THRESHOLD = 0.25
@@ -1,38 +1,193 @@
 import threading
+import time
 
 
 class ReaderWriterLatch:
-    """Reader-Writer latch using shared mutex"""
+    """
+    * Reader-writer latch using shared mutex.
+    *
+    * By default readers are preferred: a reader only waits for an active writer, so under a continuous read load a
+    * writer can wait indefinitely. With prefer_writers, a waiting writer also holds back the readers that arrive
+    * after it, while the readers that queued up during a write are all admitted when that write ends. Reads and
+    * writes thus alternate in phases under contention and neither side starves: a writer waits for at most the
+    * readers present when it arrived and the writers ahead of it. A thread must not take the read latch again while
+    * it holds it in this mode, a writer waiting in between would deadlock it.
+    *
+    * Readers and writers wait on separate conditions: the end of a write wakes the waiting readers, or else one
+    * writer, and the last reader out wakes one writer.
+    """
 
-    def __init__(self):
+    # counters kept with collect_stats
+    _STAT_NAMES = (
+        "read_acquisitions",
+        "read_contended",
+        "read_wait_ns",
+        "read_timeouts",
+        "write_acquisitions",
+        "write_contended",
+        "write_wait_ns",
+        "write_timeouts",
+    )
+
+    def __init__(self, prefer_writers=False, collect_stats=False):
+        """
+        * @param prefer_writers hold back new readers while a writer waits, see above
+        * @param collect_stats count acquisitions, contended acquisitions, timeouts and wait time, see GetStats
+        """
         self._readers = 0
         self._writer = False
+        self._prefer_writers = prefer_writers
+        self._waiting_readers = 0
+        self._waiting_writers = 0
+        # bumped at the end of every write, a reader that queued in an earlier phase no longer yields to writers
+        self._phase = 0
         self._lock = threading.Lock()
-        self._condition = threading.Condition(self._lock)
+        self._readers_ok = threading.Condition(self._lock)
+        self._writers_ok = threading.Condition(self._lock)
+        self._stats = dict.fromkeys(self._STAT_NAMES, 0) if collect_stats else None
 
-    def WLock(self):
-        """* Acquire a write latch"""
-        with self._condition:
-            while self._writer or self._readers:
-                self._condition.wait()
+    def WLock(self, timeout=None) -> bool:
+        """
+        * Acquire a write latch
+        * @param timeout seconds to wait at most, None to wait until the latch is acquired
+        * @return whether the latch was acquired
+        """
+        with self._lock:
+            if self._writer or self._readers:
+                return self._WaitWrite(timeout)
             self._writer = True
+            if self._stats is not None:
+                self._stats["write_acquisitions"] += 1
+            return True
+
+    def TryWLock(self) -> bool:
+        """* @return whether the write latch was acquired, without waiting"""
+        return self.WLock(0)
 
     def WUnLock(self):
         """Release a write latch"""
-        with self._condition:
+        with self._lock:
             self._writer = False
-            self._condition.notify_all()
+            self._phase += 1
+            if self._waiting_readers:
+                self._readers_ok.notify_all()
+            elif self._waiting_writers:
+                self._writers_ok.notify()
 
-    def RLock(self):
-        """* Acquire a read latch"""
-        with self._condition:
-            while self._writer:
-                self._condition.wait()
+    def RLock(self, timeout=None) -> bool:
+        """
+        * Acquire a read latch
+        * @param timeout seconds to wait at most, None to wait until the latch is acquired
+        * @return whether the latch was acquired
+        """
+        with self._lock:
+            if self._writer or (self._prefer_writers and self._waiting_writers):
+                return self._WaitRead(timeout)
             self._readers += 1
+            if self._stats is not None:
+                self._stats["read_acquisitions"] += 1
+            return True
+
+    def TryRLock(self) -> bool:
+        """* @return whether the read latch was acquired, without waiting"""
+        return self.RLock(0)
 
     def RUnLock(self):
         """* Release a read latch."""
-        with self._condition:
+        with self._lock:
             self._readers -= 1
-            if self._readers == 0:
-                self._condition.notify_all()
+            if self._readers == 0 and self._waiting_writers:
+                self._writers_ok.notify()
+
+    def Downgrade(self):
+        """
+        * Turn the write latch held by the caller into a read latch, without letting another writer in between.
+        * Readers waiting for the write are admitted along with it.
+        """
+        with self._lock:
+            if not self._writer:
+                raise RuntimeError("Downgrade requires the write latch")
+            self._writer = False
+            self._readers += 1
+            self._phase += 1
+            if self._waiting_readers:
+                self._readers_ok.notify_all()
+
+    def GetStats(self) -> dict:
+        """
+        * @return a snapshot of the counters: acquisitions, contended acquisitions (that had to wait), total wait time
+        *         in nanoseconds and timeouts, for reads and writes; None if the latch does not collect them
+        """
+        if self._stats is None:
+            return None
+        with self._lock:
+            return dict(self._stats)
+
+    def _WaitRead(self, timeout) -> bool:
+        """Wait for the read latch. Caller holds self._lock."""
+        if timeout is not None and timeout <= 0:
+            return self._GiveUp("read_timeouts")
+        phase = self._phase
+        deadline = None if timeout is None else time.monotonic() + timeout
+        start = time.perf_counter_ns() if self._stats is not None else 0
+        self._waiting_readers += 1
+        try:
+            while self._writer or (
+                self._prefer_writers and self._waiting_writers and phase == self._phase
+            ):
+                if deadline is None:
+                    self._readers_ok.wait()
+                elif not self._readers_ok.wait(max(0, deadline - time.monotonic())):
+                    break
+        finally:
+            self._waiting_readers -= 1
+        if self._writer or (self._prefer_writers and self._waiting_writers and phase == self._phase):
+            return self._GiveUp("read_timeouts")
+        self._readers += 1
+        if self._stats is not None:
+            self._stats["read_acquisitions"] += 1
+            self._stats["read_contended"] += 1
+            self._stats["read_wait_ns"] += time.perf_counter_ns() - start
+        return True
+
+    def _WaitWrite(self, timeout) -> bool:
+        """Wait for the write latch. Caller holds self._lock."""
+        if timeout is not None and timeout <= 0:
+            return self._GiveUp("write_timeouts")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        start = time.perf_counter_ns() if self._stats is not None else 0
+        self._waiting_writers += 1
+        try:
+            while self._writer or self._readers:
+                if deadline is None:
+                    self._writers_ok.wait()
+                elif not self._writers_ok.wait(max(0, deadline - time.monotonic())):
+                    break
+        finally:
+            self._waiting_writers -= 1
+        if self._writer or self._readers:
+            self._PassOnWakeUp()
+            return self._GiveUp("write_timeouts")
+        self._writer = True
+        if self._stats is not None:
+            self._stats["write_acquisitions"] += 1
+            self._stats["write_contended"] += 1
+            self._stats["write_wait_ns"] += time.perf_counter_ns() - start
+        return True
+
+    def _PassOnWakeUp(self):
+        """
+        * A writer gives up waiting: readers it held back may go on, and it may have consumed the wake-up meant for
+        * the next writer. Caller holds self._lock.
+        """
+        if self._writer:
+            return
+        if self._waiting_readers and not self._waiting_writers:
+            self._readers_ok.notify_all()
+        if not self._readers and self._waiting_writers:
+            self._writers_ok.notify()
+
+    def _GiveUp(self, counter) -> bool:
+        if self._stats is not None:
+            self._stats[counter] += 1
+        return False
@@ -0,0 +1,126 @@
+from src.config import lsn_t, INVALID_LSN, CHECKPOINT_INTERVAL, CHECKPOINT_FLUSH_PAGES
+from src.buffer.BufferPoolManager import BufferPoolManager
+from src.recovery.LogManager import LogManager
+from src.recovery.LogRecord import (
+    LogRecord,
+    LOG_RECORD_HEADER_SIZE,
+    DIRTY_PAGE_ENTRY_SIZE,
+)
+import threading
+
+"""
+ * CheckpointManager takes fuzzy checkpoints while the system keeps running: nothing is quiesced and no page is
+ * forced except a bounded number of old dirty pages.
+ *
+ * A checkpoint:
+ *  1. appends CHECKPOINT_BEGIN,
+ *  2. trickle-flushes up to flush_pages dirty pages that have stayed dirty since before the previous checkpoint,
+ *  3. snapshots the dirty page table (page id -> recLSN) of the buffer pool, pinned pages included since their
+ *     writers may have logged changes before unpinning them dirty, and syncs the database file, so every page that
+ *     is not in the snapshot is durable,
+ *  4. logs the snapshot in CHECKPOINT_DPT records, appends CHECKPOINT_END, flushes the log and points the master
+ *     record at the begin record,
+ *  5. truncates the log before min(recLSN, begin LSN), recovery never needs anything older, once that drops at least
+ *     LOG_TRUNCATE_MIN_FRACTION of the log file.
+ *
+ * Recovery starts from the checkpoint named by the master record, see LogRecovery.
+"""
+
+
+class CheckpointManager:
+    def __init__(
+        self,
+        buffer_pool_manager: BufferPoolManager,
+        log_manager: LogManager,
+        interval=CHECKPOINT_INTERVAL,
+        flush_pages=CHECKPOINT_FLUSH_PAGES,
+    ) -> None:
+        """
+        * @param buffer_pool_manager the buffer pool whose dirty pages are tracked
+        * @param log_manager the log manager the checkpoint records are appended to
+        * @param interval seconds between two checkpoints of the checkpoint thread
+        * @param flush_pages maximum number of old dirty pages flushed per checkpoint
+        """
+        self._bpm = buffer_pool_manager
+        self._log_manager = log_manager
+        self._disk_manager = buffer_pool_manager.disk_manager
+        self._interval = interval
+        self._flush_pages = flush_pages
+        self._last_checkpoint_lsn: lsn_t = self._disk_manager.ReadMasterRecord()
+        # one checkpoint at a time, whether from the thread or an explicit call
+        self._checkpoint_latch = threading.Lock()
+        self._stop = threading.Event()
+        self._checkpoint_thread = None
+
+    def Checkpoint(self) -> lsn_t:
+        """
+        * Take a fuzzy checkpoint.
+        * @return the lsn of the checkpoint begin record
+        """
+        with self._checkpoint_latch:
+            begin_lsn = self._log_manager.AppendLogRecord(LogRecord.CheckpointBegin())
+            self._TrickleFlush()
+
+            dirty_page_table = self._bpm.GetDirtyPageTable()
+            self._disk_manager.Sync()
+
+            records = [
+                LogRecord.CheckpointDirtyPages(chunk)
+                for chunk in self._Chunk(sorted(dirty_page_table.items()))
+            ]
+            records.append(LogRecord.CheckpointEnd())
+            end_lsn = self._log_manager.AppendLogRecords(records)[-1]
+            self._log_manager.Flush(end_lsn)
+            self._disk_manager.WriteMasterRecord(begin_lsn)
+            self._last_checkpoint_lsn = begin_lsn
+
+            self._log_manager.TruncateLog(min([begin_lsn, *dirty_page_table.values()]))
+            return begin_lsn
+
+    def GetLastCheckpointLSN(self) -> lsn_t:
+        """@return the begin lsn of the last complete checkpoint"""
+        return self._last_checkpoint_lsn
+
+    def RunCheckpointThread(self):
+        """* Start taking a checkpoint every interval seconds in the background."""
+        if self._checkpoint_thread is not None:
+            return
+        self._stop.clear()
+        self._checkpoint_thread = threading.Thread(
+            target=self._CheckpointLoop, name="checkpoint", daemon=True
+        )
+        self._checkpoint_thread.start()
+
+    def StopCheckpointThread(self):
+        """* Stop the background checkpoint thread."""
+        if self._checkpoint_thread is None:
+            return
+        self._stop.set()
+        self._checkpoint_thread.join()
+        self._checkpoint_thread = None
+
+    def _CheckpointLoop(self):
+        while not self._stop.wait(self._interval):
+            self.Checkpoint()
+
+    def _TrickleFlush(self):
+        """Write back the oldest pages that were already dirty when the previous checkpoint began."""
+        if self._last_checkpoint_lsn == INVALID_LSN:
+            return
+        old_pages = sorted(
+            (rec_lsn, page_id)
+            for page_id, rec_lsn in self._bpm.GetDirtyPageTable().items()
+            if rec_lsn < self._last_checkpoint_lsn
+        )
+        for _, page_id in old_pages[: self._flush_pages]:
+            self._bpm.FlushPage(page_id)
+
+    def _Chunk(self, dirty_pages):
+        """Split the dirty page table into records that fit the log buffer."""
+        per_record = max(
+            1,
+            (self._log_manager.GetBufferSize() - LOG_RECORD_HEADER_SIZE)
+            // DIRTY_PAGE_ENTRY_SIZE,
+        )
+        for start in range(0, len(dirty_pages), per_record):
+            yield dirty_pages[start : start + per_record]
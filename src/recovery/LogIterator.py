@@ -0,0 +1,58 @@
+from src.config import size_type, LOG_READ_CHUNK_SIZE
+from src.storage.DiskManager import DiskManager
+from src.recovery.LogRecord import LogRecord
+
+"""
+ * LogIterator streams the log file front to back in large chunks. Each chunk is read straight into a fresh buffer and
+ * records are parsed from a memoryview over it, so record payloads are slices of the chunk rather than copies. A
+ * record that straddles two chunks is carried over into the next one. Iteration stops at the end of the log or at
+ * the first torn or corrupted record.
+"""
+
+
+class LogIterator:
+    def __init__(
+        self,
+        disk_manager: DiskManager,
+        start_offset: size_type = 0,
+        chunk_size: size_type = LOG_READ_CHUNK_SIZE,
+    ) -> None:
+        """
+        * @param disk_manager the disk manager owning the log file
+        * @param start_offset file offset of the first record to read
+        * @param chunk_size number of bytes read from the log per I/O
+        """
+        self._disk_manager = disk_manager
+        self._chunk_size = chunk_size
+        # file offset just past the last record returned
+        self._offset = start_offset
+
+    def GetOffset(self) -> size_type:
+        """@return the file offset just past the last record returned"""
+        return self._offset
+
+    def __iter__(self):
+        end = self._disk_manager.GetLogSize()
+        file_pos = self._offset
+        carry = b""
+        while file_pos < end:
+            to_read = min(self._chunk_size, end - file_pos)
+            chunk = bytearray(len(carry) + to_read)
+            chunk[: len(carry)] = carry
+            view = memoryview(chunk)
+            if not self._disk_manager.readLog(view[len(carry) :], to_read, file_pos):
+                return
+            file_pos += to_read
+
+            cursor = 0
+            while True:
+                size = LogRecord.PeekSize(view, cursor)
+                if size == 0 or cursor + size > len(view):
+                    break
+                record = LogRecord.DeserializeFrom(view, cursor)
+                if record is None:
+                    return
+                cursor += size
+                self._offset += size
+                yield record
+            carry = view[cursor:]
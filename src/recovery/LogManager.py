@@ -1,2 +1,229 @@
+from src.config import lsn_t, LOG_BUFFER_SIZE, LOG_TIMEOUT, LOG_TRUNCATE_MIN_FRACTION
+from src.storage.DiskManager import DiskManager
+from src.recovery.LogRecord import LogRecord
+import bisect
+import threading
+
+"""
+ * LogManager maintains a separate thread that is awakened whenever the log buffer is full or whenever a timeout
+ * happens. When the thread is awakened, the log buffer's content is written into the disk log file.
+ *
+ * Appends go into the log buffer while a second, flush buffer is being written out, so appending a record never waits
+ * on I/O unless the log buffer fills up before the previous flush is done. A flush swaps the two buffers, then writes
+ * and fsyncs the flush buffer in a single DiskManager.writeLog call; every committer waiting in Flush(lsn) is released
+ * by that one fsync (group commit).
+"""
+
+
 class LogManager:
-    pass
+    def __init__(
+        self,
+        disk_manager: DiskManager,
+        buffer_size=LOG_BUFFER_SIZE,
+        timeout=LOG_TIMEOUT,
+    ) -> None:
+        """
+        * Creates a new LogManager.
+        * @param disk_manager the disk manager whose log file receives the records
+        * @param buffer_size size of each of the two log buffers in bytes
+        * @param timeout seconds the flush thread waits before flushing a non-empty log buffer
+        """
+        self._disk_manager = disk_manager
+        self._buffer_size = buffer_size
+        self._timeout = timeout
+        self._log_buffer_ = bytearray(buffer_size)
+        self._flush_buffer_ = bytearray(buffer_size)
+        # number of bytes used in the log buffer
+        self._offset = 0
+        # a zeroed page carries lsn 0, so the first record gets lsn 1 and is never mistaken as applied
+        self._next_lsn_: lsn_t = 1
+        # the last lsn stored in the log buffer
+        self._last_lsn_: lsn_t = self._next_lsn_ - 1
+        # the last lsn that is known to be on disk
+        self._persistent_lsn_: lsn_t = self._next_lsn_ - 1
+
+        self._latch = threading.Lock()
+        # wakes the flush thread: buffer full, explicit flush request or shutdown
+        self._flush_cv = threading.Condition(self._latch)
+        # wakes appenders waiting for buffer space and committers waiting in Flush
+        self._persist_cv = threading.Condition(self._latch)
+        # serializes buffer swaps, whichever thread performs the flush
+        self._flush_io_latch = threading.Lock()
+        # serializes the truncations of the log file
+        self._truncate_latch = threading.Lock()
+        self._flush_requested = False
+        self._flush_thread = None
+        self._stop = False
+
+        # the first lsn in the log buffer
+        self._buffer_first_lsn: lsn_t = self._next_lsn_
+        # size of the log file, i.e. the offset the next flushed batch lands at
+        self._log_file_size = disk_manager.GetLogSize()
+        # first lsns and file offsets of the batches flushed since startup, where the log can be cut
+        self._batch_lsns = []
+        self._batch_offsets = []
+
+    def RunFlushThread(self):
+        """* Start the background thread that flushes the log buffer."""
+        with self._latch:
+            if self._flush_thread is not None:
+                return
+            self._stop = False
+            self._flush_thread = threading.Thread(
+                target=self._FlushLoop, name="log-flush", daemon=True
+            )
+            self._flush_thread.start()
+
+    def StopFlushThread(self):
+        """* Flush whatever is buffered and stop the background flush thread."""
+        with self._latch:
+            thread = self._flush_thread
+            if thread is None:
+                return
+            self._stop = True
+            self._flush_cv.notify()
+        thread.join()
+        with self._latch:
+            self._flush_thread = None
+            # committers still waiting now flush by themselves
+            self._persist_cv.notify_all()
+
+    def AppendLogRecord(self, log_record: LogRecord) -> lsn_t:
+        """
+        * Append a log record to the log buffer. The record is serialized straight into the buffer.
+        * Blocks only when the log buffer is full and the previous flush has not finished yet.
+        * @param log_record the log record, its lsn is set by this call
+        * @return the lsn assigned to the record
+        """
+        return self.AppendLogRecords([log_record])[0]
+
+    def AppendLogRecords(self, log_records) -> list:
+        """
+        * Append a batch of log records under a single latch acquisition. The records get consecutive LSNs.
+        * @param log_records the log records, their lsns are set by this call
+        * @return the lsns assigned to the records, in order
+        """
+        lsns = []
+        with self._latch:
+            for log_record in log_records:
+                size = log_record.GetSize()
+                if size > self._buffer_size:
+                    raise ValueError(
+                        f"log record of {size} bytes exceeds the log buffer size {self._buffer_size}"
+                    )
+                while self._offset + size > self._buffer_size:
+                    self._RequestFlush()
+                if not self._offset:
+                    self._buffer_first_lsn = self._next_lsn_
+                log_record.lsn_ = self._next_lsn_
+                self._next_lsn_ += 1
+                self._offset += log_record.SerializeTo(self._log_buffer_, self._offset)
+                self._last_lsn_ = log_record.lsn_
+                lsns.append(log_record.lsn_)
+        return lsns
+
+    def Flush(self, lsn: lsn_t = None):
+        """
+        * Wait until the log is durable up to and including lsn. Concurrent callers share a single fsync.
+        * @param lsn the lsn that must be on disk, None to flush everything appended so far
+        """
+        with self._latch:
+            if lsn is None or lsn >= self._next_lsn_:
+                lsn = self._next_lsn_ - 1
+            while self._persistent_lsn_ < lsn:
+                self._RequestFlush()
+
+    def TruncateLog(self, lsn: lsn_t) -> int:
+        """
+        * Drop the flushed batches that end before lsn. The log is only cut at batch boundaries, so records older
+        * than lsn may survive; no record at or after lsn is ever dropped. Copying the surviving tail costs as much as
+        * the tail is long, so nothing is dropped until the cut reaches LOG_TRUNCATE_MIN_FRACTION of the log file.
+        * Flushes go on while the tail is copied.
+        * @param lsn the oldest lsn that must stay in the log
+        * @return the number of bytes dropped from the log file
+        """
+        with self._truncate_latch:
+            with self._flush_io_latch:
+                idx = bisect.bisect_right(self._batch_lsns, lsn) - 1
+                if idx <= 0:
+                    return 0
+                cut = self._batch_offsets[idx]
+                if cut < LOG_TRUNCATE_MIN_FRACTION * self._log_file_size:
+                    return 0
+            self._disk_manager.TruncateLog(cut)
+            with self._flush_io_latch:
+                # batches flushed during the copy got offsets in the old file as well
+                del self._batch_lsns[:idx]
+                del self._batch_offsets[:idx]
+                self._batch_offsets = [offset - cut for offset in self._batch_offsets]
+                self._log_file_size -= cut
+            return cut
+
+    def GetBufferSize(self) -> int:
+        """@return the size of a log buffer, the upper bound for a single record"""
+        return self._buffer_size
+
+    def GetNextLSN(self) -> lsn_t:
+        """@return the lsn the next appended record will get"""
+        return self._next_lsn_
+
+    def SetNextLSN(self, lsn: lsn_t):
+        """* Resume lsn assignment after the records already in the log, used at restart."""
+        with self._latch:
+            self._next_lsn_ = self._buffer_first_lsn = lsn
+            self._last_lsn_ = self._persistent_lsn_ = lsn - 1
+
+    def GetPersistentLSN(self) -> lsn_t:
+        """@return the last lsn that is known to be on disk"""
+        return self._persistent_lsn_
+
+    def _RequestFlush(self):
+        """
+        Get the log buffer flushed and wait for the next flush to finish. Caller holds the latch.
+        Without a flush thread the caller performs the flush itself.
+        """
+        if self._flush_thread is not None:
+            self._flush_requested = True
+            self._flush_cv.notify()
+            self._persist_cv.wait()
+            return
+        self._latch.release()
+        try:
+            self._FlushBuffer()
+        finally:
+            self._latch.acquire()
+
+    def _FlushLoop(self):
+        while True:
+            with self._latch:
+                if not self._flush_requested and not self._stop:
+                    self._flush_cv.wait(self._timeout)
+                self._flush_requested = False
+                stop = self._stop
+            self._FlushBuffer()
+            if stop:
+                return
+
+    def _FlushBuffer(self):
+        """Swap the buffers, then write and fsync the filled one without holding the latch."""
+        with self._flush_io_latch:
+            with self._latch:
+                size, last_lsn = self._offset, self._last_lsn_
+                first_lsn = self._buffer_first_lsn
+                if size:
+                    self._log_buffer_, self._flush_buffer_ = (
+                        self._flush_buffer_,
+                        self._log_buffer_,
+                    )
+                    self._offset = 0
+
+            if size:
+                self._disk_manager.writeLog(self._flush_buffer_, size)
+                self._batch_lsns.append(first_lsn)
+                self._batch_offsets.append(self._log_file_size)
+                self._log_file_size += size
+
+            with self._latch:
+                if size:
+                    self._persistent_lsn_ = last_lsn
+                self._persist_cv.notify_all()
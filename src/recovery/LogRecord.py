@@ -0,0 +1,248 @@
+from src.config import lsn_t, page_id_t, INVALID_LSN, INVALID_PAGE_ID
+from enum import IntEnum
+import struct
+import zlib
+
+"""
+ * For every write operation on a page, a corresponding log record is written.
+ *
+ * Log record header format (size in byte, little endian):
+ * ---------------------------------------------------------------
+ * | Size (4) | CRC (4) | LSN (4) | PrevLSN (4) | LogRecordType (1) |
+ * ---------------------------------------------------------------
+ * Size is the length of the whole record including the header. The CRC-32 covers everything after the CRC field,
+ * so a torn or corrupted tail of the log is detected instead of replayed.
+ *
+ * Payload formats:
+ * PAGE_WRITE:          | PageId (4) | Offset (2) | Data (Size - header - 6) |
+ * NEW_PAGE:            | PageId (4) |
+ * HASH_INSERT/REMOVE:  | PageId (4) | KeySize (2) | Key (KeySize) | Value (rest) |
+ * BLOOM_ADD:           | PageId (4) | Partition (2) | KeyHash (8) |
+ * CHECKPOINT_DPT:      | PageId (4) | RecLSN (4) | PageId (4) | RecLSN (4) | ...
+ * CHECKPOINT_BEGIN/END carry no payload.
+ *
+ * PrevLSN is supplied by the writer (e.g. the page LSN before the change), the log manager assigns the LSN.
+"""
+
+_HEADER = struct.Struct("<IIiiB")
+_PAGE_WRITE = struct.Struct("<iH")
+_NEW_PAGE = struct.Struct("<i")
+_HASH_ENTRY = struct.Struct("<iH")
+_DIRTY_PAGE = struct.Struct("<ii")
+_BLOOM_ADD = struct.Struct("<iHQ")
+
+# size of the log record header in byte
+LOG_RECORD_HEADER_SIZE = _HEADER.size
+
+# size of one (page id, recLSN) entry of a CHECKPOINT_DPT record in byte
+DIRTY_PAGE_ENTRY_SIZE = _DIRTY_PAGE.size
+
+# offset of the first byte covered by the CRC
+_CRC_START = 8
+
+
+class LogRecordType(IntEnum):
+    INVALID = 0
+    PAGE_WRITE = 1
+    NEW_PAGE = 2
+    HASH_INSERT = 3
+    HASH_REMOVE = 4
+    CHECKPOINT_BEGIN = 5
+    CHECKPOINT_DPT = 6
+    CHECKPOINT_END = 7
+    BLOOM_ADD = 8
+
+
+class LogRecord:
+    __slots__ = (
+        "lsn_",
+        "prev_lsn_",
+        "log_record_type_",
+        "page_id_",
+        "offset_",
+        "data_",
+        "key_",
+        "value_",
+        "key_hash_",
+    )
+
+    def __init__(
+        self,
+        log_record_type: LogRecordType,
+        page_id: page_id_t = INVALID_PAGE_ID,
+        prev_lsn: lsn_t = INVALID_LSN,
+        offset=0,
+        data=b"",
+        key=b"",
+        value=b"",
+        key_hash=0,
+    ) -> None:
+        self.lsn_: lsn_t = INVALID_LSN
+        self.prev_lsn_: lsn_t = prev_lsn
+        self.log_record_type_ = LogRecordType(log_record_type)
+        self.page_id_: page_id_t = page_id
+        # PAGE_WRITE: byte offset inside the page and the after-image written there
+        self.offset_ = offset
+        self.data_ = data
+        # HASH_INSERT/HASH_REMOVE: the serialized key and value
+        self.key_ = key
+        self.value_ = value
+        # BLOOM_ADD: the 64-bit hash of the key added to the filter partition at offset_
+        self.key_hash_ = key_hash
+
+    @classmethod
+    def PageWrite(cls, page_id: page_id_t, offset, data, prev_lsn=INVALID_LSN):
+        """@return a record for the bytes data written at offset of page_id"""
+        return cls(LogRecordType.PAGE_WRITE, page_id, prev_lsn, offset=offset, data=data)
+
+    @classmethod
+    def NewPage(cls, page_id: page_id_t, prev_lsn=INVALID_LSN):
+        """@return a record for the allocation of page_id"""
+        return cls(LogRecordType.NEW_PAGE, page_id, prev_lsn)
+
+    @classmethod
+    def HashInsert(cls, page_id: page_id_t, key, value, prev_lsn=INVALID_LSN):
+        """@return a record for inserting the serialized key/value pair into bucket page_id"""
+        return cls(LogRecordType.HASH_INSERT, page_id, prev_lsn, key=key, value=value)
+
+    @classmethod
+    def HashRemove(cls, page_id: page_id_t, key, value, prev_lsn=INVALID_LSN):
+        """@return a record for removing the serialized key/value pair from bucket page_id"""
+        return cls(LogRecordType.HASH_REMOVE, page_id, prev_lsn, key=key, value=value)
+
+    @classmethod
+    def BloomAdd(cls, page_id: page_id_t, partition, key_hash, prev_lsn=INVALID_LSN):
+        """@return a record for adding the key with hash key_hash to a partition of Bloom filter page page_id"""
+        return cls(
+            LogRecordType.BLOOM_ADD, page_id, prev_lsn, offset=partition, key_hash=key_hash
+        )
+
+    @classmethod
+    def CheckpointBegin(cls):
+        return cls(LogRecordType.CHECKPOINT_BEGIN)
+
+    @classmethod
+    def CheckpointDirtyPages(cls, dirty_pages):
+        """@return a record holding (page id, recLSN) pairs of the dirty page table"""
+        data = bytearray(_DIRTY_PAGE.size * len(dirty_pages))
+        for i, (page_id, rec_lsn) in enumerate(dirty_pages):
+            _DIRTY_PAGE.pack_into(data, i * _DIRTY_PAGE.size, page_id, rec_lsn)
+        return cls(LogRecordType.CHECKPOINT_DPT, data=data)
+
+    @classmethod
+    def CheckpointEnd(cls):
+        return cls(LogRecordType.CHECKPOINT_END)
+
+    def GetDirtyPages(self):
+        """@return the (page id, recLSN) pairs of a CHECKPOINT_DPT record"""
+        return _DIRTY_PAGE.iter_unpack(self.data_)
+
+    def GetLSN(self) -> lsn_t:
+        return self.lsn_
+
+    def GetPrevLSN(self) -> lsn_t:
+        return self.prev_lsn_
+
+    def GetLogRecordType(self) -> LogRecordType:
+        return self.log_record_type_
+
+    def GetPageId(self) -> page_id_t:
+        return self.page_id_
+
+    def GetSize(self) -> int:
+        """@return the serialized size of the record, header included"""
+        record_type = self.log_record_type_
+        if record_type == LogRecordType.PAGE_WRITE:
+            return _HEADER.size + _PAGE_WRITE.size + len(self.data_)
+        if record_type == LogRecordType.NEW_PAGE:
+            return _HEADER.size + _NEW_PAGE.size
+        if record_type in (LogRecordType.HASH_INSERT, LogRecordType.HASH_REMOVE):
+            return _HEADER.size + _HASH_ENTRY.size + len(self.key_) + len(self.value_)
+        if record_type == LogRecordType.CHECKPOINT_DPT:
+            return _HEADER.size + len(self.data_)
+        if record_type == LogRecordType.BLOOM_ADD:
+            return _HEADER.size + _BLOOM_ADD.size
+        return _HEADER.size
+
+    def SerializeTo(self, buffer, offset) -> int:
+        """
+        * Write the record into buffer at offset, e.g. straight into the log buffer.
+        * @return the number of bytes written
+        """
+        size = self.GetSize()
+        cursor = offset + _HEADER.size
+        record_type = self.log_record_type_
+        if record_type == LogRecordType.PAGE_WRITE:
+            _PAGE_WRITE.pack_into(buffer, cursor, self.page_id_, self.offset_)
+            cursor += _PAGE_WRITE.size
+            buffer[cursor : cursor + len(self.data_)] = self.data_
+        elif record_type == LogRecordType.NEW_PAGE:
+            _NEW_PAGE.pack_into(buffer, cursor, self.page_id_)
+        elif record_type in (LogRecordType.HASH_INSERT, LogRecordType.HASH_REMOVE):
+            _HASH_ENTRY.pack_into(buffer, cursor, self.page_id_, len(self.key_))
+            cursor += _HASH_ENTRY.size
+            buffer[cursor : cursor + len(self.key_)] = self.key_
+            cursor += len(self.key_)
+            buffer[cursor : cursor + len(self.value_)] = self.value_
+        elif record_type == LogRecordType.CHECKPOINT_DPT:
+            buffer[cursor : cursor + len(self.data_)] = self.data_
+        elif record_type == LogRecordType.BLOOM_ADD:
+            _BLOOM_ADD.pack_into(buffer, cursor, self.page_id_, self.offset_, self.key_hash_)
+
+        _HEADER.pack_into(
+            buffer, offset, size, 0, self.lsn_, self.prev_lsn_, record_type
+        )
+        view = memoryview(buffer)
+        struct.pack_into(
+            "<I", buffer, offset + 4, zlib.crc32(view[offset + _CRC_START : offset + size])
+        )
+        return size
+
+    @classmethod
+    def DeserializeFrom(cls, view: memoryview, offset=0):
+        """
+        * Parse the record at offset of view. Variable-size fields are memoryview slices of view, nothing is copied.
+        * @return the record, or None if view holds no complete, intact record at offset
+        """
+        if len(view) - offset < _HEADER.size:
+            return None
+        size, crc, lsn, prev_lsn, record_type = _HEADER.unpack_from(view, offset)
+        if size < _HEADER.size or len(view) - offset < size:
+            return None
+        if zlib.crc32(view[offset + _CRC_START : offset + size]) != crc:
+            return None
+        try:
+            record = cls(record_type, prev_lsn=prev_lsn)
+        except ValueError:
+            return None
+        record.lsn_ = lsn
+
+        cursor, end = offset + _HEADER.size, offset + size
+        if record_type == LogRecordType.PAGE_WRITE:
+            record.page_id_, record.offset_ = _PAGE_WRITE.unpack_from(view, cursor)
+            record.data_ = view[cursor + _PAGE_WRITE.size : end]
+        elif record_type == LogRecordType.NEW_PAGE:
+            (record.page_id_,) = _NEW_PAGE.unpack_from(view, cursor)
+        elif record_type in (LogRecordType.HASH_INSERT, LogRecordType.HASH_REMOVE):
+            record.page_id_, key_size = _HASH_ENTRY.unpack_from(view, cursor)
+            cursor += _HASH_ENTRY.size
+            record.key_ = view[cursor : cursor + key_size]
+            record.value_ = view[cursor + key_size : end]
+        elif record_type == LogRecordType.CHECKPOINT_DPT:
+            record.data_ = view[cursor:end]
+        elif record_type == LogRecordType.BLOOM_ADD:
+            record.page_id_, record.offset_, record.key_hash_ = _BLOOM_ADD.unpack_from(view, cursor)
+        return record
+
+    @staticmethod
+    def PeekSize(view: memoryview, offset=0) -> int:
+        """@return the size field of the record at offset, 0 if the header is incomplete"""
+        if len(view) - offset < 4:
+            return 0
+        return struct.unpack_from("<I", view, offset)[0]
+
+    def __str__(self) -> str:
+        return (
+            f"LogRecord[lsn: {self.lsn_}, prev_lsn: {self.prev_lsn_}, "
+            f"type: {self.log_record_type_.name}, page_id: {self.page_id_}]"
+        )
@@ -0,0 +1,209 @@
+from src.config import lsn_t, page_id_t, INVALID_LSN, INVALID_PAGE_ID, RECOVERY_REDO_WORKERS
+from src.buffer.BufferPoolManager import BufferPoolManager
+from src.storage.DiskManager import DiskManager
+from src.storage.Page.Page import Page
+from src.storage.Page.HashTableBucketPage import HashTableBucketPage
+from src.storage.Page.HashTableBloomFilterPage import HashTableBloomFilterPage
+from src.recovery.LogManager import LogManager
+from src.recovery.LogRecord import LogRecord, LogRecordType
+from src.recovery.LogIterator import LogIterator
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+ * LogRecovery replays the log at startup, ARIES style.
+ *
+ * Analysis scans the log once, builds the dirty page table (page id -> recLSN, the first record that may not be on
+ * disk yet) and groups the redo records by page id. If the master record names a complete checkpoint, the dirty page
+ * table starts from the one logged by that checkpoint and only grows with pages touched after its begin record;
+ * older records of pages that were clean at the checkpoint are skipped. The log itself has been truncated by the
+ * checkpoint, so the scan stays bounded. Redo then partitions the pages over a pool of workers by
+ * page_id % num_workers, so every page is owned by exactly one worker and its records are applied in log order
+ * without any coordination between workers. Each worker fetches its pages from the buffer pool in batches and skips
+ * every record whose LSN is at or below the page LSN, which makes redo idempotent across repeated crashes.
+ *
+ * The workers are threads: the pages live in the buffer pool of this process, which a process pool could not share.
+ * They overlap the reads of the pages missing from the pool, the disk I/O releases the GIL, but the records are
+ * applied in Python under the GIL, so redo of a log whose pages are cached does not get faster with more cores.
+ *
+ * There are no transactions yet, so there is no undo phase.
+"""
+
+
+def _RedoPageWrite(page: Page, log_record: LogRecord):
+    offset = log_record.offset_
+    page.getData()[offset : offset + len(log_record.data_)] = log_record.data_
+
+
+def _RedoNewPage(page: Page, log_record: LogRecord):
+    # whatever is on disk predates the allocation
+    page.ResetMemory()
+
+
+def _RedoHashInsert(page: Page, log_record: LogRecord):
+    # the bucket stores the serialized key and value, so no format is needed to replay them
+    HashTableBucketPage(page.getData(), None, None).Insert(
+        bytes(log_record.key_), bytes(log_record.value_)
+    )
+
+
+def _RedoHashRemove(page: Page, log_record: LogRecord):
+    HashTableBucketPage(page.getData(), None, None).Remove(
+        bytes(log_record.key_), bytes(log_record.value_)
+    )
+
+
+def _RedoBloomAdd(page: Page, log_record: LogRecord):
+    # the filter page knows its partition size and number of hashes
+    HashTableBloomFilterPage(page.getData()).Add(log_record.offset_, log_record.key_hash_)
+
+
+# log record type -> function(page, log_record) that reapplies the change to the page image
+REDO_HANDLERS = {
+    LogRecordType.PAGE_WRITE: _RedoPageWrite,
+    LogRecordType.NEW_PAGE: _RedoNewPage,
+    LogRecordType.HASH_INSERT: _RedoHashInsert,
+    LogRecordType.HASH_REMOVE: _RedoHashRemove,
+    LogRecordType.BLOOM_ADD: _RedoBloomAdd,
+}
+
+
+class LogRecovery:
+    def __init__(
+        self,
+        disk_manager: DiskManager,
+        buffer_pool_manager: BufferPoolManager,
+        log_manager: LogManager = None,
+        num_workers=None,
+    ) -> None:
+        """
+        * @param disk_manager the disk manager owning the log file
+        * @param buffer_pool_manager the buffer pool the pages are redone in
+        * @param log_manager if given, resumes lsn assignment after the last record found in the log
+        * @param num_workers number of redo threads, defaults to RECOVERY_REDO_WORKERS
+        """
+        self._disk_manager = disk_manager
+        self._bpm = buffer_pool_manager
+        self._log_manager = log_manager
+        self._num_workers = max(1, num_workers or RECOVERY_REDO_WORKERS)
+        # page id -> recLSN
+        self._dirty_page_table = {}
+        # page id -> redo records of that page in log order
+        self._redo_records = {}
+        self._max_lsn: lsn_t = INVALID_LSN
+        self._max_page_id: page_id_t = INVALID_PAGE_ID
+
+    def Analyze(self, start_offset=0):
+        """
+        * Analysis pass: scan the log from start_offset and build the dirty page table and the per-page redo lists.
+        * @return the dirty page table, page id -> recLSN
+        """
+        master_lsn = self._disk_manager.ReadMasterRecord()
+        # page id -> first lsn touching it, before and after the checkpoint begin record
+        first_lsn, first_lsn_after_checkpoint = {}, {}
+        checkpoint_dpt = {}
+        checkpoint_seen = in_checkpoint = False
+
+        iterator = LogIterator(self._disk_manager, start_offset)
+        for log_record in iterator:
+            lsn, record_type = log_record.lsn_, log_record.log_record_type_
+            self._max_lsn = max(self._max_lsn, lsn)
+            if record_type == LogRecordType.CHECKPOINT_BEGIN:
+                if lsn == master_lsn:
+                    checkpoint_seen = in_checkpoint = True
+                continue
+            if record_type == LogRecordType.CHECKPOINT_DPT:
+                if in_checkpoint:
+                    checkpoint_dpt.update(log_record.GetDirtyPages())
+                continue
+            if record_type == LogRecordType.CHECKPOINT_END:
+                in_checkpoint = False
+                continue
+            if record_type not in REDO_HANDLERS:
+                continue
+            page_id = log_record.page_id_
+            self._max_page_id = max(self._max_page_id, page_id)
+            first_lsn.setdefault(page_id, lsn)
+            if checkpoint_seen:
+                first_lsn_after_checkpoint.setdefault(page_id, lsn)
+            self._redo_records.setdefault(page_id, []).append(log_record)
+
+        if not checkpoint_seen:
+            self._dirty_page_table = first_lsn
+        else:
+            self._dirty_page_table = dict(first_lsn_after_checkpoint)
+            for page_id, rec_lsn in checkpoint_dpt.items():
+                if page_id in first_lsn:
+                    self._dirty_page_table[page_id] = min(
+                        rec_lsn, self._dirty_page_table.get(page_id, rec_lsn)
+                    )
+            self._redo_records = {
+                page_id: log_records
+                for page_id, log_records in self._redo_records.items()
+                if page_id in self._dirty_page_table
+            }
+        return self._dirty_page_table
+
+    def Redo(self) -> int:
+        """
+        * Run analysis, then redo every page, the page reads of the workers overlapping.
+        * @return the number of log records reapplied
+        """
+        self.Analyze()
+        if self._max_page_id != INVALID_PAGE_ID:
+            self._bpm.ReservePageIds(self._max_page_id)
+
+        partitions = [{} for _ in range(self._num_workers)]
+        for page_id, log_records in self._redo_records.items():
+            partitions[page_id % self._num_workers][page_id] = log_records
+
+        if self._num_workers == 1:
+            redone = self._RedoPartition(partitions[0])
+        else:
+            with ThreadPoolExecutor(self._num_workers) as pool:
+                redone = sum(pool.map(self._RedoPartition, partitions))
+
+        if self._log_manager is not None and self._max_lsn != INVALID_LSN:
+            self._log_manager.SetNextLSN(self._max_lsn + 1)
+        return redone
+
+    def _RedoPartition(self, partition) -> int:
+        """Redo the pages owned by one worker, fetching them from the buffer pool a batch at a time."""
+        page_ids = sorted(partition)
+        # leave room in the pool for the other workers
+        batch_size = max(1, self._bpm.GetPoolSize() // (2 * self._num_workers))
+        redone = 0
+        for start in range(0, len(page_ids), batch_size):
+            batch = page_ids[start : start + batch_size]
+            missed = []
+            for page_id, page in zip(batch, self._bpm.FetchPages(batch)):
+                if page is None:
+                    missed.append(page_id)
+                    continue
+                redone += self._RedoPage(page, partition[page_id])
+            for page_id in missed:
+                page = self._bpm.FetchPage(page_id)
+                if page is None:
+                    raise RuntimeError(
+                        f"no free frame to redo page {page_id}, the buffer pool is exhausted"
+                    )
+                redone += self._RedoPage(page, partition[page_id])
+        return redone
+
+    def _RedoPage(self, page: Page, log_records) -> int:
+        """Apply the records newer than the page LSN, then unpin the page."""
+        redone = 0
+        rec_lsn = self._dirty_page_table[page.getPageId()]
+        page.WLatch()
+        try:
+            page_lsn = page.GetLNS()
+            for log_record in log_records:
+                if log_record.lsn_ < rec_lsn or log_record.lsn_ <= page_lsn:
+                    continue
+                REDO_HANDLERS[log_record.log_record_type_](page, log_record)
+                page.SetLNS(log_record.lsn_)
+                page_lsn = log_record.lsn_
+                redone += 1
+        finally:
+            page.WUnLatch()
+        self._bpm.UnpinPage(page.getPageId(), redone > 0)
+        return redone
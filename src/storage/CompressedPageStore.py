@@ -0,0 +1,204 @@
+from src.config import page_id_t, size_type, PAGE_SIZE
+from src.storage.PageCodec import PageCodec, RAW_CODEC_ID
+import os
+import struct
+import threading
+
+"""
+ * CompressedPageStore keeps compressed page images in variable-size slots of the database file. A page id no longer
+ * maps to page_id * PAGE_SIZE; instead a page-to-extent map records where each page lives:
+ *
+ *  ------------------------------------------------------------------
+ * | PageId(4) | Offset(8) | Capacity(4) | Length(4) | CodecId(1)
+ *  ------------------------------------------------------------------
+ *
+ * The map is persisted in a sidecar ".map" file as an append-only sequence of these entries (the last entry for a
+ * page id wins) and is rewritten compactly on shutdown. A page is never overwritten in place: every write goes to a
+ * fresh extent and the map entry pointing at it is appended afterwards, so a crash in between leaves the map at the
+ * old, intact image. The extent the page moved out of is only released on the next Sync, once the new entry is
+ * durable, and then kept on a free list keyed by capacity and recycled by later writes. Extents are rounded up to
+ * SLOT_ALIGNMENT bytes so that they fit the pages of similar compressed size.
+"""
+
+# granularity of a slot in the data file
+SLOT_ALIGNMENT = 128
+
+_EXTENT_ENTRY = struct.Struct("<iQIIB")
+
+
+class CompressedPageStore:
+    def __init__(self, db_file, codec: PageCodec) -> None:
+        """
+        * Opens (or creates) a compressed page store over the specified database file.
+        * @param db_file the file name of the database file
+        * @param codec the codec used to compress newly written pages
+        """
+        n: size_type = db_file.rfind(".")
+        self.file_name = db_file
+        self.map_name_ = db_file[:n] + ".map"
+        self._codec = codec
+        self._latch = threading.Lock()
+        # page id -> (offset, capacity, length, codec id)
+        self._extents = {}
+        # capacity -> offsets of released extents
+        self._free_extents = {}
+        # (offset, capacity) of the extents moved out of since the last Sync, still referenced by the durable map
+        self._retired_extents = []
+
+        self._db_io = _open_rw(self.file_name)
+        self._map_io = _open_rw(self.map_name_)
+        self._file_end = self._db_io.seek(0, os.SEEK_END)
+        self._LoadExtentMap()
+        self._bytes_written_ = 0
+
+    def shutdown(self):
+        """* Compact the extent map and close the file resources."""
+        with self._latch:
+            self._db_io.flush()
+            self._RewriteExtentMap()
+            self._db_io.close()
+            self._map_io.close()
+
+    def GetNumPages(self):
+        """* @return one past the highest page id in the extent map"""
+        with self._latch:
+            return max(self._extents, default=-1) + 1
+
+    def Sync(self):
+        """* Force the data file and the extent map to stable storage."""
+        with self._latch:
+            for io in (self._db_io, self._map_io):
+                io.flush()
+                os.fsync(io.fileno())
+            for offset, capacity in self._retired_extents:
+                self._ReleaseExtent(offset, capacity)
+            self._retired_extents.clear()
+
+    def writePage(self, page_id: page_id_t, page_data):
+        """
+        * Compress a page and store it in a fresh slot large enough to hold it.
+        * @param page_id id of the page
+        * @param page_data raw page data
+        """
+        data = self._codec.compress(page_data)
+        codec_id = self._codec.codec_id
+        if len(data) >= PAGE_SIZE:
+            data, codec_id = bytes(page_data), RAW_CODEC_ID
+
+        with self._latch:
+            extent = self._extents.get(page_id)
+            capacity = _align(len(data))
+            offset = self._AllocateExtent(capacity)
+
+            self._db_io.seek(offset)
+            self._db_io.write(data)
+            self._db_io.flush()
+            self._bytes_written_ += len(data)
+
+            self._extents[page_id] = (offset, capacity, len(data), codec_id)
+            self._map_io.write(
+                _EXTENT_ENTRY.pack(page_id, offset, capacity, len(data), codec_id)
+            )
+            self._map_io.flush()
+
+            # the old slot can only be recycled once the map on disk no longer points at it
+            if extent is not None:
+                self._retired_extents.append((extent[0], extent[1]))
+
+    def readPage(self, page_id: page_id_t, page_data):
+        """
+        * Read and decompress a page into the frame buffer.
+        * @param page_id id of the page
+        * @param[out] page_data writable buffer of PAGE_SIZE bytes
+        """
+        with self._latch:
+            extent = self._extents.get(page_id)
+            if extent is None:
+                # never written, behaves like a read past the end of the file
+                page_data[:PAGE_SIZE] = bytes(PAGE_SIZE)
+                return
+            offset, _, length, codec_id = extent
+            self._db_io.seek(offset)
+            data = self._db_io.read(length)
+
+        if codec_id == RAW_CODEC_ID:
+            page_data[:PAGE_SIZE] = data
+        elif codec_id == self._codec.codec_id:
+            self._codec.decompress(data, page_data)
+        else:
+            raise ValueError(
+                f"page {page_id} was written with codec {codec_id}, "
+                f"store opened with codec {self._codec.codec_id}"
+            )
+
+    def GetStoredSize(self) -> size_type:
+        """@return the number of bytes the data file currently spans"""
+        return self._file_end
+
+    def GetBytesWritten(self) -> size_type:
+        """@return the number of page bytes written since the store was opened"""
+        return self._bytes_written_
+
+    def _AllocateExtent(self, capacity) -> size_type:
+        """Pick the smallest released extent that fits, otherwise grow the file. Caller holds the latch."""
+        fits = [c for c in self._free_extents if c >= capacity]
+        if not fits:
+            offset = self._file_end
+            self._file_end += capacity
+            return offset
+
+        found = min(fits)
+        offsets = self._free_extents[found]
+        offset = offsets.pop()
+        if not offsets:
+            del self._free_extents[found]
+        if found > capacity:
+            self._ReleaseExtent(offset + capacity, found - capacity)
+        return offset
+
+    def _ReleaseExtent(self, offset, capacity):
+        self._free_extents.setdefault(capacity, []).append(offset)
+
+    def _LoadExtentMap(self):
+        """Replay the persisted map and rebuild the free list from the gaps between live extents."""
+        self._map_io.seek(0)
+        raw = self._map_io.read()
+        usable = len(raw) - len(raw) % _EXTENT_ENTRY.size
+        for page_id, offset, capacity, length, codec_id in _EXTENT_ENTRY.iter_unpack(
+            raw[:usable]
+        ):
+            self._extents[page_id] = (offset, capacity, length, codec_id)
+        # drop a torn trailing entry so that later appends stay aligned
+        if usable != len(raw):
+            self._map_io.truncate(usable)
+        self._map_io.seek(0, os.SEEK_END)
+
+        cursor = 0
+        for offset, capacity, _, _ in sorted(self._extents.values()):
+            if offset > cursor:
+                self._ReleaseExtent(cursor, offset - cursor)
+            cursor = max(cursor, offset + capacity)
+        self._file_end = max(self._file_end, cursor)
+
+    def _RewriteExtentMap(self):
+        """Replace the append-only map with one entry per page. Caller holds the latch."""
+        tmp_name = self.map_name_ + ".tmp"
+        with open(tmp_name, "wb") as tmp:
+            for page_id, (offset, capacity, length, codec_id) in self._extents.items():
+                tmp.write(
+                    _EXTENT_ENTRY.pack(page_id, offset, capacity, length, codec_id)
+                )
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self._map_io.close()
+        os.replace(tmp_name, self.map_name_)
+
+
+def _align(size) -> size_type:
+    return (size + SLOT_ALIGNMENT - 1) // SLOT_ALIGNMENT * SLOT_ALIGNMENT
+
+
+def _open_rw(file_name):
+    """Open a file for positioned reads and writes, creating it if needed."""
+    fd = os.open(file_name, os.O_RDWR | os.O_CREAT, 0o644)
+    return os.fdopen(fd, "r+b")
@@ -1,4 +1,8 @@
-from src.config import page_id_t, size_type, PAGE_SIZE
+from src.config import page_id_t, size_type, lsn_t, PAGE_SIZE, INVALID_LSN, LOG_READ_CHUNK_SIZE
+from src.storage.PageCodec import PageCodec
+from src.storage.CompressedPageStore import CompressedPageStore
+import os
+import struct
 import threading
 
 """
@@ -8,10 +12,11 @@ import threading
 
 
 class DiskManager:
-    def __init__(self, db_file) -> None:
+    def __init__(self, db_file, codec: PageCodec = None) -> None:
         """
         * Creates a new disk manager that writes to the specified database file.
         * @param db_file the file name of the database file to write to
+        * @param codec optional page codec; when set, pages are stored compressed in variable-size slots
         """
         self.file_name = db_file
         n: size_type = db_file.rfind(".")
@@ -19,27 +24,66 @@ class DiskManager:
             raise ValueError("wrong file format")
 
         self.log_name_ = self.file_name[:n] + ".log"
+        # holds the lsn of the last complete checkpoint
+        self.master_name_ = self.file_name[:n] + ".ckpt"
         self._db_io_lock = threading.Lock()
         self._log_io_lock = threading.Lock()
 
         # Open or create the log file
         self._log_io = open(self.log_name_, "a+b")
-        self._db_io = open(self.file_name, "a+b")
+        self._OpenDatabase(codec)
         self._buffer_used = None
         self._num_writes_ = 1
         self._num_flushes_ = 0
         self._flush_log_ = False
 
+    def _OpenDatabase(self, codec: PageCodec):
+        """Open or create the file resources that hold the pages."""
+        # The compressed store owns the database file when compression is enabled
+        self._page_store = CompressedPageStore(self.file_name, codec) if codec else None
+        # "a+b" would force every write to the end of the file, pages are written in place
+        self._db_io = None
+        if self._page_store is None:
+            fd = os.open(self.file_name, os.O_RDWR | os.O_CREAT, 0o644)
+            self._db_io = os.fdopen(fd, "r+b")
+
+    def _CloseDatabase(self):
+        """Close the file resources that hold the pages."""
+        if self._page_store is not None:
+            self._page_store.shutdown()
+        else:
+            with self._db_io_lock:
+                self._db_io.close()
+
+    def Sync(self):
+        """
+        * Force the pages written so far to stable storage.
+        """
+        if self._page_store is not None:
+            self._page_store.Sync()
+            return
+        with self._db_io_lock:
+            self._db_io.flush()
+            os.fsync(self._db_io.fileno())
+
     def shutdown(self):
         """
         * Shut down the disk manager and close all the file resources.
         """
-        with self._db_io_lock:
-            self._db_io.close()
+        self._CloseDatabase()
 
         with self._log_io_lock:
             self._log_io.close()
 
+    def GetNumPages(self) -> size_type:
+        """
+        * @return one past the highest page id stored in the database, 0 for a new database
+        """
+        if self._page_store is not None:
+            return self._page_store.GetNumPages()
+        with self._db_io_lock:
+            return -(-self._db_io.seek(0, os.SEEK_END) // PAGE_SIZE)
+
     def writePage(self, page_id: page_id_t, page_data: str):
         """
         * Write a page to the database file.
@@ -49,6 +93,11 @@ class DiskManager:
         if len(page_data) != PAGE_SIZE:
             raise ValueError(f"Data must be exactly {PAGE_SIZE} bytes")
 
+        if self._page_store is not None:
+            self._num_writes_ += 1
+            self._page_store.writePage(page_id, page_data)
+            return
+
         with self._db_io_lock:
             offset: size_type = page_id * PAGE_SIZE
             self._num_writes_ += 1
@@ -56,31 +105,41 @@ class DiskManager:
             self._db_io.write(page_data)
             self._db_io.flush()
 
-    def readPage(self, page_id: page_id_t, page_data: str):
+    def readPage(self, page_id: page_id_t, page_data):
         """
         * Read a page from the database file.
         * @param page_id id of the page
-        * @param[out] page_data output buffer
+        * @param[out] page_data output buffer; a writable buffer (e.g. a frame's bytearray) is filled in place
+        * @return the page data
         """
+        if not isinstance(page_data, (bytearray, memoryview)):
+            page_data = bytearray(PAGE_SIZE)
+
+        if self._page_store is not None:
+            self._page_store.readPage(page_id, page_data)
+            return page_data
+
         with self._db_io_lock:
             offset: size_type = page_id * PAGE_SIZE
             self._db_io.seek(offset)
-            data = self._db_io.read(PAGE_SIZE)
+            read = self._db_io.readinto(memoryview(page_data)[:PAGE_SIZE])
             # Pad with zeros if read is short, if file ends before reading PAGE_SIZE
-            if len(data) < PAGE_SIZE:
-                data += bytes(PAGE_SIZE - len(data))
+            if read < PAGE_SIZE:
+                page_data[read:PAGE_SIZE] = bytes(PAGE_SIZE - read)
 
-            return data
+            return page_data
 
     def writeLog(self, log_data, size):
         """
-        * Flush the entire log buffer into disk.
+        * Flush the entire log buffer into disk. The write and the fsync are issued once per call, so every record in
+        * the buffer becomes durable together.
         * @param log_data raw log data
         * @param size size of log entry
         """
-        if log_data == self._buffer_used:
+        # the log manager alternates between two buffers, getting the same one twice in a row is a bug
+        if log_data is self._buffer_used:
             raise AssertionError("log_data should not be the same as buffer_used")
-        self.buffer_used = log_data
+        self._buffer_used = log_data
 
         # no effect on num_flushes_ if log buffer is empty
         if not size:
@@ -88,7 +147,7 @@ class DiskManager:
         self._num_flushes_ += 1
         self._flush_log_ = True
         with self._log_io_lock:
-            self._log_io.write(log_data[:size])
+            self._log_io.write(memoryview(log_data)[:size])
             # Check for I/O error
             if self._log_io.closed:
                 print("I/O error while writing log")
@@ -96,33 +155,100 @@ class DiskManager:
 
             # Flush to keep disk file in sync
             self._log_io.flush()
+            os.fsync(self._log_io.fileno())
 
         self._flush_log_ = False
 
     def readLog(self, log_data, size, offset):
         """
         * Read a log entry from the log file.
-        * @param[out] log_data output buffer
+        * @param[out] log_data writable output buffer, filled in place
         * @param size size of the log entry
         * @param offset offset of the log entry in the file
         * @return true if the read was successful, false otherwise
         """
         with self._log_io_lock:
             self._log_io.seek(offset)
-            log_data = self._log_io.read(size)
-            return len(log_data) == size
+            read = self._log_io.readinto(memoryview(log_data)[:size])
+            return read == size
+
+    def GetLogSize(self) -> size_type:
+        """@return the size of the log file in bytes"""
+        with self._log_io_lock:
+            self._log_io.flush()
+            return os.fstat(self._log_io.fileno()).st_size
+
+    def TruncateLog(self, offset):
+        """
+        * Drop the first offset bytes of the log file. The remaining tail is copied into a fresh file which atomically
+        * replaces the log, so a crash leaves either the old or the truncated log behind. The tail written so far is
+        * copied and synced without the log latch, writeLog only waits for the records appended meanwhile to be copied
+        * and for the swap. Calls must not overlap, LogManager.TruncateLog serializes them.
+        * @param offset file offset of the first byte to keep
+        """
+        tmp_name = self.log_name_ + ".tmp"
+        with self._log_io_lock:
+            self._log_io.flush()
+            log_fd = self._log_io.fileno()
+            end = os.fstat(log_fd).st_size
+        with open(tmp_name, "wb") as tmp:
+            # the log is append-only, the bytes before end do not change
+            _CopyRange(log_fd, tmp, offset, end)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+            with self._log_io_lock:
+                self._log_io.flush()
+                _CopyRange(log_fd, tmp, end, os.fstat(log_fd).st_size)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+                self._log_io.close()
+                os.replace(tmp_name, self.log_name_)
+                self._log_io = open(self.log_name_, "a+b")
+
+    def WriteMasterRecord(self, lsn: lsn_t):
+        """
+        * Durably record the lsn of the last complete checkpoint.
+        * @param lsn lsn of the checkpoint begin record
+        """
+        tmp_name = self.master_name_ + ".tmp"
+        with open(tmp_name, "wb") as tmp:
+            tmp.write(struct.pack("<i", lsn))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_name, self.master_name_)
+
+    def ReadMasterRecord(self) -> lsn_t:
+        """@return the lsn of the last complete checkpoint, INVALID_LSN if there is none"""
+        try:
+            with open(self.master_name_, "rb") as master:
+                data = master.read(4)
+        except FileNotFoundError:
+            return INVALID_LSN
+        if len(data) != 4:
+            return INVALID_LSN
+        return struct.unpack("<i", data)[0]
 
     def getNumFlashes(self):
         """@return the number of disk flushes"""
-        self._num_flushes_
+        return self._num_flushes_
 
     def getFlashesState(self):
         """@return true iff the in-memory content has not been flushed yet"""
-        self._flush_log_
+        return self._flush_log_
 
     def getNumWrites(self):
         """@return the number of disk writes"""
-        self._num_writes_
+        return self._num_writes_
+
+
+def _CopyRange(fd, out, start, end):
+    """Copy the bytes [start, end) of the file fd to the file object out, a chunk at a time."""
+    while start < end:
+        chunk = os.pread(fd, min(LOG_READ_CHUNK_SIZE, end - start), start)
+        if not chunk:
+            break
+        out.write(chunk)
+        start += len(chunk)
 
 
 # disk_manager = DiskManager("database.db")
@@ -0,0 +1,436 @@
+from src.config import (
+    page_id_t,
+    size_type,
+    PAGE_SIZE,
+    LOG_STRUCTURED_SEGMENT_SIZE,
+    LOG_STRUCTURED_WRITE_BATCH,
+    LOG_STRUCTURED_GC_THRESHOLD,
+    LOG_STRUCTURED_GC_INTERVAL,
+)
+from src.storage.DiskManager import DiskManager
+import os
+import re
+import struct
+import threading
+import zlib
+
+"""
+ * LogStructuredDiskManager never overwrites a page in place: every page write is appended to the active segment of
+ * a page log, so random page updates turn into sequential writes. A page write is handed to the OS before writePage
+ * returns, like an in-place write; the compactor appends the records it moves LOG_STRUCTURED_WRITE_BATCH at a time.
+ * A page-id-to-location map finds the current record of every page.
+ *
+ * The mode trades space and write volume for sequentiality, it is not a throughput mode: the log takes up to
+ * 1 / (1 - gc_threshold) times the space of the live pages, and the compactor rewrites the live records it moves.
+ * It pays off on devices where random writes cost much more than sequential ones. Where writes land in the page
+ * cache, benchmarks/random_page_writes.py measures in-place writes as faster, see LOG_STRUCTURED_GC_THRESHOLD.
+ *
+ * Segment n of the log is the file "<db name>.<n>.lseg" next to db_file, a sequence of fixed-size records:
+ *  ----------------------------------------------
+ * | PageId (4) | Checksum (4) | PageData (4096) |
+ *  ----------------------------------------------
+ *
+ * The map is checkpointed to "<db name>.lmap" when the store is synced or shut down:
+ *  -------------------------------------------------------------------------------
+ * | Magic (4) | TailSegment (4) | TailSlot (4) | Entry(0) | ... | Entry(n-1) |
+ *  -------------------------------------------------------------------------------
+ * where an entry is | PageId (4) | Segment (4) | Slot (4) |. On open the map is loaded and the records appended
+ * after the tail position are replayed in log order, so a crash only costs a replay of the log since the last sync.
+ * A torn record at the end of the log fails its checksum and is dropped.
+ *
+ * Rewriting a page leaves its previous record stale. The compactor reclaims sealed segments whose live fraction has
+ * fallen to gc_threshold: it appends their live records again, syncs the store, then deletes the segment files. It
+ * runs on demand (Compact) or in a background thread (RunCompactionThread).
+"""
+
+_RECORD_HEADER = struct.Struct("<iI")
+RECORD_SIZE = _RECORD_HEADER.size + PAGE_SIZE
+
+_MAP_MAGIC = 0x4C534D50
+_MAP_HEADER = struct.Struct("<Iii")
+_MAP_ENTRY = struct.Struct("<iii")
+
+# number of records read at once when the log is replayed or a segment is compacted
+_READ_CHUNK_RECORDS = 64
+
+# upper bound of write_batch, a flush hands pwritev two buffers per record and Linux takes at most 1024
+_MAX_WRITE_BATCH = 512
+
+
+class LogStructuredPageStore:
+    def __init__(
+        self,
+        db_file,
+        segment_size=LOG_STRUCTURED_SEGMENT_SIZE,
+        gc_threshold=LOG_STRUCTURED_GC_THRESHOLD,
+        write_batch=LOG_STRUCTURED_WRITE_BATCH,
+    ) -> None:
+        """
+        * Opens (or creates) the page log of a database, replaying the records appended since the last map checkpoint.
+        * @param db_file the file name of the database; names the segments and the map
+        * @param segment_size size of a segment file in bytes, at least one record
+        * @param gc_threshold fraction of live records at or below which a sealed segment is reclaimed
+        * @param write_batch number of records the compactor buffers before they are appended together
+        """
+        self._records_per_segment = segment_size // RECORD_SIZE
+        if self._records_per_segment < 1:
+            raise ValueError(f"segment size must hold at least one record of {RECORD_SIZE} bytes")
+        self._gc_threshold = gc_threshold
+        self._write_batch = max(1, min(write_batch, _MAX_WRITE_BATCH))
+        self._directory = os.path.dirname(db_file) or "."
+        name = os.path.basename(db_file)
+        self._stem = name[: name.rfind(".")]
+        self.map_name_ = os.path.join(self._directory, self._stem + ".lmap")
+        self._latch = threading.Lock()
+        # page id -> (segment, slot) of its current record
+        self._locations = {}
+        # segment -> number of current records in it
+        self._live = {}
+        # segment -> file descriptor
+        self._segments = {}
+        # segments written to since the last sync
+        self._unsynced = set()
+        # header and data of the records of the active segment not appended yet, from slot _buffer_slot on
+        self._buffer = []
+        self._buffer_slot = 0
+        self._stats_ = dict.fromkeys(
+            ("appended_records", "compacted_segments", "moved_records"), 0
+        )
+        # one compaction at a time, whether from the thread or an explicit call
+        self._compaction_latch = threading.Lock()
+        self._stop = threading.Event()
+        self._compaction_thread = None
+
+        segment_nos = self._ListSegments()
+        for segment_no in segment_nos:
+            self._segments[segment_no] = _OpenSegment(self.GetSegmentFileName(segment_no))
+        tail = self._LoadMap()
+        self._active = segment_nos[-1] if segment_nos else 0
+        self._active_slots = self._Replay(segment_nos, tail)
+        if not segment_nos:
+            self._segments[0] = _OpenSegment(self.GetSegmentFileName(0))
+        self._buffer_slot = self._active_slots
+        for segment_no, _ in self._locations.values():
+            self._live[segment_no] = self._live.get(segment_no, 0) + 1
+
+    def shutdown(self):
+        """* Stop the compaction thread, sync the store and close the segment files."""
+        self.StopCompactionThread()
+        with self._latch:
+            self._SyncLocked()
+            for fd in self._segments.values():
+                os.close(fd)
+            self._segments = {}
+
+    def Sync(self):
+        """* Force the appended records to stable storage and checkpoint the map."""
+        with self._latch:
+            self._SyncLocked()
+
+    def GetNumPages(self):
+        """* @return one past the highest page id in the map"""
+        with self._latch:
+            return max(self._locations, default=-1) + 1
+
+    def writePage(self, page_id: page_id_t, page_data):
+        """
+        * Append a page record to the log, the previous record of the page becomes stale.
+        * @param page_id id of the page
+        * @param page_data raw page data
+        """
+        with self._latch:
+            self._AppendLocked(page_id, page_data, _Checksum(page_data))
+            # hand the record to the OS right away, as an in-place write does: the buffer pool writes a page back
+            # on a flush or an eviction, and a crash of the process must not lose it
+            self._FlushLocked()
+            self._stats_["appended_records"] += 1
+
+    def readPage(self, page_id: page_id_t, page_data):
+        """
+        * Read the current record of a page into the frame buffer.
+        * @param page_id id of the page
+        * @param[out] page_data writable buffer of PAGE_SIZE bytes
+        """
+        with self._latch:
+            location = self._locations.get(page_id)
+            if location is None:
+                # never written, behaves like a read past the end of the file
+                page_data[:PAGE_SIZE] = bytes(PAGE_SIZE)
+                return
+            record = self._ReadRecordLocked(*location)
+        stored_page_id, checksum = _RECORD_HEADER.unpack_from(record)
+        data = memoryview(record)[_RECORD_HEADER.size :]
+        if stored_page_id != page_id or checksum != _Checksum(data):
+            raise RuntimeError(f"the record of page {page_id} at {location} in the page log is corrupt")
+        page_data[:PAGE_SIZE] = data
+
+    def Compact(self, max_segments=None) -> int:
+        """
+        * Reclaim the sealed segments whose live fraction is at or below gc_threshold, emptiest first. A segment is
+        * read sequentially without the latch, sealed segments never change, and its live records are appended to
+        * the log again a chunk at a time; the segment files are deleted once the store is synced with the map
+        * pointing at the copies.
+        * @param max_segments maximum number of segments to reclaim, None for all
+        * @return the number of segments reclaimed
+        """
+        with self._compaction_latch:
+            with self._latch:
+                candidates = sorted(
+                    (self._live.get(segment_no, 0), segment_no)
+                    for segment_no in self._segments
+                    if segment_no != self._active
+                    and self._live.get(segment_no, 0) <= self._gc_threshold * self._records_per_segment
+                )
+            candidates = [segment_no for _, segment_no in candidates[:max_segments]]
+            if not candidates:
+                return 0  # an idle store is neither synced nor has its map rewritten
+            for segment_no in candidates:
+                self._MoveLiveRecords(segment_no)
+
+            with self._latch:
+                # the map must point at the copies on disk before the segments go
+                self._SyncLocked()
+                for segment_no in candidates:
+                    self._live.pop(segment_no, None)
+                    os.close(self._segments.pop(segment_no))
+                    os.remove(self.GetSegmentFileName(segment_no))
+                self._stats_["compacted_segments"] += len(candidates)
+                return len(candidates)
+
+    def _MoveLiveRecords(self, segment_no):
+        """Append the records of a sealed segment that are still current to the log again."""
+        fd = self._segments[segment_no]
+        for first_slot in range(0, self._records_per_segment, _READ_CHUNK_RECORDS):
+            if not self._live.get(segment_no):
+                return
+            chunk = os.pread(fd, _READ_CHUNK_RECORDS * RECORD_SIZE, first_slot * RECORD_SIZE)
+            with self._latch:
+                for offset in range(0, len(chunk) - RECORD_SIZE + 1, RECORD_SIZE):
+                    page_id, checksum = _RECORD_HEADER.unpack_from(chunk, offset)
+                    # a write since the segment was picked may have made the record stale
+                    if self._locations.get(page_id) != (segment_no, first_slot + offset // RECORD_SIZE):
+                        continue
+                    data = memoryview(chunk)[offset + _RECORD_HEADER.size : offset + RECORD_SIZE]
+                    self._AppendLocked(page_id, data, checksum)
+                    self._stats_["moved_records"] += 1
+
+    def RunCompactionThread(self, interval=LOG_STRUCTURED_GC_INTERVAL):
+        """* Start reclaiming segments every interval seconds in the background."""
+        if self._compaction_thread is not None:
+            return
+        self._stop.clear()
+        self._compaction_thread = threading.Thread(
+            target=self._CompactionLoop, args=(interval,), name="page-log-compaction", daemon=True
+        )
+        self._compaction_thread.start()
+
+    def StopCompactionThread(self):
+        """* Stop the background compaction thread."""
+        if self._compaction_thread is None:
+            return
+        self._stop.set()
+        self._compaction_thread.join()
+        self._compaction_thread = None
+
+    def GetStats(self) -> dict:
+        """
+        * @return the number of segments, of live pages and of stale records in the log, and the number of records
+        *         appended by writes, of segments reclaimed and of records moved by the compactor since the store was
+        *         opened
+        """
+        with self._latch:
+            records = sum(
+                self._active_slots if segment_no == self._active else self._records_per_segment
+                for segment_no in self._segments
+            )
+            return dict(
+                self._stats_,
+                segments=len(self._segments),
+                live_pages=len(self._locations),
+                stale_records=records - len(self._locations),
+            )
+
+    def GetStoredSize(self) -> size_type:
+        """@return the number of bytes the segment files currently span"""
+        with self._latch:
+            return (len(self._segments) - 1) * self._records_per_segment * RECORD_SIZE + (
+                self._active_slots * RECORD_SIZE
+            )
+
+    def GetSegmentFileName(self, segment_no) -> str:
+        """@return the path of the file of segment segment_no"""
+        return os.path.join(self._directory, f"{self._stem}.{segment_no}.lseg")
+
+    def _AppendLocked(self, page_id: page_id_t, page_data, checksum):
+        """
+        Buffer a record at the end of the active segment and point the map at it. The buffer references page_data, which
+        must not change until the record is flushed. Caller holds the latch.
+        """
+        if self._active_slots == self._records_per_segment:
+            self._FlushLocked()
+            self._active += 1
+            self._segments[self._active] = _OpenSegment(self.GetSegmentFileName(self._active))
+            self._active_slots = self._buffer_slot = 0
+        self._buffer.append(_RECORD_HEADER.pack(page_id, checksum))
+        self._buffer.append(page_data)
+
+        previous = self._locations.get(page_id)
+        if previous is not None:
+            self._live[previous[0]] -= 1
+        self._locations[page_id] = (self._active, self._active_slots)
+        self._live[self._active] = self._live.get(self._active, 0) + 1
+        self._active_slots += 1
+        if self._active_slots - self._buffer_slot >= self._write_batch:
+            self._FlushLocked()
+
+    def _FlushLocked(self):
+        """Append the buffered records to the active segment with one write. Caller holds the latch."""
+        if not self._buffer:
+            return
+        os.pwritev(self._segments[self._active], self._buffer, self._buffer_slot * RECORD_SIZE)
+        self._unsynced.add(self._active)
+        self._buffer.clear()
+        self._buffer_slot = self._active_slots
+
+    def _ReadRecordLocked(self, segment_no, slot) -> bytes:
+        """@return the record at slot of segment_no, possibly still buffered. Caller holds the latch."""
+        if segment_no == self._active and slot >= self._buffer_slot:
+            index = 2 * (slot - self._buffer_slot)
+            return b"".join(self._buffer[index : index + 2])
+        return os.pread(self._segments[segment_no], RECORD_SIZE, slot * RECORD_SIZE)
+
+    def _SyncLocked(self):
+        """Flush the buffer, fsync the segments written since the last sync and checkpoint the map."""
+        self._FlushLocked()
+        for segment_no in self._unsynced:
+            fd = self._segments.get(segment_no)
+            if fd is not None:
+                os.fsync(fd)
+        self._unsynced.clear()
+        self._WriteMapLocked()
+
+    def _WriteMapLocked(self):
+        """Replace the map file with the current map, the records after the active slot are replayed on open."""
+        tmp_name = self.map_name_ + ".tmp"
+        entries = bytearray(_MAP_HEADER.pack(_MAP_MAGIC, self._active, self._active_slots))
+        for page_id, (segment_no, slot) in self._locations.items():
+            entries += _MAP_ENTRY.pack(page_id, segment_no, slot)
+        with open(tmp_name, "wb") as tmp:
+            tmp.write(entries)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_name, self.map_name_)
+
+    def _LoadMap(self):
+        """
+        * Load the map checkpoint.
+        * @return the (segment, slot) position the replay starts at, (0, 0) without a checkpoint
+        """
+        try:
+            with open(self.map_name_, "rb") as map_io:
+                raw = map_io.read()
+        except FileNotFoundError:
+            return 0, 0
+        if len(raw) < _MAP_HEADER.size:
+            return 0, 0
+        magic, tail_segment, tail_slot = _MAP_HEADER.unpack_from(raw)
+        if magic != _MAP_MAGIC:
+            raise RuntimeError(f"{self.map_name_} is not the map of a log-structured page store")
+        for page_id, segment_no, slot in _MAP_ENTRY.iter_unpack(memoryview(raw)[_MAP_HEADER.size :]):
+            self._locations[page_id] = (segment_no, slot)
+        return tail_segment, tail_slot
+
+    def _Replay(self, segment_nos, tail) -> int:
+        """
+        * Point the map at the valid records appended from the tail position on, in log order. The first invalid
+        * record of the last segment, torn by a crash, and everything after it are truncated.
+        * @return the number of records in the last segment
+        """
+        tail_segment, tail_slot = tail
+        slots = 0
+        for segment_no in segment_nos:
+            if segment_no < tail_segment:
+                continue
+            fd = self._segments[segment_no]
+            slot = tail_slot if segment_no == tail_segment else 0
+            while True:
+                chunk = os.pread(fd, _READ_CHUNK_RECORDS * RECORD_SIZE, slot * RECORD_SIZE)
+                valid = 0
+                for offset in range(0, len(chunk) - RECORD_SIZE + 1, RECORD_SIZE):
+                    page_id, checksum = _RECORD_HEADER.unpack_from(chunk, offset)
+                    data = memoryview(chunk)[offset + _RECORD_HEADER.size : offset + RECORD_SIZE]
+                    if checksum != _Checksum(data):
+                        break
+                    self._locations[page_id] = (segment_no, slot + valid)
+                    valid += 1
+                slot += valid
+                if valid < _READ_CHUNK_RECORDS:
+                    break
+            if segment_no == segment_nos[-1]:
+                os.ftruncate(fd, slot * RECORD_SIZE)
+                slots = slot
+        return slots
+
+    def _ListSegments(self):
+        """@return the sorted numbers of the segments present on disk"""
+        pattern = re.compile(re.escape(self._stem) + r"\.(\d+)\.lseg$")
+        found = []
+        for name in os.listdir(self._directory):
+            match = pattern.match(name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def _CompactionLoop(self, interval):
+        while not self._stop.wait(interval):
+            self.Compact()
+
+
+class LogStructuredDiskManager(DiskManager):
+    def __init__(
+        self,
+        db_file,
+        segment_size=LOG_STRUCTURED_SEGMENT_SIZE,
+        gc_threshold=LOG_STRUCTURED_GC_THRESHOLD,
+    ) -> None:
+        """
+        * Creates a new disk manager that appends pages to a page log, see LogStructuredPageStore.
+        * @param db_file the file name of the database; names the segments, the map and the log file
+        * @param segment_size size of a segment file of the page log in bytes
+        * @param gc_threshold fraction of live records at or below which the compactor reclaims a sealed segment
+        """
+        self._segment_size = segment_size
+        self._gc_threshold = gc_threshold
+        super().__init__(db_file)
+
+    def _OpenDatabase(self, codec):
+        """The page log owns the pages, db_file itself is never created."""
+        if codec is not None:
+            raise ValueError("compression is not supported in log-structured storage mode")
+        self._page_store = LogStructuredPageStore(self.file_name, self._segment_size, self._gc_threshold)
+        self._db_io = None
+
+    def Compact(self, max_segments=None) -> int:
+        """* Reclaim mostly stale segments of the page log, see LogStructuredPageStore.Compact."""
+        return self._page_store.Compact(max_segments)
+
+    def RunCompactionThread(self, interval=LOG_STRUCTURED_GC_INTERVAL):
+        """* Start reclaiming segments of the page log every interval seconds in the background."""
+        self._page_store.RunCompactionThread(interval)
+
+    def StopCompactionThread(self):
+        """* Stop the background compaction thread."""
+        self._page_store.StopCompactionThread()
+
+    def GetStats(self) -> dict:
+        """* @return the counters of the page log, see LogStructuredPageStore.GetStats"""
+        return self._page_store.GetStats()
+
+
+def _Checksum(page_data) -> int:
+    return zlib.crc32(page_data)
+
+
+def _OpenSegment(file_name):
+    """@return a file descriptor open for positioned reads and writes, the file is created if needed"""
+    return os.open(file_name, os.O_RDWR | os.O_CREAT, 0o644)
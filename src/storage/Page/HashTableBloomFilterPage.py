@@ -0,0 +1,115 @@
+from src.config import PAGE_SIZE, PAGE_HEADER_SIZE
+import math
+import struct
+
+"""
+ * Bloom filter page for the extendible hash table.
+ *
+ * A directory partitions its Bloom filter by bucket: the partition of a bucket is numbered by the hash bits up to its
+ * local depth, the index of its first directory slot, so a split or merge rebuilds the partitions of the buckets
+ * involved. The partitions are packed into filter pages, several per page; a page describes its own partition size
+ * and number of hash functions, which lets recovery replay additions without knowing the table.
+ *
+ * Filter page format (size in byte):
+ *  --------------------------------------------------------------------------------------------
+ * | PageHeader (8) | PartitionSize (2) | NumHashes (2) | Partition(0) | ... | Partition(n - 1) |
+ *  --------------------------------------------------------------------------------------------
+ *
+ * The k bit positions of a key are derived from a 64-bit hash of it by double hashing, h1 + i * h2.
+"""
+
+_METADATA = struct.Struct("<HH")
+_METADATA_OFFSET = PAGE_HEADER_SIZE
+_PARTITIONS_OFFSET = _METADATA_OFFSET + _METADATA.size
+
+
+def FilterParameters(expected_keys, false_positive_rate):
+    """
+    * Size a Bloom filter partition.
+    * @param expected_keys number of keys the partition is expected to hold
+    * @param false_positive_rate target false positive rate at expected_keys, in (0, 1)
+    * @return the partition size in byte and the number of hash functions
+    """
+    if not 0 < false_positive_rate < 1:
+        raise ValueError(f"false positive rate must be in (0, 1), got {false_positive_rate}")
+    expected_keys = max(1, expected_keys)
+    bits = math.ceil(-expected_keys * math.log(false_positive_rate) / math.log(2) ** 2)
+    num_hashes = max(1, round(bits / expected_keys * math.log(2)))
+    return (bits + 7) // 8, num_hashes
+
+
+class HashTableBloomFilterPage:
+    def __init__(self, data) -> None:
+        """
+        * Lay a filter page over the data of a page.
+        * @param data the page data, e.g. Page.getData()
+        """
+        self._data = memoryview(data)
+        self._partition_size, self._num_hashes = _METADATA.unpack_from(self._data, _METADATA_OFFSET)
+
+    @staticmethod
+    def PartitionsPerPage(partition_size) -> int:
+        """* @return how many partitions of partition_size bytes a filter page holds"""
+        return (PAGE_SIZE - _PARTITIONS_OFFSET) // partition_size
+
+    def Init(self, partition_size, num_hashes):
+        """**
+        * Initialize a new filter page with empty partitions.
+        * @param partition_size size of a partition in byte
+        * @param num_hashes number of bit positions per key
+        *"""
+        _METADATA.pack_into(self._data, _METADATA_OFFSET, partition_size, num_hashes)
+        self._partition_size, self._num_hashes = partition_size, num_hashes
+        self._data[_PARTITIONS_OFFSET:] = bytes(PAGE_SIZE - _PARTITIONS_OFFSET)
+
+    def Add(self, partition, key_hash) -> bool:
+        """**
+        * Add a key to a partition.
+        * @param partition index of the partition in the page
+        * @param key_hash 64-bit hash of the key
+        * @return whether a bit changed, i.e. the partition did not report the key as present before
+        *"""
+        data, changed = self._data, False
+        for byte, mask in self._Positions(partition, key_hash):
+            if not data[byte] & mask:
+                data[byte] |= mask
+                changed = True
+        return changed
+
+    def MayContain(self, partition, key_hash) -> bool:
+        """**
+        * @param partition index of the partition in the page
+        * @param key_hash 64-bit hash of the key
+        * @return false if the key was never added to the partition, true if it may have been
+        *"""
+        data = self._data
+        for byte, mask in self._Positions(partition, key_hash):
+            if not data[byte] & mask:
+                return False
+        return True
+
+    def Clear(self, partition):
+        """* Remove every key from a partition"""
+        start = _PARTITIONS_OFFSET + partition * self._partition_size
+        self._data[start : start + self._partition_size] = bytes(self._partition_size)
+
+    def GetPartitionSize(self) -> int:
+        return self._partition_size
+
+    def GetNumHashes(self) -> int:
+        return self._num_hashes
+
+    def _Positions(self, partition, key_hash):
+        """@return (byte offset in the page, bit mask) of every bit of a key in a partition"""
+        base = _PARTITIONS_OFFSET + partition * self._partition_size
+        num_bits = self._partition_size * 8
+        h1, h2 = key_hash & 0xFFFFFFFF, (key_hash >> 32) | 1
+        for i in range(self._num_hashes):
+            bit = (h1 + i * h2) % num_bits
+            yield base + (bit >> 3), 1 << (bit & 7)
+
+    def __str__(self) -> str:
+        return (
+            f"This Bloom filter page holds {self.PartitionsPerPage(self._partition_size)} partitions "
+            f"of {self._partition_size} bytes "
+        )
@@ -1,90 +1,229 @@
-from src.hash_table_page_defs import BUCKET_ARRAY_SIZE
+from src.hash_table_page_defs import (
+    KEY_FORMAT,
+    VALUE_FORMAT,
+    HTABLE_BUCKET_PAGE_METADATA_SIZE,
+    FINGERPRINT_SIZE,
+    BucketArraySize,
+)
 from typing import List, Callable
-from src.config import KeyType, ValueType, INVALID_PAGE_ID
-from src.storage.Page import Page
+from src.config import KeyType, ValueType, PAGE_HEADER_SIZE, INVALID_PAGE_ID, page_id_t
+import struct
+import sys
+import zlib
 
 """
 * Store indexed key and and value together within bucket page. Supports
  * non-unique keys.
  *
- * Bucket page format (keys are stored in order):
- *  ----------------------------------------------------------------
- * | KEY(1) + VALUE(1) | KEY(2) + VALUE(2) | ... | KEY(n) + VALUE(n)
- *  ----------------------------------------------------------------
+ * The bucket page is a typed view over the page's data, so a bucket is exactly one page in the buffer pool and
+ * reaches the disk with it. Keys and values are fixed width, described by struct formats (e.g. "i", "q", "16s").
+ *
+ * Bucket page format (size in byte):
+ *  ---------------------------------------------------------------------------------------------------------------
+ * | PageHeader (8) | Size (2) | MaxSize (2) | KeySize (2) | ValueSize (2) | NextPageId (4) | Occupied (n/8) |
+ *  ---------------------------------------------------------------------------------------------------------------
+ *  ------------------
+ * | Readable (n/8) |
+ *  ------------------
+ *  ----------------------------------------------------------------------------------------------
+ * | TAG(1) | ... | TAG(n) | KEY(1) | KEY(2) | ... | KEY(n) | VALUE(1) | VALUE(2) | ... | VALUE(n) |
+ *  ----------------------------------------------------------------------------------------------
+ *
+ * Size is the number of readable slots, n the array size that fits the page for the key and value sizes. Keys and
+ * values are stored as two separate arrays so that each can be cast into a typed memoryview.
  *
- *  Here '+' means concatenation.
- *  The above format omits the space required for the occupied_ and
- *  readable_ arrays.
- 
  * You use two bit arrays: occupied_ and readable_. Each bit in these arrays corresponds to a slot in
-  the bucket page.
-  
+  the bucket page. A slot is occupied once it has held a pair, and readable while it holds a live pair; removing a
+  pair leaves an occupied but unreadable slot (tombstone) that a later insert reuses.
+ *
+ * NextPageId links a bucket to its first overflow page, and an overflow page (laid out as a bucket) to the next one;
+ * it is INVALID_PAGE_ID at the end of the chain.
+ *
+ * Every readable slot also carries a one byte fingerprint (tag) of its key, 0 for a slot that is not readable. A
+ * probe searches the tag array for the tag of the probed key with bytes.find and only compares the keys of the slots
+ * whose tag matches, so lookups and duplicate checks cost about one key comparison instead of one per slot. The tag
+ * is computed from the stored key bytes, so it does not depend on the hash function of the table and recovery can
+ * recompute it. A comparator must therefore consider two keys equal only if their stored bytes are equal.
 *
  """
 
+_METADATA = struct.Struct("<HHHHi")
+_NEXT_PAGE_ID = struct.Struct("<i")
+_NEXT_PAGE_ID_OFFSET = PAGE_HEADER_SIZE + 8
+_METADATA_OFFSET = PAGE_HEADER_SIZE
+_BITMAP_OFFSET = _METADATA_OFFSET + HTABLE_BUCKET_PAGE_METADATA_SIZE
+
+_EMPTY_TAG = b"\x00"
+
+# formats whose native item size equals the standard size, so the array can be a typed memoryview
+_CASTABLE_FORMATS = frozenset("bBhHiIqQfd") if sys.byteorder == "little" else frozenset()
+
+
+class _SlotArray:
+    """Fixed-width array of one struct format laid over a slice of the page."""
+
+    __slots__ = ("_view", "_struct", "_typed", "item_size")
+
+    def __init__(self, view: memoryview, fmt: str) -> None:
+        self._view = view
+        self._struct = struct.Struct("<" + fmt)
+        self.item_size = self._struct.size
+        self._typed = view.cast(fmt) if fmt in _CASTABLE_FORMATS else None
+
+    def __getitem__(self, idx):
+        if self._typed is not None:
+            return self._typed[idx]
+        return self._struct.unpack_from(self._view, idx * self.item_size)[0]
+
+    def __setitem__(self, idx, item):
+        if self._typed is not None:
+            self._typed[idx] = item
+        else:
+            self._struct.pack_into(self._view, idx * self.item_size, item)
+
+    def Raw(self, idx) -> memoryview:
+        """@return the stored bytes of slot idx"""
+        return self._view[idx * self.item_size : (idx + 1) * self.item_size]
+
+    def SetRaw(self, data, idx=0):
+        """Overwrite the slots from idx on with already packed items."""
+        start = idx * self.item_size
+        self._view[start : start + len(data)] = data
+
+    def Pack(self, item) -> bytes:
+        return self._struct.pack(item)
+
 
 class HashTableBucketPage:
-    def __init__(self) -> None:
-        self._occupied_ = [0] * ((BUCKET_ARRAY_SIZE - 1) // 8 + 1)
-        self._readable_ = [0] * ((BUCKET_ARRAY_SIZE - 1) // 8 + 1)
-        # Initialize array for key-value pairs
-        self._array_: List[dict] = [{} for _ in range(BUCKET_ARRAY_SIZE)]
-        self._page_id_ = INVALID_PAGE_ID
-        self._pin_count_: int = 0
+    def __init__(self, data, key_format=KEY_FORMAT, value_format=VALUE_FORMAT) -> None:
+        """
+        * Lay a bucket page over the data of a page.
+        * @param data the page data, e.g. Page.getData()
+        * @param key_format struct format of the keys; None opens the keys as raw bytes of the stored key size
+        * @param value_format struct format of the values; None opens the values as raw bytes of the stored value size
+        """
+        self._data = memoryview(data)
+        _, _, key_size, value_size, _ = _METADATA.unpack_from(self._data, _METADATA_OFFSET)
+        if (key_format is None or value_format is None) and not key_size:
+            raise ValueError("bucket page is not initialized, its key and value formats are unknown")
+        if key_format is None:
+            key_format = f"{key_size}s"
+        if value_format is None:
+            value_format = f"{value_size}s"
+        self._key_format, self._value_format = key_format, value_format
+        key_size = struct.calcsize("<" + key_format)
+        value_size = struct.calcsize("<" + value_format)
+
+        self._array_size = BucketArraySize(key_size + value_size)
+        bitmap_size = (self._array_size - 1) // 8 + 1
+        self._occupied_ = self._data[_BITMAP_OFFSET : _BITMAP_OFFSET + bitmap_size]
+        self._readable_ = self._data[
+            _BITMAP_OFFSET + bitmap_size : _BITMAP_OFFSET + 2 * bitmap_size
+        ]
+        tags_offset = _BITMAP_OFFSET + 2 * bitmap_size
+        keys_offset = tags_offset + self._array_size * FINGERPRINT_SIZE
+        self._tags_ = self._data[tags_offset:keys_offset]
+        values_offset = keys_offset + self._array_size * key_size
+        self._keys = _SlotArray(self._data[keys_offset:values_offset], key_format)
+        self._values = _SlotArray(
+            self._data[values_offset : values_offset + self._array_size * value_size],
+            value_format,
+        )
+
+    def Init(self, max_size=None):
+        """**
+        * Initialize a freshly allocated (zeroed) page as an empty bucket.
+        * @param max_size maximum number of pairs the bucket may hold, defaults to what fits the page
+        *"""
+        max_size = self._array_size if max_size is None else min(max_size, self._array_size)
+        _METADATA.pack_into(
+            self._data,
+            _METADATA_OFFSET,
+            0,
+            max_size,
+            self._keys.item_size,
+            self._values.item_size,
+            INVALID_PAGE_ID,
+        )
+
+    def Fill(self, packed_keys, packed_values):
+        """**
+        * Fill an empty bucket with already packed pairs in one pass, e.g. for a bulk load. The pairs are written to
+        * the first slots as they are, without duplicate checks.
+        *
+        * @param packed_keys the stored bytes of the keys
+        * @param packed_values the stored bytes of the values, one per key
+        *"""
+        count = len(packed_keys)
+        if not self.IsEmpty() or count > self.GetMaxSize():
+            raise ValueError(f"cannot fill {count} pairs into {self}")
+        self._keys.SetRaw(b"".join(packed_keys))
+        self._values.SetRaw(b"".join(packed_values))
+        self._tags_[:count] = bytes(map(_Fingerprint, packed_keys))
+        full_bytes, rest_bits = divmod(count, 8)
+        bits = b"\xff" * full_bytes + (bytes(((1 << rest_bits) - 1,)) if rest_bits else b"")
+        self._occupied_[: len(bits)] = bits
+        self._readable_[: len(bits)] = bits
+        self._SetSize(count)
 
     def GetValue(
         self,
         key: KeyType,
-        cmp: Callable[[dict, KeyType], bool],
+        cmp: Callable[[KeyType, KeyType], int],
         result: List[ValueType],
     ) -> bool:
         """**
         * Scan the bucket and collect values that have the matching key
+        * @param cmp comparator returning 0 for equal keys; None compares the stored bytes
         * @return true if at least one key matched
         *"""
-        for idx in range(BUCKET_ARRAY_SIZE):
-            if self.IsReadable(idx) and cmp(key, self._array_[idx]):
-                result.append(self._array_[idx])
-                return True
-        return False
+        found = False
+        for idx in self._MatchingSlots(key, cmp):
+            result.append(self._values[idx])
+            found = True
+        return found
 
-    def Insert(self, key, value) -> bool:
+    def Insert(self, key, value, cmp=None) -> bool:
         """**
         * Attempts to insert a key and value in the bucket.  Uses the occupied_
         * and readable_ arrays to keep track of each slot's availability.
         *
         * @param key key to insert
         * @param value value to insert
+        * @param cmp comparator returning 0 for equal keys; None compares the stored bytes
         * @return true if inserted, false if duplicate KV pair or bucket is full
         *
         """
-        for idx in range(BUCKET_ARRAY_SIZE):
-            if not self.IsOccupied(idx):
-                self._array_[idx] = {key: value}
-                self.SetOccupied(idx)
-                self.SetReadable(idx)
-                return True
-            else:
-                if self.GetValue(key, key_comparator, []):
-                    return False  # Duplicate key-value pair
-        return False  # Bucket is full
+        if self.IsFull():
+            return False
+        packed_key = self._keys.Pack(key)
+        packed_value = self._values.Pack(value)
+        tag = _Fingerprint(packed_key)
+        for idx in self._MatchingSlots(key, cmp, packed_key, tag):
+            if self._values.Raw(idx) == packed_value:
+                return False  # Duplicate key-value pair
+
+        idx = self._FirstFreeSlot()
+        self._keys[idx] = key
+        self._values[idx] = value
+        self._tags_[idx] = tag
+        self.SetOccupied(idx)
+        self.SetReadable(idx)
+        self._SetSize(self.NumReadable() + 1)
+        return True
 
     def Remove(
-        self, key: KeyError, value: ValueType, cmp: Callable[[dict, KeyType], bool]
+        self, key: KeyType, value: ValueType, cmp: Callable[[KeyType, KeyType], int] = None
     ) -> bool:
         """**
         * Removes a key and value.
         * @return true if removed, false if not found
         """
-        for idx in range(BUCKET_ARRAY_SIZE):
-            if (
-                self.IsOccupied(idx)
-                and cmp(self._array_[idx])
-                and self._array_[idx].get(key) == value
-            ):
-                self._array_[idx] = {}
+        packed_value = self._values.Pack(value)
+        for idx in self._MatchingSlots(key, cmp):
+            if self._values.Raw(idx) == packed_value:
+                self.removeAt(idx)
                 return True
-
         return False
 
     def keyAt(self, bucket_idx) -> KeyType:
@@ -94,8 +233,8 @@ class HashTableBucketPage:
         * @param bucket_idx the index in the bucket to get the key at
         * @return key at index bucket_idx of the bucket
         *"""
-        if bucket_idx < BUCKET_ARRAY_SIZE and self.IsReadable(bucket_idx):
-            return [*self._array_[bucket_idx].keys()][0]
+        if bucket_idx < self._array_size and self.IsReadable(bucket_idx):
+            return self._keys[bucket_idx]
         return None
 
     def valueAt(self, bucket_idx) -> ValueType:
@@ -105,14 +244,31 @@ class HashTableBucketPage:
         * @param bucket_idx the index in the bucket to get the value at
         * @return value at index bucket_idx of the bucket
         *"""
-        if bucket_idx < BUCKET_ARRAY_SIZE and self.IsReadable(bucket_idx):
-            return [*self._array_[bucket_idx].values()][0]
+        if bucket_idx < self._array_size and self.IsReadable(bucket_idx):
+            return self._values[bucket_idx]
+        return None
+
+    def rawKeyAt(self, bucket_idx) -> bytes:
+        """**
+        * Gets the stored bytes of the key at an index in the bucket, e.g. to hash or log it.
+        *
+        * @param bucket_idx the index in the bucket to get the key at
+        * @return the packed key at index bucket_idx of the bucket
+        *"""
+        if bucket_idx < self._array_size and self.IsReadable(bucket_idx):
+            return self._keys.Raw(bucket_idx).tobytes()
         return None
 
     def removeAt(self, bucket_idx):
         """* Remove the KV pair at bucket_idx"""
-        if bucket_idx < BUCKET_ARRAY_SIZE and self.IsOccupied(bucket_idx):
-            self._array_[bucket_idx] = {}
+        if bucket_idx < self._array_size and self.IsReadable(bucket_idx):
+            self._readable_[bucket_idx >> 3] &= ~(1 << (bucket_idx & 7)) & 0xFF
+            self._tags_[bucket_idx] = 0
+            size = self.NumReadable() - 1
+            self._SetSize(size)
+            if size == 0:
+                # nothing live is left, the tombstones can go
+                self._occupied_[:] = bytes(len(self._occupied_))
         return None
 
     def IsReadable(self, bucket_idx):
@@ -122,9 +278,7 @@ class HashTableBucketPage:
         * @param bucket_idx index to lookup
         * @return true if the index is readable, false otherwise
         *"""
-        byte_idx = bucket_idx // 8
-        bit_idx = bucket_idx % 8
-        return (self._readable_[byte_idx] & (1 << bit_idx)) != 0
+        return (self._readable_[bucket_idx >> 3] >> (bucket_idx & 7)) & 1 == 1
 
     def SetReadable(self, bucket_idx):
         """**
@@ -133,10 +287,7 @@ class HashTableBucketPage:
         *
         * @param bucket_idx the index to update
         *"""
-        byte_idx = bucket_idx // 8
-        bit_idx = bucket_idx % 8
-        # to set the bit at bit_idx in the byte at byte_idx to 1
-        self._readable_[byte_idx] |= 1 << bit_idx
+        self._readable_[bucket_idx >> 3] |= 1 << (bucket_idx & 7)
 
     def IsOccupied(self, bucket_idx):
         """**
@@ -145,9 +296,7 @@ class HashTableBucketPage:
         * @param bucket_idx index to look at
         * @return true if the index is occupied, false otherwise
         *"""
-        byte_idx = bucket_idx // 8
-        bit_idx = bucket_idx % 8
-        return (self._occupied_[byte_idx] & (1 << bit_idx)) != 0
+        return (self._occupied_[bucket_idx >> 3] >> (bucket_idx & 7)) & 1 == 1
 
     def SetOccupied(self, bucket_idx):
         """**
@@ -156,41 +305,70 @@ class HashTableBucketPage:
         *
         * @param bucket_idx the index to update
         *"""
-        byte_idx = bucket_idx // 8
-        bit_idx = bucket_idx % 8
-        # to set the bit at bit_idx in the byte at byte_idx to 1
-        self._occupied_[byte_idx] |= 1 << bit_idx
+        self._occupied_[bucket_idx >> 3] |= 1 << (bucket_idx & 7)
 
-    def __str__(self) -> str:
-        return f"This Hash Bucket page with page id equals to:  {self._page_id_} "
+    def NumReadable(self):
+        """* @return the number of readable (live) pairs in the bucket"""
+        return _METADATA.unpack_from(self._data, _METADATA_OFFSET)[0]
+
+    def GetMaxSize(self):
+        """* @return the maximum number of pairs the bucket may hold"""
+        return _METADATA.unpack_from(self._data, _METADATA_OFFSET)[1]
 
+    def GetArraySize(self):
+        """* @return the number of slots of the bucket array"""
+        return self._array_size
 
-# bucket = HashTableBucketPage()
+    def IsFull(self):
+        """* @return whether the bucket holds max size pairs"""
+        return self.NumReadable() >= self.GetMaxSize()
 
+    def IsEmpty(self):
+        """* @return whether the bucket holds no pair"""
+        return self.NumReadable() == 0
 
-# def key_comparator(key, dic):
-#     return key in dic
+    def GetNextPageId(self) -> page_id_t:
+        """* @return the page id of the next overflow page of the chain, INVALID_PAGE_ID at its end"""
+        return _NEXT_PAGE_ID.unpack_from(self._data, _NEXT_PAGE_ID_OFFSET)[0]
 
+    def SetNextPageId(self, next_page_id: page_id_t):
+        """* @param next_page_id the page id of the next overflow page of the chain"""
+        _NEXT_PAGE_ID.pack_into(self._data, _NEXT_PAGE_ID_OFFSET, next_page_id)
 
-# # Insert some key-value pairs
-# bucket.Insert("key", "val")
+    def GetKeyFormat(self):
+        return self._key_format
 
-# bucket.Insert("key2", "val")
+    def GetValueFormat(self):
+        return self._value_format
+
+    def _SetSize(self, size):
+        struct.pack_into("<H", self._data, _METADATA_OFFSET, size)
+
+    def _FirstFreeSlot(self):
+        """@return the first slot that is not readable, either a tombstone or a never used slot"""
+        idx = self._tags_.tobytes().find(_EMPTY_TAG)
+        return None if idx < 0 else idx
+
+    def _MatchingSlots(self, key, cmp, packed_key=None, tag=None):
+        """Yield the readable slots whose key matches key, comparing only the slots whose tag matches."""
+        if packed_key is None:
+            packed_key = self._keys.Pack(key)
+            tag = _Fingerprint(packed_key)
+        tags = self._tags_.tobytes()
+        tag = bytes((tag,))
+        idx = tags.find(tag)
+        while idx >= 0:
+            if cmp is None:
+                if self._keys.Raw(idx) == packed_key:
+                    yield idx
+            elif cmp(key, self._keys[idx]) == 0:
+                yield idx
+            idx = tags.find(tag, idx + 1)
+
+    def __str__(self) -> str:
+        return f"This Hash Bucket page holds {self.NumReadable()} of {self.GetMaxSize()} pairs "
 
-# bucket.SetReadable(2)
-# bucket.Insert("key2", "val")
-# bucket.Insert("key3", "val")
-# print(bucket._array_)
-# print("=================check get val=============================================")
 
-# # Get values for a specific key
-# key_to_search_no_found, key_to_search = "key3", "key65"
-# res = []
-# values1 = bucket.GetValue(key_to_search_no_found, key_comparator, res)
-# print("==============================================================")
-# values = bucket.GetValue(key_to_search, key_comparator, res)
-# print(
-#     f"Values for key '{key_to_search} and {key_to_search_no_found}': {values} {values1}",
-#     res,
-# )
-# print(bucket.keyAt(2), bucket._array_)
+def _Fingerprint(packed_key) -> int:
+    """@return the tag of a stored key, in 1..255 since 0 marks a slot that is not readable"""
+    return zlib.crc32(packed_key) % 255 + 1
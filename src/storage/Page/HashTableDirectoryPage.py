@@ -1,18 +1,37 @@
-from src.config import page_id_t, INVALID_PAGE_ID, lsn_t
-from src.hash_table_page_defs import DIRECTORY_ARRAY_SIZE
-from src.storage.Page import Page
-from src.buffer.BufferPoolManager import BufferPoolManager
+from __future__ import annotations
+
+from src.config import page_id_t, INVALID_PAGE_ID, PAGE_SIZE, PAGE_HEADER_SIZE
+from src.hash_table_page_defs import DIRECTORY_ARRAY_SIZE, HTABLE_DIRECTORY_MAX_DEPTH
+from typing import TYPE_CHECKING
+import struct
+
+# annotations only: the buffer pool imports the page modules
+if TYPE_CHECKING:
+    from src.storage.Page.Page import Page
+    from src.buffer.BufferPoolManager import BufferPoolManager
 
 """**Notes
 * The HashTableDirectoryPage doesn't get parameters directly.
-Instead, memory for the HashTableDirectoryPage is allocated by the buffer pool manager 
+Instead, memory for the HashTableDirectoryPage is allocated by the buffer pool manager and the directory is a view
+over the data of that page.
 
 * Each bucket has a local depth that indicates how many bits of the hash value are significant for the bucket.
 
 * local_depths : This array helps in managing the splitting of buckets and updating the directory pointers correctly
 
+* filter_page_ids : The pages of the Bloom filter of the directory, see HashTableBloomFilterPage. A filter page is
+allocated when a key first lands in one of its partitions, INVALID_PAGE_ID means none of them holds a key.
+
 """
 
+_DEPTHS = struct.Struct("<II")
+_DEPTHS_OFFSET = PAGE_HEADER_SIZE
+_LOCAL_DEPTHS_OFFSET = _DEPTHS_OFFSET + _DEPTHS.size
+_BUCKET_IDS_OFFSET = _LOCAL_DEPTHS_OFFSET + DIRECTORY_ARRAY_SIZE
+_PAGE_ID = struct.Struct("<i")
+_FILTER_IDS_OFFSET = _BUCKET_IDS_OFFSET + DIRECTORY_ARRAY_SIZE * _PAGE_ID.size
+_MAX_FILTER_PAGES = (PAGE_SIZE - _FILTER_IDS_OFFSET) // _PAGE_ID.size
+
 
 class HashTableDirectoryPage:
     """**
@@ -20,38 +39,43 @@ class HashTableDirectoryPage:
     * Directory Page for extendible hash table.
     *
     * Directory format (size in byte):
-    * --------------------------------------------------------------------------------------------
-    * | LSN (4) | PageId(4) | GlobalDepth(4) | LocalDepths(512) | BucketPageIds(2048) | Free(1524)
-    * --------------------------------------------------------------------------------------------
+    * ---------------------------------------------------------------------------------------------------------------
+    * | PageHeader (8) | MaxDepth (4) | GlobalDepth (4) | LocalDepths (512) | BucketPageIds (2048) | FilterPageIds (1520)
+    * ---------------------------------------------------------------------------------------------------------------
     """
 
-    def __init__(self) -> None:
-        super().__init__()
-        self._page_id_: page_id_t = INVALID_PAGE_ID
-        self._lsn_: lsn_t = INVALID_PAGE_ID
-        self._global_depth_ = 1
-        self._pin_count_: int = 0
-        self._local_depths_ = [0] * DIRECTORY_ARRAY_SIZE
-        self._bucket_page_ids_: page_id_t = [0] * DIRECTORY_ARRAY_SIZE
-
-    def GetPageId(self) -> page_id_t:
-        """** @return the page ID of this page*"""
-        return self._page_id_
-
-    def SetPageId(self, page_id: page_id_t):
-        """* @param page_id the page id to which to set the page_id_ field"""
-        self._page_id_ = page_id
-
-    def GetLsn(self) -> lsn_t:
-        """* @return the lsn of this page"""
-        return self._lsn_
+    def __init__(self, data) -> None:
+        """
+        * Lay a directory page over the data of a page.
+        * @param data the page data, e.g. Page.getData()
+        """
+        self._data = memoryview(data)
+        self._local_depths_ = self._data[_LOCAL_DEPTHS_OFFSET:_BUCKET_IDS_OFFSET]
+        self._bucket_page_ids_ = self._data[
+            _BUCKET_IDS_OFFSET : _BUCKET_IDS_OFFSET + DIRECTORY_ARRAY_SIZE * _PAGE_ID.size
+        ]
+
+    def Init(self, max_depth=HTABLE_DIRECTORY_MAX_DEPTH):
+        """**
+        * Initialize a new directory page with global depth 0 and no bucket.
+        * @param max_depth the max depth the directory may grow to
+        *"""
+        max_depth = min(max_depth, HTABLE_DIRECTORY_MAX_DEPTH)
+        _DEPTHS.pack_into(self._data, _DEPTHS_OFFSET, max_depth, 0)
+        self._local_depths_[:] = bytes(DIRECTORY_ARRAY_SIZE)
+        self._bucket_page_ids_[:] = _PAGE_ID.pack(INVALID_PAGE_ID) * DIRECTORY_ARRAY_SIZE
+        self._data[_FILTER_IDS_OFFSET : _FILTER_IDS_OFFSET + _MAX_FILTER_PAGES * _PAGE_ID.size] = (
+            _PAGE_ID.pack(INVALID_PAGE_ID) * _MAX_FILTER_PAGES
+        )
 
-    def SetLsn(self, lsn):
+    def HashToBucketIndex(self, hash_value) -> int:
         """**
-        * Sets the LSN of this page
-        * @param lsn the log sequence number to which to set the lsn field
+        * Get the bucket index that the key is hashed to
+        *
+        * @param hash_value the hash of the key
+        * @return bucket index current key is hashed to
         *"""
-        self._lsn_ = lsn
+        return hash_value & self.GetGlobalDepthMask()
 
     def GetBucketPageId(self, bucket_idx) -> page_id_t:
         """**
@@ -60,14 +84,29 @@ class HashTableDirectoryPage:
         * @param bucket_idx the index in the directory to lookup
         * @return bucket page_id corresponding to bucket_idx
         *"""
-        return self._bucket_page_ids_[bucket_idx]
+        return _PAGE_ID.unpack_from(self._bucket_page_ids_, bucket_idx * _PAGE_ID.size)[0]
 
-    def FetchBucketPage(self, bucket_idx, bpm):
+    def FetchBucketPage(self, bucket_idx, bpm: BufferPoolManager) -> Page:
         bucket_id = self.GetBucketPageId(bucket_idx)
         if bucket_id != INVALID_PAGE_ID:
             return bpm.FetchPage(bucket_id)
         return None
 
+    def SetBucketPageId(self, bucket_idx, bucket_page_id: page_id_t):
+        """**
+        * Updates the directory index using a bucket index and page_id
+        *
+        * @param bucket_idx directory index at which to insert page_id
+        * @param bucket_page_id page_id to insert
+        *"""
+        _PAGE_ID.pack_into(self._bucket_page_ids_, bucket_idx * _PAGE_ID.size, bucket_page_id)
+
+    def UnpinBucket(
+        self, bpm: BufferPoolManager, bucket_idx, is_dirty: bool = False
+    ):
+        page_id = self.GetBucketPageId(bucket_idx)
+        bpm.UnpinPage(page_id, is_dirty)
+
     def GetLocalDepth(self, bucket_idx):
         """**
         * Gets the local depth of the bucket at bucket_idx
@@ -86,27 +125,29 @@ class HashTableDirectoryPage:
         *"""
         self._local_depths_[bucket_idx] = local_depth
 
-    def SetBucketPageId(self, bucket_idx, bucket_page_id: page_id_t):
+    def IncrLocalDepth(self, bucket_idx):
         """**
-        * Updates the directory index using a bucket index and page_id
-        *
-        * @param bucket_idx directory index at which to insert page_id
-        * @param bucket_page_id page_id to insert
+        * Increment the local depth of the bucket at bucket_idx
+        * @param bucket_idx bucket index to increment
         *"""
-        print(
-            "Inside the set bucket page id \n ",
-            "Index found is :",
-            bucket_idx,
-            " page id :",
-            bucket_page_id,
-        )
-        self._bucket_page_ids_[bucket_idx] = bucket_page_id
+        self._local_depths_[bucket_idx] += 1
 
-    def UnpinBucket(
-        self, bpm: BufferPoolManager, bucket_idx: page_id_t, is_dirty: bool = False
-    ):
-        page_id = self.GetBucketPageId(bucket_idx)
-        bpm.UnpinPage(page_id, is_dirty)
+    def DecrLocalDepth(self, bucket_idx):
+        """**
+        * Decrement the local depth of the bucket at bucket_idx
+        * @param bucket_idx bucket index to decrement
+        *"""
+        self._local_depths_[bucket_idx] -= 1
+
+    def GetLocalDepthMask(self, bucket_idx):
+        """**
+        * GetLocalDepthMask - same as global depth mask, except it
+        * uses the local depth of the bucket located at bucket_idx
+        *
+        * @param bucket_idx the index to use for looking up local depth
+        * @return mask of local 1's and the rest 0's (with 1's from LSB upwards)
+        *"""
+        return (1 << self.GetLocalDepth(bucket_idx)) - 1
 
     def GetGlobalDepth(self):
         """**
@@ -114,7 +155,11 @@ class HashTableDirectoryPage:
         *
         * @return the global depth of the directory
         *"""
-        return self._global_depth_
+        return _DEPTHS.unpack_from(self._data, _DEPTHS_OFFSET)[1]
+
+    def GetMaxDepth(self):
+        """* @return the max depth the directory may grow to"""
+        return _DEPTHS.unpack_from(self._data, _DEPTHS_OFFSET)[0]
 
     def GetSplitImageIndex(self, bucket_idx):
         """**
@@ -123,7 +168,10 @@ class HashTableDirectoryPage:
         * @param bucket_idx the directory index for which to find the split image
         * @return the directory index of the split image
         *"""
-        pass
+        local_depth = self.GetLocalDepth(bucket_idx)
+        if local_depth == 0:
+            return bucket_idx
+        return bucket_idx ^ (1 << (local_depth - 1))
 
     def GetGlobalDepthMask(self):
         """**
@@ -140,42 +188,64 @@ class HashTableDirectoryPage:
         *
         * @return mask of global_depth 1's and the rest 0's (with 1's from LSB upwards)
         *"""
-        return (1 << self._global_depth_) - 1
+        return (1 << self.GetGlobalDepth()) - 1
 
     def IncrGlobalDepth(self):
+        """**
+        * Increment the global depth of the directory. The new upper half of the directory mirrors the lower half, so
+        * every bucket is pointed at by twice as many slots as before.
+        *"""
+        global_depth = self.GetGlobalDepth()
+        size = 1 << global_depth
+        self._local_depths_[size : 2 * size] = self._local_depths_[:size]
+        self._bucket_page_ids_[size * _PAGE_ID.size : 2 * size * _PAGE_ID.size] = (
+            self._bucket_page_ids_[: size * _PAGE_ID.size]
+        )
+        self._SetGlobalDepth(global_depth + 1)
+
+    def DecrGlobalDepth(self):
         """** Decrement the global depth of the directory. *"""
-        self._global_depth_ += 1
+        self._SetGlobalDepth(self.GetGlobalDepth() - 1)
 
-    def DecrLocalDepth(self):
+    def CanShrink(self):
         """**
-        * Decrement the local depth of the bucket at bucket_idx
-        * @param bucket_idx bucket index to decrement
+        * @return true if the directory can be shrunk, i.e. every local depth is below the global depth
         *"""
-        self._local_depths_ -= 1
+        global_depth = self.GetGlobalDepth()
+        if global_depth == 0:
+            return False
+        return max(self._local_depths_[: 1 << global_depth]) < global_depth
 
     def GetNumBuckets(self):
-        """* Returns number of Buckets so far"""
-        return 1 << self._global_depth_
+        """* Returns the number of directory slots in use, 2^global_depth"""
+        return 1 << self.GetGlobalDepth()
 
-    def SplitBucket(self):
-        """* Split a bucket if there is no room for insertion. We can split the bucket till it become full."""
-        pass
+    def MaxSize(self):
+        """* @return the max number of slots of the directory, 2^max_depth"""
+        return 1 << self.GetMaxDepth()
 
-    def __str__(self) -> str:
-        return f"This Hash Directory page  with page id equals to:  {self._page_id_} "
+    def GetFilterPageId(self, filter_idx) -> page_id_t:
+        """**
+        * @param filter_idx index of the filter page
+        * @return the page id of the filter page, INVALID_PAGE_ID if it is not allocated
+        *"""
+        return _PAGE_ID.unpack_from(self._data, _FILTER_IDS_OFFSET + filter_idx * _PAGE_ID.size)[0]
 
+    def SetFilterPageId(self, filter_idx, filter_page_id: page_id_t):
+        """**
+        * @param filter_idx index of the filter page
+        * @param filter_page_id page id of the filter page
+        *"""
+        _PAGE_ID.pack_into(self._data, _FILTER_IDS_OFFSET + filter_idx * _PAGE_ID.size, filter_page_id)
+
+    @staticmethod
+    def MaxFilterPages():
+        """* @return the max number of filter pages a directory can refer to"""
+        return _MAX_FILTER_PAGES
 
-directory_page = HashTableDirectoryPage()
-directory_page.SetPageId(1)
-directory_page.SetLsn(100)
-directory_page.SetLocalDepth(2, 9)
-directory_page.SetLocalDepth(0, 1)
-directory_page.SetBucketPageId(0, 10)
+    def _SetGlobalDepth(self, global_depth):
+        struct.pack_into("<I", self._data, _DEPTHS_OFFSET + 4, global_depth)
 
-print("Page ID:", directory_page.GetPageId())
-print("LSN:", directory_page.GetLsn())
-print("Global Depth:", directory_page.GetLocalDepth(1))
-print("Local Depth of bucket 0:", directory_page.GetLocalDepth(0))
-print("Bucket Page ID of bucket 0:", directory_page.GetBucketPageId(0))
+    def __str__(self) -> str:
+        return f"This Hash Directory page has global depth {self.GetGlobalDepth()} "
 
-print("Number of Buckets we have so far: ", directory_page.GetNumBuckets())
@@ -0,0 +1,88 @@
+from src.config import page_id_t, INVALID_PAGE_ID, PAGE_HEADER_SIZE
+from src.hash_table_page_defs import HTABLE_HEADER_MAX_DEPTH
+import struct
+
+"""
+ * Header page for the extendible hash table, the root of the three levels header -> directory -> bucket.
+ *
+ * The header routes the most significant max_depth bits of a 32-bit hash to one of up to 2^max_depth directory
+ * pages, each directory then uses the least significant bits to pick a bucket. The header, the directories and the
+ * buckets are all pages of the buffer pool, so a hot directory stays cached on its own while cold ones are evicted.
+ *
+ * Header format (size in byte):
+ *  ---------------------------------------------------------------------
+ * | PageHeader (8) | MaxDepth (4) | DirectoryPageIds (4 * 2^MaxDepth) |
+ *  ---------------------------------------------------------------------
+"""
+
+_MAX_DEPTH = struct.Struct("<I")
+_MAX_DEPTH_OFFSET = PAGE_HEADER_SIZE
+_DIRECTORY_IDS_OFFSET = _MAX_DEPTH_OFFSET + _MAX_DEPTH.size
+_PAGE_ID = struct.Struct("<i")
+
+
+class HashTableHeaderPage:
+    def __init__(self, data) -> None:
+        """
+        * Lay a header page over the data of a page.
+        * @param data the page data, e.g. Page.getData()
+        """
+        self._data = memoryview(data)
+
+    def Init(self, max_depth=HTABLE_HEADER_MAX_DEPTH):
+        """**
+        * Initialize a new header page, no directory is allocated yet.
+        * @param max_depth number of hash bits the header uses to pick a directory
+        *"""
+        max_depth = min(max_depth, HTABLE_HEADER_MAX_DEPTH)
+        _MAX_DEPTH.pack_into(self._data, _MAX_DEPTH_OFFSET, max_depth)
+        empty = _PAGE_ID.pack(INVALID_PAGE_ID) * (1 << max_depth)
+        self._data[_DIRECTORY_IDS_OFFSET : _DIRECTORY_IDS_OFFSET + len(empty)] = empty
+
+    def HashToDirectoryIndex(self, hash_value) -> int:
+        """**
+        * Get the directory index that the key is hashed to
+        *
+        * @param hash_value the 32-bit hash of the key
+        * @return directory index the key is hashed to
+        *"""
+        max_depth = self.GetMaxDepth()
+        if max_depth == 0:
+            return 0
+        return (hash_value & 0xFFFFFFFF) >> (32 - max_depth)
+
+    def GetDirectoryPageId(self, directory_idx) -> page_id_t:
+        """**
+        * Get the directory page id at an index
+        *
+        * @param directory_idx index in the directory page id array
+        * @return directory page_id at index
+        *"""
+        return _PAGE_ID.unpack_from(
+            self._data, _DIRECTORY_IDS_OFFSET + directory_idx * _PAGE_ID.size
+        )[0]
+
+    def SetDirectoryPageId(self, directory_idx, directory_page_id: page_id_t):
+        """**
+        * @brief Set the directory page id at an index
+        *
+        * @param directory_idx index in the directory page id array
+        * @param directory_page_id page id of the directory
+        *"""
+        _PAGE_ID.pack_into(
+            self._data,
+            _DIRECTORY_IDS_OFFSET + directory_idx * _PAGE_ID.size,
+            directory_page_id,
+        )
+
+    def GetMaxDepth(self) -> int:
+        """* @return the number of hash bits the header uses"""
+        return _MAX_DEPTH.unpack_from(self._data, _MAX_DEPTH_OFFSET)[0]
+
+    def MaxSize(self) -> int:
+        """* @return the maximum number of directory page ids the header page could handle"""
+        return 1 << self.GetMaxDepth()
+
+    def __str__(self) -> str:
+        return f"This Hash Header page routes to {self.MaxSize()} directories "
+
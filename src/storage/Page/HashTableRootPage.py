@@ -0,0 +1,165 @@
+from src.config import PAGE_SIZE, PAGE_HEADER_SIZE
+import struct
+
+"""
+ * Root page of the hash indexes of a database, kept at HEADER_PAGE_ID.
+ *
+ * The root maps the name of every index to what is needed to open it without reading anything else: the page id of
+ * its header page and the formats and parameters its pages were laid out with. The header, the directories and the
+ * buckets describe themselves (depths, page ids), so once the root is read they are fetched lazily, on demand.
+ *
+ * Root page format (size in byte):
+ *  ----------------------------------------------------------------------------
+ * | PageHeader (8) | Magic (4) | NumIndexes (4) | Index(0) | ... | Index(n-1) |
+ *  ----------------------------------------------------------------------------
+ *
+ * Index format (size in byte):
+ *  -----------------------------------------------------------------------------------------------------------
+ * | Name (32) | HeaderPageId (4) | DirectoryMaxDepth (4) | KeyFormat (16) | ValueFormat (16) | FilterSize (2) |
+ *  -----------------------------------------------------------------------------------------------------------
+ *  ------------------------------------
+ * | FilterHashes (2) | CustomHash (4) |
+ *  ------------------------------------
+ *
+ * FilterSize is 0 for an index without Bloom filters. CustomHash is set when the index was created with a hash
+ * function other than the default one, which has to be passed again when it is opened.
+"""
+
+_MAGIC = 0x48524F54
+_METADATA = struct.Struct("<II")
+_METADATA_OFFSET = PAGE_HEADER_SIZE
+_INDEXES_OFFSET = _METADATA_OFFSET + _METADATA.size
+_INDEX = struct.Struct("<32sii16s16sHHi")
+_MAX_INDEXES = (PAGE_SIZE - _INDEXES_OFFSET) // _INDEX.size
+
+
+class IndexMetadata:
+    """What the root page records about one index."""
+
+    __slots__ = (
+        "name",
+        "header_page_id",
+        "directory_max_depth",
+        "key_format",
+        "value_format",
+        "filter_size",
+        "filter_hashes",
+        "custom_hash",
+    )
+
+    def __init__(
+        self,
+        name,
+        header_page_id,
+        directory_max_depth,
+        key_format,
+        value_format,
+        filter_size=0,
+        filter_hashes=0,
+        custom_hash=False,
+    ) -> None:
+        self.name = name
+        self.header_page_id = header_page_id
+        self.directory_max_depth = directory_max_depth
+        self.key_format = key_format
+        self.value_format = value_format
+        self.filter_size = filter_size
+        self.filter_hashes = filter_hashes
+        self.custom_hash = custom_hash
+
+
+class HashTableRootPage:
+    def __init__(self, data) -> None:
+        """
+        * Lay a root page over the data of a page.
+        * @param data the page data, e.g. Page.getData()
+        """
+        self._data = memoryview(data)
+
+    def Init(self):
+        """**
+        * Initialize a new root page without any index.
+        *"""
+        _METADATA.pack_into(self._data, _METADATA_OFFSET, _MAGIC, 0)
+
+    def IsRoot(self) -> bool:
+        """* @return whether the page was initialized as a root page"""
+        return _METADATA.unpack_from(self._data, _METADATA_OFFSET)[0] == _MAGIC
+
+    def GetNumIndexes(self) -> int:
+        return _METADATA.unpack_from(self._data, _METADATA_OFFSET)[1]
+
+    def GetIndex(self, name) -> IndexMetadata:
+        """**
+        * @param name the name of the index
+        * @return the metadata of the index, None if there is no index of that name
+        *"""
+        slot = self._FindIndex(self._EncodeName(name))
+        if slot is None:
+            return None
+        (
+            _,
+            header_page_id,
+            directory_max_depth,
+            key_format,
+            value_format,
+            filter_size,
+            filter_hashes,
+            custom_hash,
+        ) = _INDEX.unpack_from(self._data, _INDEXES_OFFSET + slot * _INDEX.size)
+        return IndexMetadata(
+            name,
+            header_page_id,
+            directory_max_depth,
+            key_format.rstrip(b"\0").decode("ascii"),
+            value_format.rstrip(b"\0").decode("ascii"),
+            filter_size,
+            filter_hashes,
+            bool(custom_hash),
+        )
+
+    def SetIndex(self, index: IndexMetadata):
+        """**
+        * Record an index, replacing the index of the same name if there is one.
+        * @param index the metadata of the index
+        *"""
+        name = self._EncodeName(index.name)
+        key_format, value_format = index.key_format.encode("ascii"), index.value_format.encode("ascii")
+        if max(len(key_format), len(value_format)) > 16:
+            raise ValueError(f"formats longer than 16 characters do not fit the root page: {index.key_format!r}")
+        slot = self._FindIndex(name)
+        if slot is None:
+            slot = self.GetNumIndexes()
+            if slot == _MAX_INDEXES:
+                raise RuntimeError(f"the root page is full, it holds at most {_MAX_INDEXES} indexes")
+            _METADATA.pack_into(self._data, _METADATA_OFFSET, _MAGIC, slot + 1)
+        _INDEX.pack_into(
+            self._data,
+            _INDEXES_OFFSET + slot * _INDEX.size,
+            name,
+            index.header_page_id,
+            index.directory_max_depth,
+            key_format,
+            value_format,
+            index.filter_size,
+            index.filter_hashes,
+            int(index.custom_hash),
+        )
+
+    def _FindIndex(self, name: bytes):
+        """@return the slot of the index of that encoded name, None if there is none"""
+        for slot in range(self.GetNumIndexes()):
+            offset = _INDEXES_OFFSET + slot * _INDEX.size
+            if self._data[offset : offset + 32].tobytes().rstrip(b"\0") == name:
+                return slot
+        return None
+
+    @staticmethod
+    def _EncodeName(name) -> bytes:
+        encoded = name.encode("utf-8")
+        if not encoded or len(encoded) > 32 or b"\0" in encoded:
+            raise ValueError(f"an index name must be 1 to 32 bytes of UTF-8 without NUL, got {name!r}")
+        return encoded
+
+    def __str__(self) -> str:
+        return f"This root page holds {self.GetNumIndexes()} of at most {_MAX_INDEXES} indexes "
@@ -16,7 +16,7 @@ class Page:
     There is book-keeping information inside the page that should only be relevant to the buffer pool manager.
     """
 
-    __SIZE_PAGE_HEADER: size_t = 8
+    __SIZE_PAGE_HEADER: size_t = PAGE_HEADER_SIZE
     __OFFSET_PAGE_START: size_t = 0
     __OFFSET_LSN: size_t = 4
 
@@ -26,8 +26,16 @@ class Page:
         self._pin_count_: int = 0
         # True if the page is dirty, i.e. it is different from its corresponding page on disk
         self._is_dirty_ = False
+        # Lower bound for the LSN of the first change not yet on disk, only meaningful while the page is dirty
+        self._rec_lsn_: lsn_t = INVALID_LSN
         # Page latch.
-        self._rwlatch_ = ReaderWriterLatch()
+        self._rwlatch_ = ReaderWriterLatch(prefer_writers=True)
+        # Bumped when the write latch is taken and again when it is released, so it is odd while a writer holds the
+        # page. An optimistic reader validates that it did not change across its read instead of taking the latch.
+        self._version_ = 0
+        # Version store of the buffer pool the page belongs to, the current version is copied there before a write
+        # while a snapshot reads it
+        self._version_store_ = None
         self.ResetMemory()
 
     def getData(self):
@@ -45,22 +53,50 @@ class Page:
     def WLatch(self):
         """* Acquire the page write latch. *"""
         self._rwlatch_.WLock()
+        self._version_ += 1
+        self.PrepareWrite()
 
     def WUnLatch(self):
         """* Release the page write latch. *"""
+        self._version_ += 1
         self._rwlatch_.WUnLock()
 
+    def TryWLatch(self) -> bool:
+        """* @return whether the page write latch was acquired, without waiting *"""
+        if not self._rwlatch_.TryWLock():
+            return False
+        self._version_ += 1
+        self.PrepareWrite()
+        return True
+
+    def PrepareWrite(self):
+        """
+        * Announce a change to the page: a live snapshot that still reads its current version gets a copy of it
+        * first. WLatch does this; a writer changing the page under another latch, e.g. a directory under the table
+        * latch, calls it before the change.
+        """
+        if self._version_store_ is not None and self._version_store_._snapshots_:
+            self._version_store_.Preserve(self._page_id_, self._data_)
+
     def RLatch(self):
         """* Acquire the page read latch. *"""
         self._rwlatch_.RLock()
 
+    def TryRLatch(self) -> bool:
+        """* @return whether the page read latch was acquired, without waiting *"""
+        return self._rwlatch_.TryRLock()
+
     def RUnLatch(self):
         """* Release the page read latch. *"""
-        self._rwlatch_.WUnLock()
+        self._rwlatch_.RUnLock()
+
+    def GetVersion(self) -> int:
+        """* @return the page version, odd while the page is write latched *"""
+        return self._version_
 
     def GetLNS(self) -> lsn_t:
         """* @return the page Log Sequence Number LSN. *"""
-        return struct.unpack_from(LSN_FORMAT, self._data_, self.__OFFSET_LSN)
+        return struct.unpack_from(LSN_FORMAT, self._data_, self.__OFFSET_LSN)[0]
 
     def SetLNS(self, lsn: lsn_t):
         """/** Sets the page LSN. */
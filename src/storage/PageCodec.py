@@ -0,0 +1,74 @@
+from abc import ABC, abstractmethod
+from src.config import PAGE_SIZE
+import zlib
+
+"""
+ * PageCodec compresses page images before they reach the disk and decompresses them back into a frame buffer.
+ * Every codec carries a small numeric id that is persisted next to each compressed page, so a store can refuse to
+ * open a file that was written with a different codec.
+"""
+
+# codec id reserved for pages that were stored uncompressed
+RAW_CODEC_ID = 0
+
+
+class PageCodec(ABC):
+    """PageCodec is an abstract class that compresses page images."""
+
+    codec_id: int = RAW_CODEC_ID
+
+    @abstractmethod
+    def compress(self, page_data) -> bytes:
+        """
+        * Compress a page image.
+        * @param page_data raw page data, exactly PAGE_SIZE bytes
+        * @return the compressed bytes
+        """
+        pass
+
+    @abstractmethod
+    def decompress(self, data, page_data):
+        """
+        * Decompress a stored page image into a frame buffer.
+        * @param data compressed bytes as read from disk
+        * @param[out] page_data writable buffer of PAGE_SIZE bytes that receives the page image
+        """
+        pass
+
+
+class ZlibCodec(PageCodec):
+    """Deflate codec, cheap enough to sit on the page write path."""
+
+    codec_id = 1
+
+    def __init__(self, level: int = 1) -> None:
+        self.level = level
+
+    def compress(self, page_data) -> bytes:
+        return zlib.compress(page_data, self.level)
+
+    def decompress(self, data, page_data):
+        page_data[:PAGE_SIZE] = zlib.decompress(data, bufsize=PAGE_SIZE)
+
+
+class LzmaCodec(PageCodec):
+    """LZMA codec, slower than zlib but packs cold indexes tighter."""
+
+    codec_id = 2
+
+    def __init__(self, preset: int = 6) -> None:
+        # imported here so that a database without LZMA compression never loads it
+        import lzma
+
+        self._lzma = lzma
+        self._filters = [{"id": lzma.FILTER_LZMA2, "preset": preset}]
+
+    def compress(self, page_data) -> bytes:
+        return self._lzma.compress(
+            page_data, format=self._lzma.FORMAT_RAW, filters=self._filters
+        )
+
+    def decompress(self, data, page_data):
+        page_data[:PAGE_SIZE] = self._lzma.decompress(
+            data, format=self._lzma.FORMAT_RAW, filters=self._filters
+        )
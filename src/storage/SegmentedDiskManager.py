@@ -0,0 +1,184 @@
+from src.config import page_id_t, size_type, PAGE_SIZE, SEGMENT_SIZE
+from src.storage.DiskManager import DiskManager
+import os
+import re
+import threading
+
+"""
+ * SegmentedDiskManager spreads the pages of a database over fixed-size segment files instead of one ".db" file.
+ * Page p lives in segment p // pages_per_segment at offset (p % pages_per_segment) * PAGE_SIZE. Segment n is named
+ * "<db name>.<n>.seg" and is placed in directories[n % len(directories)], so segments can sit on different volumes.
+ *
+ * Every segment has its own file handle and latch: pages of different segments are read and written concurrently,
+ * and a single segment can be synced (e.g. before it is copied by a backup) or dropped without touching the others.
+ * The log file stays next to db_file.
+"""
+
+
+class _Segment:
+    """An open segment file and the latch that serializes positioned I/O on it."""
+
+    __slots__ = ("file_name", "io", "lock")
+
+    def __init__(self, file_name) -> None:
+        self.file_name = file_name
+        fd = os.open(file_name, os.O_RDWR | os.O_CREAT, 0o644)
+        self.io = os.fdopen(fd, "r+b")
+        self.lock = threading.Lock()
+
+
+class SegmentedDiskManager(DiskManager):
+    def __init__(self, db_file, segment_size=SEGMENT_SIZE, directories=None) -> None:
+        """
+        * Creates a new disk manager that writes pages to segment files.
+        * @param db_file the file name of the database; names the segments and the log file
+        * @param segment_size size of a segment file in bytes, a multiple of PAGE_SIZE
+        * @param directories directories the segments are distributed over, defaults to the directory of db_file
+        """
+        if segment_size <= 0 or segment_size % PAGE_SIZE:
+            raise ValueError(f"segment size must be a multiple of {PAGE_SIZE} bytes")
+        self._pages_per_segment = segment_size // PAGE_SIZE
+        self._directories = list(directories or [os.path.dirname(db_file) or "."])
+        super().__init__(db_file)
+
+    def _OpenDatabase(self, codec):
+        """Segments are opened lazily on first access."""
+        if codec is not None:
+            raise ValueError("compression is not supported in segmented storage mode")
+        self._segments = {}
+        # guards the segment table only, page I/O runs under the per-segment latch
+        self._segments_latch = threading.Lock()
+
+    def _CloseDatabase(self):
+        with self._segments_latch:
+            segments, self._segments = self._segments, {}
+        for segment in segments.values():
+            with segment.lock:
+                segment.io.close()
+
+    def writePage(self, page_id: page_id_t, page_data):
+        """
+        * Write a page to the segment holding it.
+        * @param page_id id of the page
+        * @param page_data raw page data
+        """
+        if len(page_data) != PAGE_SIZE:
+            raise ValueError(f"Data must be exactly {PAGE_SIZE} bytes")
+
+        segment_no, offset = self._Locate(page_id)
+        segment = self._GetSegment(segment_no)
+        with segment.lock:
+            self._num_writes_ += 1
+            segment.io.seek(offset)
+            segment.io.write(page_data)
+            segment.io.flush()
+
+    def readPage(self, page_id: page_id_t, page_data):
+        """
+        * Read a page from the segment holding it.
+        * @param page_id id of the page
+        * @param[out] page_data output buffer; a writable buffer is filled in place
+        * @return the page data
+        """
+        if not isinstance(page_data, (bytearray, memoryview)):
+            page_data = bytearray(PAGE_SIZE)
+
+        segment_no, offset = self._Locate(page_id)
+        segment = self._GetSegment(segment_no, create=False)
+        read = 0
+        if segment is not None:
+            with segment.lock:
+                segment.io.seek(offset)
+                read = segment.io.readinto(memoryview(page_data)[:PAGE_SIZE])
+        # Pad with zeros if the segment ends before the page does
+        if read < PAGE_SIZE:
+            page_data[read:PAGE_SIZE] = bytes(PAGE_SIZE - read)
+        return page_data
+
+    def GetSegmentNo(self, page_id: page_id_t) -> size_type:
+        """@return the number of the segment holding page_id"""
+        return page_id // self._pages_per_segment
+
+    def GetSegmentFileName(self, segment_no) -> str:
+        """@return the path of the segment file for segment_no"""
+        directory = self._directories[segment_no % len(self._directories)]
+        return os.path.join(directory, f"{self._SegmentStem()}.{segment_no}.seg")
+
+    def ListSegments(self):
+        """@return the sorted numbers of all segments present on disk"""
+        pattern = re.compile(re.escape(self._SegmentStem()) + r"\.(\d+)\.seg$")
+        found = set()
+        for directory in self._directories:
+            for name in os.listdir(directory):
+                match = pattern.match(name)
+                if match:
+                    found.add(int(match.group(1)))
+        return sorted(found)
+
+    def GetNumPages(self) -> size_type:
+        """* @return one past the highest page id stored in the last segment"""
+        segments = self.ListSegments()
+        if not segments:
+            return 0
+        size = os.path.getsize(self.GetSegmentFileName(segments[-1]))
+        return segments[-1] * self._pages_per_segment + -(-size // PAGE_SIZE)
+
+    def SyncSegment(self, segment_no):
+        """
+        * Force a segment to stable storage, e.g. before a backup copies its file.
+        * @param segment_no the segment to sync
+        """
+        segment = self._GetSegment(segment_no, create=False)
+        if segment is None:
+            return
+        with segment.lock:
+            segment.io.flush()
+            os.fsync(segment.io.fileno())
+
+    def Sync(self):
+        """* Force every open segment to stable storage."""
+        with self._segments_latch:
+            segment_nos = list(self._segments)
+        for segment_no in segment_nos:
+            self.SyncSegment(segment_no)
+
+    def DropSegment(self, segment_no) -> bool:
+        """
+        * Close and delete a segment file. Its pages read back as zeroes afterwards.
+        * @param segment_no the segment to drop
+        * @return true if a segment file was deleted
+        """
+        with self._segments_latch:
+            segment = self._segments.pop(segment_no, None)
+        if segment is not None:
+            with segment.lock:
+                segment.io.close()
+        try:
+            os.remove(self.GetSegmentFileName(segment_no))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _Locate(self, page_id: page_id_t):
+        """@return the segment number and the byte offset of page_id inside it"""
+        segment_no, slot = divmod(page_id, self._pages_per_segment)
+        return segment_no, slot * PAGE_SIZE
+
+    def _GetSegment(self, segment_no, create=True) -> _Segment:
+        """@return the open segment, or None if it does not exist on disk and create is false"""
+        segment = self._segments.get(segment_no)
+        if segment is not None:
+            return segment
+        with self._segments_latch:
+            segment = self._segments.get(segment_no)
+            if segment is None:
+                file_name = self.GetSegmentFileName(segment_no)
+                if not create and not os.path.exists(file_name):
+                    return None
+                segment = _Segment(file_name)
+                self._segments[segment_no] = segment
+            return segment
+
+    def _SegmentStem(self) -> str:
+        name = os.path.basename(self.file_name)
+        return name[: name.rfind(".")]